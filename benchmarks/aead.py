@@ -0,0 +1,74 @@
+"""
+AEAD cipher suite benchmark.
+
+Measures raw encryption and decryption throughput of every cipher suite
+fino supports at a few buffer sizes, then the full ``encrypt_data`` path
+(gzip + AEAD) on compressible and incompressible data, and shows which
+suite new transfers would use on this machine.
+
+    python benchmarks/aead.py
+    python benchmarks/aead.py --seconds 1
+"""
+
+import argparse
+import os
+import time
+from typing import Callable
+
+from fino import encryption
+
+
+def throughput(fn: Callable[[], object], size: int, seconds: float) -> float:
+    fn()  # warm up
+    rounds = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < seconds:
+        fn()
+        rounds += 1
+        elapsed = time.perf_counter() - started
+    return rounds * size / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{'suite':>18} {'size':>8} {'encrypt MB/s':>13} {'decrypt MB/s':>13}")
+    for suite in encryption.SUITES:
+        for size in (16 * 1024, 1024 * 1024, 32 * 1024 * 1024):
+            aead = encryption.SUITES[suite](encryption.generate_key())
+            nonce = os.urandom(12)
+            data = os.urandom(size)
+            sealed = aead.encrypt(nonce, data, None)
+            enc = throughput(lambda: aead.encrypt(nonce, data, None), size, args.seconds)
+            dec = throughput(
+                lambda: aead.decrypt(nonce, sealed, None), size, args.seconds
+            )
+            print(
+                f"{suite:>18} {size // 1024:>6}Ki {enc / 1e6:>13,.0f} {dec / 1e6:>13,.0f}"
+            )
+
+    print()
+    size = 8 * 1024 * 1024
+    samples = {
+        "text": (b"fino transfers, line by line\n" * (size // 29 + 1))[:size],
+        "random": os.urandom(size),
+    }
+    key = encryption.generate_key()
+    for suite in encryption.SUITES:
+        for kind, data in samples.items():
+            rate = throughput(
+                lambda: encryption.encrypt_data(data, key, suite=suite),
+                size,
+                args.seconds,
+            )
+            print(f"{suite:>18} encrypt_data ({kind:>6}): {rate / 1e6:>8,.0f} MB/s")
+
+    print()
+    print(f"Preferred suite on this machine: {encryption.preferred_suite()}")
+
+
+if __name__ == "__main__":
+    main()
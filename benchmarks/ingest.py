@@ -0,0 +1,166 @@
+"""
+Relay ingestion micro-benchmark.
+
+Starts a fake relay in a separate process that answers a DM subscription
+with a burst of EVENT frames (interleaved with NOTICE frames and events for
+other recipients), then measures how many events/s ``iter_dm_events``
+delivers on a single core. The parse-only mode compares the per-frame cost
+of the old path (``json.loads`` + pynostr ``Event``) with the current one.
+
+    python benchmarks/ingest.py --events 200000
+    python benchmarks/ingest.py --parse-only
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import websockets
+from pynostr.event import Event  # type: ignore[import-untyped]
+from pynostr.key import PrivateKey  # type: ignore[import-untyped]
+
+from fino import nostr
+from fino.relays import RelayManager
+
+
+def make_frames(count: int, pub_hex: str) -> List[str]:
+    other = "f" * 64
+    frames = []
+    for i in range(count):
+        target = pub_hex if i % 10 else other
+        ev = {
+            "id": f"{i:064x}",
+            "pubkey": "a" * 64,
+            "created_at": 1_700_000_000 + i,
+            "kind": 4,
+            "tags": [["p", target]],
+            "content": "A" * 400 + "?iv=" + "B" * 24,
+            "sig": "c" * 128,
+        }
+        frames.append(json.dumps(["EVENT", "dm", ev]))
+        if i % 50 == 0:
+            frames.append(json.dumps(["NOTICE", "rate limited, slow down"]))
+    return frames
+
+
+def run_relay(port: int, frames: List[str], ready) -> None:
+    async def handler(ws):
+        try:
+            async for message in ws:
+                if json.loads(message)[0] == "REQ":
+                    for frame in frames:
+                        await ws.send(frame)
+                    await ws.send(json.dumps(["EOSE", "dm"]))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def main():
+        async with websockets.serve(handler, "127.0.0.1", port, max_queue=None):
+            ready.set()
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+async def consume(nsec: str, url: str, expected: int) -> float:
+    stats = RelayManager(
+        candidates=[url], path=Path(tempfile.mkdtemp()) / "relays.json"
+    )
+    received = 0
+    started = time.perf_counter()
+    async for _ in nostr.iter_dm_events(nsec, [url], since=0, stats=stats):
+        received += 1
+        if received == expected:
+            break
+    return time.perf_counter() - started
+
+
+def parse_only(frames: List[str], pub_hex: str) -> None:
+    wanted = frozenset([pub_hex])
+
+    def old_path() -> int:
+        count = 0
+        for raw in frames:
+            data = json.loads(raw)
+            if data[0] != "EVENT":
+                continue
+            ev = data[2]
+            if ev["kind"] != 4 or not any(
+                tag[0] == "p" and tag[1] == pub_hex for tag in ev["tags"]
+            ):
+                continue
+            Event(
+                id=ev["id"],
+                pubkey=ev["pubkey"],
+                created_at=ev["created_at"],
+                kind=ev["kind"],
+                tags=ev["tags"],
+                content=ev["content"],
+                sig=ev["sig"],
+            )
+            count += 1
+        return count
+
+    def new_path() -> int:
+        count = 0
+        for raw in frames:
+            if '"EVENT"' not in raw[:16]:
+                continue
+            ev = nostr._loads(raw)[2]
+            recipient = nostr._dm_recipient(ev, wanted)
+            if recipient is None:
+                continue
+            nostr.DMEvent.from_dict(ev, recipient)
+            count += 1
+        return count
+
+    for name, fn in (("json + pynostr Event", old_path), ("fast path", new_path)):
+        started = time.perf_counter()
+        count = fn()
+        elapsed = time.perf_counter() - started
+        print(f"{name:>22}: {count / elapsed:>12,.0f} events/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--parse-only", action="store_true")
+    args = parser.parse_args()
+
+    key = PrivateKey()
+    pub_hex = key.public_key.hex()
+    frames = make_frames(args.events, pub_hex)
+    expected = sum(1 for i in range(args.events) if i % 10)
+    print(f"JSON backend: {nostr.JSON_BACKEND}, {len(frames):,} frames")
+
+    if args.parse_only:
+        parse_only(frames, pub_hex)
+        return
+
+    ready = multiprocessing.Event()
+    relay = multiprocessing.Process(
+        target=run_relay, args=(args.port, frames, ready), daemon=True
+    )
+    relay.start()
+    try:
+        ready.wait(10)
+        elapsed = asyncio.run(
+            consume(key.bech32(), f"ws://127.0.0.1:{args.port}", expected)
+        )
+        print(
+            f"iter_dm_events: {expected:,} events in {elapsed:.2f}s "
+            f"= {expected / elapsed:,.0f} events/s (pid {os.getpid()})"
+        )
+    finally:
+        relay.terminate()
+
+
+if __name__ == "__main__":
+    main()
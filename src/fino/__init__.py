@@ -0,0 +1,3 @@
+from .pipeline import Transfer, receive_stream, send_file_async
+
+__all__ = ["Transfer", "receive_stream", "send_file_async"]
@@ -0,0 +1,239 @@
+"""
+Many-file bundles: one encrypted container, one CID and one DM per transfer.
+
+A bundle is a plain concatenation of member records followed by an index.
+Every member is compressed and encrypted on its own (with its relative path
+as associated data), so any member can be fetched by byte range and
+decrypted without touching the rest of the bundle. The index is encrypted
+the same way and its location travels in the DM payload.
+"""
+
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .encryption import (
+    DEFAULT_SUITE,
+    decrypt_file,
+    encrypt_data,
+    generate_key,
+    preferred_suite,
+)
+from .ipfs import (
+    download_from_ipfs,
+    fetch_range_from_ipfs,
+    get_node_peer_info,
+    upload_tempfile,
+)
+from .utils import build_payload, verify_ciphertext
+
+logger = logging.getLogger(__name__)
+
+_INDEX_AAD = b"fino-bundle-index"
+
+
+def iter_bundle_files(root: Path) -> Iterator[Tuple[str, Path]]:
+    """Yield (relative posix name, path) for every regular file under root"""
+    for path in sorted(root.rglob("*")):
+        if path.is_file() and not path.is_symlink():
+            yield path.relative_to(root).as_posix(), path
+
+
+def write_bundle(
+    root: Path, output_path: str, key: bytes, suite: str = DEFAULT_SUITE
+) -> Tuple[Dict[str, Any], bytes]:
+    """
+    Stream every file under ``root`` into an encrypted bundle at ``output_path``.
+
+    Returns the bundle description that goes into the DM payload and the
+    nonce of the encrypted index. The description's ``sha256`` is the
+    digest of the whole bundle file and ``suite`` the AEAD used.
+    """
+    index: List[Dict[str, Any]] = []
+    offset = 0
+    total_size = 0
+    digest = hashlib.sha256()
+
+    with open(output_path, "wb") as out:
+        for name, path in iter_bundle_files(root):
+            data = path.read_bytes()
+            ciphertext, nonce = encrypt_data(data, key, name.encode("utf-8"), suite)
+            out.write(ciphertext)
+            digest.update(ciphertext)
+            index.append(
+                {
+                    "name": name,
+                    "offset": offset,
+                    "length": len(ciphertext),
+                    "nonce": nonce.hex(),
+                    "size": len(data),
+                }
+            )
+            offset += len(ciphertext)
+            total_size += len(data)
+
+        index_ct, index_nonce = encrypt_data(
+            json.dumps(index).encode("utf-8"), key, _INDEX_AAD, suite
+        )
+        out.write(index_ct)
+        digest.update(index_ct)
+
+    info = {
+        "index_offset": offset,
+        "index_length": len(index_ct),
+        "count": len(index),
+        "size": total_size,
+        "sha256": digest.hexdigest(),
+        "suite": suite,
+    }
+    return info, index_nonce
+
+
+def create_bundle(
+    root: Path, suite: Optional[str] = None
+) -> Tuple[str, bytes, bytes, Dict[str, Any]]:
+    """
+    Bundle a directory into a temporary file under a fresh key.
+
+    Returns (bundle path, key, index nonce, bundle info); the caller releases
+    the file with ``discard_upload_file`` once it has been uploaded.
+    """
+    key = generate_key()
+    bundle_path = upload_tempfile(suffix=f"_{root.name}.bundle")
+
+    try:
+        info, index_nonce = write_bundle(
+            root, bundle_path, key, suite or preferred_suite()
+        )
+    except Exception:
+        os.unlink(bundle_path)
+        raise
+    return bundle_path, key, index_nonce, info
+
+
+def build_bundle_payload(
+    cid: str, key: bytes, index_nonce: bytes, name: str, info: Dict[str, Any]
+) -> Dict[str, Any]:
+    # The payload nonce is the index nonce; members carry their own
+    info = dict(info)
+    payload = build_payload(
+        cid,
+        key,
+        index_nonce,
+        name,
+        peer=get_node_peer_info(),
+        size=info["index_offset"] + info["index_length"],
+        plain_size=info["size"],
+        sha256=info.pop("sha256", None),
+        suite=info.pop("suite", None),
+    )
+    payload["bundle"] = info
+    return payload
+
+
+def _safe_member_path(output_dir: Path, name: str) -> Path:
+    parts = PurePosixPath(name).parts
+    if not parts or name.startswith("/") or ".." in parts:
+        raise ValueError(f"Unsafe bundle member name: {name!r}")
+    return output_dir.joinpath(*parts)
+
+
+def _decrypt_index(payload: Dict[str, Any], data: bytes) -> List[Dict[str, Any]]:
+    index_json = decrypt_file(
+        data,
+        bytes.fromhex(payload["key"]),
+        bytes.fromhex(payload["nonce"]),
+        _INDEX_AAD,
+        payload.get("suite"),
+    )
+    return json.loads(index_json)
+
+
+def fetch_bundle_index(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Fetch and decrypt only the index of a bundle"""
+    info = payload["bundle"]
+    data = fetch_range_from_ipfs(
+        payload["cid"], info["index_offset"], info["index_length"], payload.get("peer")
+    )
+    return _decrypt_index(payload, data)
+
+
+def decrypt_bundle_member(
+    payload: Dict[str, Any], entry: Dict[str, Any], ciphertext: bytes
+) -> bytes:
+    return decrypt_file(
+        ciphertext,
+        bytes.fromhex(payload["key"]),
+        bytes.fromhex(entry["nonce"]),
+        entry["name"].encode("utf-8"),
+        payload.get("suite"),
+    )
+
+
+def fetch_bundle_member(payload: Dict[str, Any], entry: Dict[str, Any]) -> bytes:
+    """Fetch one member by byte range and decrypt it"""
+    ciphertext = fetch_range_from_ipfs(
+        payload["cid"], entry["offset"], entry["length"], payload.get("peer")
+    )
+    return decrypt_bundle_member(payload, entry, ciphertext)
+
+
+def _matches(name: str, include: Optional[Sequence[str]]) -> bool:
+    return not include or any(fnmatch.fnmatch(name, pattern) for pattern in include)
+
+
+def extract_bundle(
+    payload: Dict[str, Any],
+    output_dir: str,
+    include: Optional[Sequence[str]] = None,
+) -> List[Path]:
+    """
+    Extract a bundle into ``output_dir``.
+
+    With ``include`` glob patterns, only the index and matching members are
+    fetched, each by byte range. Otherwise the bundle is downloaded once and
+    every member is extracted from the local copy.
+    """
+    out_root = Path(output_dir)
+    written: List[Path] = []
+
+    def write_member(entry: Dict[str, Any], plaintext: bytes) -> None:
+        target = _safe_member_path(out_root, entry["name"])
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(plaintext)
+        written.append(target)
+
+    if include:
+        index = fetch_bundle_index(payload)
+        selected = [entry for entry in index if _matches(entry["name"], include)]
+        logger.info("📦 Fetching %d of %d bundle members", len(selected), len(index))
+        for entry in selected:
+            write_member(entry, fetch_bundle_member(payload, entry))
+        return written
+
+    temp_file = tempfile.NamedTemporaryFile(delete=False)
+    temp_file_path = temp_file.name
+    temp_file.close()
+
+    try:
+        if not download_from_ipfs(payload["cid"], temp_file_path, payload.get("peer")):
+            raise Exception("Download failed from all sources")
+        verify_ciphertext(payload, temp_file_path)
+
+        info = payload["bundle"]
+        with open(temp_file_path, "rb") as f:
+            f.seek(info["index_offset"])
+            index = _decrypt_index(payload, f.read(info["index_length"]))
+            for entry in index:
+                f.seek(entry["offset"])
+                ciphertext = f.read(entry["length"])
+                write_member(entry, decrypt_bundle_member(payload, entry, ciphertext))
+    finally:
+        os.unlink(temp_file_path)
+
+    return written
@@ -0,0 +1,176 @@
+"""
+Receiver-side content cache keyed by CID.
+
+Ciphertexts that decrypted successfully are kept on disk under a size budget
+with least-recently-used eviction, and every delivered file is remembered so
+a repeated DM for the same CID can be skipped without any network fetch.
+Entries whose blob was evicted are forgotten once they have not been used
+for ``cache_entry_ttl`` seconds, so the index does not grow without bound.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .utils import get_config_dir, get_int_config
+
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Entries without a cached blob are dropped after this long unused
+DEFAULT_CACHE_ENTRY_TTL = 30 * 24 * 3600
+
+# Cache hits only refresh ``last_access``, so the index is rewritten for
+# them at most this often (and once more at exit)
+_FLUSH_INTERVAL = 30.0
+
+
+def _blob_name(cid: str) -> str:
+    # CIDs are base32/base58 and safe as file names; guard anyway
+    return "".join(c for c in cid if c.isalnum())
+
+
+class ReceiveCache:
+    """LRU cache of verified ciphertexts and delivered files, keyed by CID"""
+
+    def __init__(
+        self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None
+    ):
+        self.cache_dir = cache_dir or get_config_dir() / "cache"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else get_int_config("cache_max_bytes", DEFAULT_CACHE_MAX_BYTES)
+        )
+        self.entry_ttl = get_int_config("cache_entry_ttl", DEFAULT_CACHE_ENTRY_TTL)
+        self._index_file = self.cache_dir / "index.json"
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+        self._dirty = False
+        self._last_flush = time.time()
+        atexit.register(self.flush)
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if self._index_file.exists():
+            try:
+                with open(self._index_file, "r") as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, IOError):
+                return {}
+        return {}
+
+    def _save_index(self) -> None:
+        tmp = self._index_file.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_file)
+        self._dirty = False
+        self._last_flush = time.time()
+
+    def _touch(self) -> None:
+        """Note an index change that may wait for the next flush"""
+        self._dirty = True
+        if time.time() - self._last_flush >= _FLUSH_INTERVAL:
+            self._save_index()
+
+    def flush(self) -> None:
+        """Write out access times batched since the last save"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _blob_path(self, cid: str) -> Path:
+        return self.cache_dir / _blob_name(cid)
+
+    def _cached_bytes(self) -> int:
+        return sum(entry.get("size", 0) for entry in self._index.values())
+
+    def _prune(self) -> None:
+        """Forget blob-less entries that have not been used within the TTL"""
+        cutoff = time.time() - self.entry_ttl
+        expired = [
+            cid
+            for cid, entry in self._index.items()
+            if not entry.get("size") and entry.get("last_access", 0) < cutoff
+        ]
+        for cid in expired:
+            del self._index[cid]
+
+    def _evict(self) -> None:
+        """Drop least recently used blobs until the cache fits its budget"""
+        self._prune()
+        total = self._cached_bytes()
+        by_age = sorted(
+            (cid for cid, entry in self._index.items() if entry.get("size")),
+            key=lambda cid: self._index[cid]["last_access"],
+        )
+        for cid in by_age:
+            if total <= self.max_bytes:
+                break
+            entry = self._index[cid]
+            total -= entry["size"]
+            entry["size"] = 0
+            try:
+                os.unlink(self._blob_path(cid))
+            except FileNotFoundError:
+                pass
+
+    def get(self, cid: str) -> Optional[bytes]:
+        """Return the cached ciphertext for a CID, if present"""
+        with self._lock:
+            entry = self._index.get(cid)
+            if not entry or not entry.get("size"):
+                return None
+            try:
+                data = self._blob_path(cid).read_bytes()
+            except FileNotFoundError:
+                entry["size"] = 0
+                self._touch()
+                return None
+            entry["last_access"] = time.time()
+            self._touch()
+            return data
+
+    def put(self, cid: str, data: bytes) -> None:
+        """Store a ciphertext that has already been verified by decryption"""
+        # Objects that would take over most of the budget only cause churn
+        if len(data) > self.max_bytes // 4:
+            return
+        with self._lock:
+            path = self._blob_path(cid)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            entry = self._index.setdefault(cid, {})
+            entry["size"] = len(data)
+            entry["last_access"] = time.time()
+            self._evict()
+            self._save_index()
+
+    def mark_saved(self, cid: str, filepath: str, size: Optional[int] = None) -> None:
+        """Remember where the plaintext for a CID was delivered"""
+        with self._lock:
+            entry = self._index.setdefault(cid, {"size": 0})
+            entry["saved"] = os.path.abspath(filepath)
+            entry["saved_size"] = size
+            entry["last_access"] = time.time()
+            self._prune()
+            self._save_index()
+
+    def find_saved(self, cid: str) -> Optional[str]:
+        """Return the delivered file for a CID if it is still intact on disk"""
+        with self._lock:
+            entry = self._index.get(cid)
+        if not entry or "saved" not in entry:
+            return None
+        path = entry["saved"]
+        if not os.path.exists(path):
+            return None
+        size = entry.get("saved_size")
+        if size is not None and os.path.isfile(path) and os.path.getsize(path) != size:
+            return None
+        return path
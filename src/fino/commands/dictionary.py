@@ -0,0 +1,148 @@
+import gzip
+import time
+import typer
+from pathlib import Path
+from typing import List, Optional
+from rich.table import Table
+from ..dictionaries import (
+    DEFAULT_DICT_SIZE,
+    get_dictionary_store,
+    read_samples,
+    train_dictionary,
+)
+from ..encryption import DEFAULT_ZSTD_LEVEL, require_zstd
+from ..console import (
+    console,
+    emit_json,
+    print_error_message,
+    print_header,
+    print_success_message,
+)
+
+app = typer.Typer(help="Train and manage zstd dictionaries for small files")
+
+
+@app.command()
+def train(
+    samples: List[Path] = typer.Argument(
+        ..., exists=True, help="Sample files, or directories of sample files"
+    ),
+    name: str = typer.Option(..., "--name", help="Name to use the dictionary by"),
+    to: Optional[List[str]] = typer.Option(
+        None,
+        "--to",
+        help="Use it automatically for files sent to this npub (repeatable)",
+    ),
+    size: int = typer.Option(
+        DEFAULT_DICT_SIZE, "--size", help="Maximum dictionary size in bytes"
+    ),
+):
+    """
+    Train a zstd dictionary from files like the ones you will send.
+
+    A few hundred representative samples are enough. Small files sent with
+    --dict NAME, or to a recipient given with --to, are then compressed
+    against the dictionary; the receiver fetches it once and caches it.
+    """
+    print_header("FiNo Dictionary Training", "Shared context for small files")
+    try:
+        zstd = require_zstd()
+        data = read_samples(samples)
+        started = time.time()
+        dictionary = train_dictionary(data, size)
+    except Exception as e:
+        print_error_message("Training failed", e)
+        raise typer.Exit(1)
+
+    store = get_dictionary_store()
+    dict_id = store.add(dictionary)
+    store.assign(dict_id, name=name)
+    for npub in to or []:
+        store.assign(dict_id, peer=npub)
+
+    # Compare against per-file gzip on the samples themselves
+    compressor = zstd.ZstdCompressor(
+        level=DEFAULT_ZSTD_LEVEL, dict_data=zstd.ZstdCompressionDict(dictionary)
+    )
+    plain = sum(len(sample) for sample in data)
+    gzipped = sum(len(gzip.compress(sample, compresslevel=6)) for sample in data)
+    zstded = sum(len(compressor.compress(sample)) for sample in data)
+
+    details = {
+        "Dictionary": f"{name} ({dict_id[:12]})",
+        "Size": f"{len(dictionary):,} bytes",
+        "Samples": f"{len(data):,} files, {plain:,} bytes",
+        "gzip": f"{gzipped:,} bytes",
+        "zstd + dictionary": (
+            f"{zstded:,} bytes ({gzipped / max(zstded, 1):.1f}x smaller)"
+        ),
+        "Trained in": f"{time.time() - started:.1f}s",
+    }
+    if to:
+        details["Recipients"] = ", ".join(f"{npub[:12]}..." for npub in to)
+    print_success_message("Dictionary trained", details)
+    emit_json(
+        {
+            "event": "dictionary",
+            "id": dict_id,
+            "name": name,
+            "size": len(dictionary),
+            "samples": len(data),
+            "sample_bytes": plain,
+            "gzip_bytes": gzipped,
+            "zstd_bytes": zstded,
+        }
+    )
+
+
+@app.command()
+def assign(
+    name: str = typer.Argument(..., help="Dictionary name or ID"),
+    to: List[str] = typer.Option(
+        ..., "--to", help="Use it for files sent to this npub (repeatable)"
+    ),
+):
+    """Use a dictionary automatically for files sent to some recipients"""
+    store = get_dictionary_store()
+    try:
+        dict_id = store.resolve(name)
+    except KeyError as e:
+        raise typer.BadParameter(str(e), param_hint="name")
+    assert dict_id is not None
+    for npub in to:
+        store.assign(dict_id, peer=npub)
+    console.print(f"📚 {name} is now used for {len(to):,} recipient(s)", style="green")
+
+
+@app.command("list")
+def list_dicts():
+    """List stored dictionaries, their names and recipients"""
+    entries = get_dictionary_store().entries()
+    table = Table(title="📚 Dictionaries", show_header=True, header_style="bold magenta")
+    table.add_column("ID", style="cyan")
+    table.add_column("Names", style="white")
+    table.add_column("Recipients", style="white", justify="right")
+    table.add_column("Size", style="white", justify="right")
+    table.add_column("Published", style="white")
+    for dict_id, info in entries["dicts"].items():
+        names = [n for n, target in entries["names"].items() if target == dict_id]
+        peers = [p for p, target in entries["peers"].items() if target == dict_id]
+        upload = info.get("upload") or {}
+        table.add_row(
+            dict_id[:12],
+            ", ".join(names),
+            str(len(peers)),
+            f"{info.get('size', 0):,}",
+            upload.get("cid", ""),
+        )
+        emit_json(
+            {
+                "event": "dictionary",
+                "id": dict_id,
+                "names": names,
+                "peers": peers,
+                "size": info.get("size"),
+                "cid": upload.get("cid"),
+            }
+        )
+    console.print(table)
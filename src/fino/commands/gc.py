@@ -0,0 +1,86 @@
+import time
+import typer
+from rich.table import Table
+from ..pins import collect_garbage, get_pin_index
+from ..console import (
+    console,
+    emit_json,
+    print_error_message,
+    print_header,
+    print_success_message,
+)
+
+app = typer.Typer(help="Unpin expired transfers and free IPFS repo space")
+
+
+@app.command()
+def gc(
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Show what would be unpinned without changing anything"
+    ),
+    unpin_all: bool = typer.Option(
+        False, "--all", help="Unpin every transfer fino has pinned, expired or not"
+    ),
+    no_repo_gc: bool = typer.Option(
+        False, "--no-repo-gc", help="Only unpin; skip running ipfs repo gc"
+    ),
+    list_pins: bool = typer.Option(
+        False, "--list", help="List tracked pins and exit"
+    ),
+):
+    """
+    Unpin transfers fino sent and run IPFS repo garbage collection.
+
+    Transfers are unpinned once they expire (config "pin_ttl", default 7
+    days) and, oldest first, while fino's pins together exceed their budget
+    (config "pin_budget_bytes", default 10 GiB). Pins younger than
+    "gc_min_age" (default 1 day) are only removed once they expire, and pins
+    not created by fino are never removed or counted. Long-running receivers also collect every "gc_interval" seconds.
+    """
+    print_header("FiNo Garbage Collection", "Unpin expired transfers")
+    index = get_pin_index()
+
+    if list_pins:
+        table = Table(
+            title="📌 Tracked pins", show_header=True, header_style="bold magenta"
+        )
+        table.add_column("CID", style="cyan")
+        table.add_column("Name", style="white")
+        table.add_column("Size", style="white", justify="right")
+        table.add_column("Expires", style="white")
+        for cid in index.oldest_first():
+            entry = index.pins[cid]
+            expires = time.strftime(
+                "%Y-%m-%d %H:%M", time.localtime(entry.get("expires_at", 0))
+            )
+            table.add_row(
+                cid, entry.get("name") or "", f"{entry.get('size', 0):,}", expires
+            )
+            emit_json({"event": "pin", "cid": cid, **entry})
+        console.print(table)
+        return
+
+    try:
+        result = collect_garbage(
+            index, run_repo_gc=not no_repo_gc, dry_run=dry_run, unpin_all=unpin_all
+        )
+    except Exception as e:
+        print_error_message("Garbage collection failed", e)
+        raise typer.Exit(1)
+
+    for cid in result["unpinned"]:
+        action = "Would unpin" if dry_run else "Unpinned"
+        console.print(f"   📌 {action} {cid}", style="green")
+
+    success_details = {
+        "Unpinned": f"{len(result['unpinned']):,} transfers",
+        "Tracked size freed": f"{result['freed']:,} bytes",
+        "Repo GC": "ran" if result["repo_gc"] else "skipped",
+        "Staged files removed": f"{result['staged_removed']:,}",
+        "Still pinned": f"{result['remaining']:,} transfers",
+    }
+    print_success_message(
+        "Dry run complete" if dry_run else "Garbage collection complete",
+        success_details,
+    )
+    emit_json({"event": "gc", "dry_run": dry_run, **result})
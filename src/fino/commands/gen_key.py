@@ -2,6 +2,7 @@ import typer
 from pynostr.key import PrivateKey  # type: ignore[import-untyped]
 from ..console import (
     console,
+    emit_json,
     print_header,
     print_warning_message,
 )
@@ -29,6 +30,13 @@ def gen_key():
     )
 
     private_key = PrivateKey()
+    emit_json(
+        {
+            "event": "key",
+            "nsec": private_key.bech32(),
+            "npub": private_key.public_key.bech32(),
+        }
+    )
 
     # Display results
     console.print(
@@ -0,0 +1,113 @@
+import time
+import typer
+from rich.table import Table
+from typing import Optional
+from ..ledger import (
+    DONE,
+    FAILED,
+    INTERRUPTED,
+    INVALID,
+    QUEUED,
+    RECEIVE,
+    REJECTED,
+    RUNNING,
+    SEND,
+    get_ledger,
+)
+from ..utils import parse_since
+from ..console import console, emit_json, print_header
+
+app = typer.Typer(help="Show the local transfer history")
+
+_STATUS_STYLES = {
+    DONE: "green",
+    FAILED: "red",
+    REJECTED: "red",
+    INVALID: "red",
+    INTERRUPTED: "yellow",
+    QUEUED: "cyan",
+    RUNNING: "cyan",
+}
+
+
+@app.command()
+def history(
+    sent: bool = typer.Option(False, "--sent", help="Only show sent transfers"),
+    received: bool = typer.Option(
+        False, "--received", help="Only show received transfers"
+    ),
+    peer: Optional[str] = typer.Option(
+        None, "--peer", help="Only transfers with this npub (or hex public key)"
+    ),
+    cid: Optional[str] = typer.Option(None, "--cid", help="Only transfers of this CID"),
+    status: Optional[str] = typer.Option(
+        None,
+        "--status",
+        help="Only transfers in this state (done, failed, interrupted, ...)",
+    ),
+    since: Optional[str] = typer.Option(
+        None, "--since", help="Only transfers since this time (e.g. 7d, 12h)"
+    ),
+    limit: int = typer.Option(50, "--limit", help="Maximum number of transfers"),
+):
+    """
+    Show sent and received transfers from the local ledger.
+
+    Every send and receive is recorded in ~/.fino/ledger.db with its Nostr
+    event ID, CID, peer, sizes, status and timings, so history is available
+    without querying any relay. Transfers a crashed process left unfinished
+    show up as "interrupted".
+    """
+    if sent and received:
+        raise typer.BadParameter("Pass at most one of --sent and --received")
+    since_ts = None
+    if since:
+        try:
+            since_ts = parse_since(since)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--since")
+
+    print_header("FiNo Transfer History", "From the local ledger")
+    ledger = get_ledger()
+    ledger.recover()
+    rows = ledger.history(
+        direction=SEND if sent else RECEIVE if received else None,
+        peer=peer,
+        cid=cid,
+        status=status,
+        since=since_ts,
+        limit=limit,
+    )
+
+    if not rows:
+        console.print("📭 No transfers recorded", style="yellow")
+        return
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("When", style="white")
+    table.add_column("", style="white")
+    table.add_column("Name", style="cyan", overflow="fold")
+    table.add_column("Size", style="white", justify="right")
+    table.add_column("Status", style="white")
+    table.add_column("Took", style="white", justify="right")
+    table.add_column("Peer", style="white")
+    table.add_column("CID", style="white")
+    for row in rows:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["queued_at"]))
+        took = ""
+        if row["started_at"] and row["finished_at"]:
+            took = f"{row['finished_at'] - row['started_at']:.1f}s"
+        size = row["plain_size"]
+        style = _STATUS_STYLES.get(row["status"], "white")
+        table.add_row(
+            when,
+            "📤" if row["direction"] == SEND else "📥",
+            row["name"] or (row["event_id"] or "")[:8],
+            f"{size:,}" if size is not None else "",
+            f"[{style}]{row['status']}[/{style}]",
+            took,
+            (row["peer"] or "")[:8],
+            (row["cid"] or "")[:12],
+        )
+        emit_json({"event": "transfer", **row})
+    console.print(table)
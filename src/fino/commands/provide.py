@@ -0,0 +1,90 @@
+import time
+import typer
+from rich.table import Table
+from ..provide import FAILED, PENDING, PROVIDED, get_provide_queue
+from ..console import (
+    console,
+    emit_json,
+    print_header,
+    print_success_message,
+    print_warning_message,
+)
+
+app = typer.Typer(help="Announce uploaded CIDs to the IPFS network")
+
+
+@app.command()
+def provide(
+    status_only: bool = typer.Option(
+        False, "--status", help="Show the announcement queue and exit"
+    ),
+    retry_failed: bool = typer.Option(
+        False, "--retry-failed", help="Queue CIDs whose announcement gave up again"
+    ),
+    timeout: int = typer.Option(
+        600, "--timeout", help="Seconds to wait for the queue to drain"
+    ),
+):
+    """
+    Finish announcing uploaded CIDs to the DHT.
+
+    Uploads queue their CIDs for announcement in the background. CIDs a
+    previous fino run did not get to are kept in ~/.fino/provide.json; this
+    command announces them and waits until the queue is drained. Workers,
+    batch size and retries come from the "provide_workers", "provide_batch"
+    and "provide_retries" config values.
+    """
+    print_header("FiNo Announcements", "DHT provide queue")
+    queue = get_provide_queue()
+
+    if retry_failed:
+        count = queue.retry_failed()
+        console.print(f"🔁 Re-queued {count:,} failed CIDs", style="cyan")
+
+    if not status_only and queue.pending():
+        console.print(f"📡 Announcing {queue.pending():,} CIDs...", style="cyan")
+        queue.start()
+        started = time.time()
+        if not queue.wait(timeout):
+            print_warning_message(f"Queue not drained after {timeout}s")
+        console.print(f"⏱️  Finished in {time.time() - started:.1f}s", style="cyan")
+
+    entries = queue.entries()
+    unfinished = {
+        cid: entry for cid, entry in entries.items() if entry["status"] != PROVIDED
+    }
+    if unfinished:
+        table = Table(
+            title="📡 Not yet announced", show_header=True, header_style="bold magenta"
+        )
+        table.add_column("CID", style="cyan")
+        table.add_column("Status", style="white")
+        table.add_column("Attempts", style="white", justify="right")
+        table.add_column("Next try", style="white")
+        table.add_column("Last error", style="red", overflow="fold")
+        for cid, entry in sorted(unfinished.items(), key=lambda e: e[1]["added_at"]):
+            if entry["status"] != PENDING:
+                next_try = "-"
+            elif entry["next_at"] <= time.time():
+                next_try = "now"
+            else:
+                next_try = time.strftime("%H:%M:%S", time.localtime(entry["next_at"]))
+            table.add_row(
+                cid,
+                entry["status"],
+                str(entry["attempts"]),
+                next_try,
+                entry.get("error", ""),
+            )
+        console.print(table)
+
+    for cid, entry in entries.items():
+        emit_json({"event": "provide", "cid": cid, **entry})
+
+    counts = queue.counts()
+    details = {
+        "Announced": f"{counts[PROVIDED]:,} CIDs",
+        "Pending": f"{counts[PENDING]:,} CIDs",
+        "Failed": f"{counts[FAILED]:,} CIDs",
+    }
+    print_success_message("Announcement queue", details)
@@ -1,17 +1,49 @@
+import asyncio
+import json
 import typer
 import os
-from ..nostr import receive_loop, decrypt_payload, DEFAULT_RELAYS
-from ..ipfs import download_from_ipfs
+import time
+from pathlib import Path
+from concurrent.futures import Future
+from typing import Callable, Iterable, List, Optional
+from ..nostr import (
+    DMEvent,
+    fetch_dm_history,
+    iter_dm_events,
+    receive_loop,
+    decrypt_payload,
+)
+from ..relays import select_relays
+from ..ipfs import download_bytes_from_ipfs
 from ..encryption import decrypt_file
-from ..utils import build_filename_from_payload
+from ..bundle import extract_bundle
+from ..dictionaries import payload_dictionary
+from ..manifest import get_transfer_workers, iter_manifest_parts, receive_manifest
+from ..cache import ReceiveCache
+from ..keyring import Keyring
+from ..ledger import DONE, FAILED, INVALID, PARTIAL, REJECTED, SKIPPED, get_ledger
+from ..pins import start_background_gc
+from ..provide import resume_pending_provides
+from ..scheduler import DiskReservations, TransferScheduler
+from ..sinks import handler_env, stream_to_command, stream_to_stdout
+from ..utils import (
+    build_filename_from_payload,
+    inline_data_from_payload,
+    parse_since,
+    preallocate,
+    transfer_sizes,
+    verify_ciphertext,
+)
 from ..console import (
     console,
+    emit_json,
     print_header,
     print_step,
     print_success_message,
     print_error_message,
     create_progress_bar,
     print_file_info,
+    use_stderr,
 )
 
 app = typer.Typer(help="Receive and decrypt files via Nostr DMs and IPFS")
@@ -19,13 +51,57 @@ app = typer.Typer(help="Receive and decrypt files via Nostr DMs and IPFS")
 
 @app.command()
 def receive(
-    from_nsec: str = typer.Option(..., "--from", help="Your nsec (private key)"),
+    from_nsec: Optional[List[str]] = typer.Option(
+        None,
+        "--from",
+        help="Your nsec (private key); repeat to serve several identities",
+    ),
+    keyring_file: Optional[Path] = typer.Option(
+        None,
+        "--keyring",
+        exists=True,
+        dir_okay=False,
+        help="JSON file mapping identity names to nsecs (or a list of nsecs)",
+    ),
     output_dir: str = typer.Option(
         ".",
         "--output-dir",
         "-o",
         help="Directory to save received files (default: current directory)",
     ),
+    include: Optional[List[str]] = typer.Option(
+        None,
+        "--include",
+        help="Only fetch bundle members matching this glob (repeatable)",
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Disable the local receive cache"
+    ),
+    relay: Optional[List[str]] = typer.Option(
+        None,
+        "--relay",
+        help="Relay to listen on (repeatable; default: best configured relays)",
+    ),
+    since: Optional[str] = typer.Option(
+        None,
+        "--since",
+        help="First download transfers sent since this time (e.g. 7d, 12h, or a Unix timestamp)",
+    ),
+    concurrency: Optional[int] = typer.Option(
+        None,
+        "--concurrency",
+        help="Transfers to download in parallel (default: transfer_workers config)",
+    ),
+    to_stdout: bool = typer.Option(
+        False,
+        "--stdout",
+        help="Write the next received file to stdout and exit, instead of saving it",
+    ),
+    exec_cmd: Optional[str] = typer.Option(
+        None,
+        "--exec",
+        help="Stream each received file to the stdin of this shell command",
+    ),
 ):
     """
     Receive and decrypt files via Nostr DMs and IPFS storage.
@@ -36,30 +112,127 @@ def receive(
     3. Downloads encrypted file from IPFS
     4. Decrypts and saves the file locally
 
+    With several identities (repeated --from, or --keyring), one subscription
+    per relay serves all of them and each identity's files are written to
+    its own subdirectory of the output directory.
+
+    Queued transfers are downloaded smallest first (long waits raise a
+    transfer's priority), and transfers that would not fit on disk are
+    rejected before anything is downloaded.
+
+    Every transfer is recorded in the ledger (see `fino history`): messages
+    already delivered are skipped, and transfers a crashed receiver left
+    unfinished are resumed on start.
+
+    With --stdout or --exec nothing is written to disk: decrypted data is
+    passed on once it has been authenticated, a large file one part at a
+    time. --exec runs the command once per transfer with FINO_FILENAME,
+    FINO_SIZE, FINO_CID, FINO_FROM, FINO_IDENTITY and FINO_EVENT_ID set.
+
     ⚠️  This is experimental software for innovation research only.
     """
+    try:
+        keyring = Keyring.load(keyring_file) if keyring_file else Keyring()
+        for nsec in from_nsec or []:
+            keyring.add(nsec)
+    except Exception as e:
+        raise typer.BadParameter(f"Invalid identity: {e}", param_hint="--from/--keyring")
+    if not len(keyring):
+        raise typer.BadParameter(
+            "Pass --from at least once or --keyring", param_hint="--from"
+        )
+    if to_stdout and exec_cmd:
+        raise typer.BadParameter("Pass at most one of --stdout and --exec")
+    # Checked before anything is resumed or started below
+    since_ts = None
+    if since:
+        try:
+            since_ts = parse_since(since)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--since")
+    streaming = to_stdout or exec_cmd is not None
+    # stdout carries the file itself, so everything else goes to stderr
+    if to_stdout:
+        use_stderr()
+
     # Beautiful header
     print_header("FiNo File Receiving Process", "Listening for encrypted files...")
 
     # Show receiver info
-    console.print(
-        f"👤 [bold]Listening for messages from:[/bold] {from_nsec[:8]}...", style="cyan"
-    )
-    console.print(f"📁 [bold]Output directory:[/bold] {output_dir}", style="cyan")
-    console.print(f"📡 [bold]Relay(s):[/bold] {DEFAULT_RELAYS}", style="cyan")
+    if len(keyring) == 1:
+        console.print(
+            f"👤 [bold]Listening for messages to:[/bold] {next(iter(keyring)).name}...",
+            style="cyan",
+        )
+    else:
+        console.print(
+            f"👥 [bold]Listening for messages to:[/bold] {len(keyring):,} identities",
+            style="cyan",
+        )
+    if to_stdout:
+        console.print("📤 [bold]Output:[/bold] stdout", style="cyan")
+    elif exec_cmd:
+        console.print(f"📤 [bold]Handler:[/bold] {exec_cmd}", style="cyan")
+    else:
+        console.print(f"📁 [bold]Output directory:[/bold] {output_dir}", style="cyan")
+    relays = select_relays(relay)
+    console.print(f"📡 [bold]Relay(s):[/bold] {relays}", style="cyan")
     console.print("🔧 [bold]Download method:[/bold] IPFS", style="cyan")
 
     console.print("=" * 60, style="cyan")
 
     # Create output directory if it's not the current directory
-    if output_dir != ".":
+    if output_dir != "." and not streaming:
         os.makedirs(output_dir, exist_ok=True)
 
+    cache = None if no_cache else ReceiveCache()
+    scheduler = TransferScheduler(concurrency or get_transfer_workers())
+    reservations = DiskReservations()
+    ledger = get_ledger()
+    # Long-running receivers also expire this node's own sent transfers and
+    # finish announcing CIDs earlier sends left pending
+    start_background_gc()
+    resume_pending_provides()
+    # Transfers taken with --stdout
+    taken: List[Future] = []
+
     def callback(event):
+        """Decrypt an announcement and queue its transfer; returns its future"""
+        identity = keyring.get(event.recipient)
+        # With --stdout only the first transfer is taken; later messages are
+        # left unclaimed for the next receiver
+        if identity is None or (to_stdout and taken):
+            return None
+        # Ledger rows, settled ones included, are keyed on the event id, so
+        # an event whose id was not computed from its content must not
+        # claim (or permanently settle) the row of the real one
+        if not event.id_matches():
+            console.print(
+                f"⚠️  Message {str(event.id)[:8]}... does not match its id, "
+                "ignoring",
+                style="yellow",
+            )
+            return None
+        # Messages delivered before (or being handled now) are not redone
+        row_id = ledger.claim_receive(event, identity.name)
+        if row_id is None:
+            console.print(
+                f"♻️  Message {event.id[:8]}... already handled or out of "
+                "attempts, skipping",
+                style="yellow",
+            )
+            emit_json({"event": "skipped", "event_id": event.id})
+            return None
+        target_dir = keyring.output_dir(output_dir, identity)
+        if not streaming:
+            os.makedirs(target_dir, exist_ok=True)
+
         console.print("\n" + "=" * 60, style="bright_magenta")
         console.print(
             "📨 [bold]NEW FILE MESSAGE RECEIVED![/bold]", style="bright_green"
         )
+        if len(keyring) > 1:
+            console.print(f"👤 For: {identity.name}", style="cyan")
         console.print("=" * 60, style="bright_magenta")
 
         # Step 1: Decrypt metadata
@@ -67,105 +240,549 @@ def receive(
         try:
             with create_progress_bar("Decrypting metadata...") as progress:
                 task = progress.add_task("Decrypting", total=100)
-                payload = decrypt_payload(event, from_nsec)
+                payload = decrypt_payload(event, identity.nsec)
                 progress.update(task, completed=100)
 
             print_step(1, "Metadata decryption completed", "success")
-            console.print(f"   🔗 IPFS CID: {payload['cid'][:8]}...", style="green")
+            if "cid" in payload:
+                console.print(
+                    f"   🔗 IPFS CID: {payload['cid'][:8]}...", style="green"
+                )
 
         except Exception as e:
             print_step(1, "Metadata decryption failed", "error")
             print_error_message("Failed to decrypt metadata", e)
-            return
+            # A message that does not decrypt never will; do not retry it
+            ledger.finish(row_id, INVALID, error=str(e))
+            return None
+
+        # Repeated DMs for a CID we already delivered are skipped outright
+        cid = payload.get("cid")
+        saved = None
+        if cache and cid and not streaming:
+            saved = cache.find_saved(cid)
+        # A delivery into another identity's directory does not count
+        if saved and not _is_within(saved, target_dir):
+            saved = None
+        if saved:
+            console.print(
+                f"♻️  Already received {cid[:8]}... as {saved}, skipping",
+                style="yellow",
+            )
+            console.print("=" * 60, style="bright_magenta")
+            emit_json({"event": "skipped", "cid": cid, "path": saved})
+            ledger.finish(row_id, SKIPPED, cid=cid, path=saved)
+            return None
+
+        download_size, plain_size = transfer_sizes(payload)
+        filename = build_filename_from_payload(payload)
+        ledger.update(
+            row_id, cid=cid, name=filename, size=download_size, plain_size=plain_size
+        )
+        # Refuse transfers the disk cannot hold before downloading anything
+        try:
+            release = (
+                _no_release
+                if streaming
+                else reservations.admit(target_dir, plain_size)
+            )
+        except OSError as e:
+            print_error_message(f"Not enough disk space for {filename}", e)
+            emit_json(
+                {
+                    "event": "rejected",
+                    "file": filename,
+                    "size": plain_size,
+                    "cid": cid,
+                    "reason": "disk space",
+                }
+            )
+            ledger.finish(row_id, REJECTED, error=str(e))
+            return None
+        if plain_size is not None:
+            console.print(f"   📊 Size: {plain_size:,} bytes", style="green")
+        if scheduler.pending:
+            console.print(
+                f"   ⏳ Queued with {scheduler.pending:,} other transfers",
+                style="cyan",
+            )
+
+        future = scheduler.submit(
+            download_size,
+            run_transfer,
+            event,
+            identity,
+            payload,
+            target_dir,
+            release,
+            row_id,
+        )
+        if to_stdout:
+            taken.append(future)
+        return future
 
-        # Step 2: Download from IPFS
-        print_step(2, "Downloading from IPFS")
+    def run_transfer(event, identity, payload, target_dir, release, row_id):
+        """Run one transfer; returns whether it succeeded"""
+        ledger.start(row_id)
         try:
-            with create_progress_bar("Downloading from IPFS...") as progress:
-                task = progress.add_task("Downloading", total=100)
+            if streaming:
+                path = _stream_transfer(event, identity, payload, exec_cmd)
+            elif "bundle" in payload:
+                path = _receive_bundle(payload, target_dir, include, cache)
+            elif "manifest" in payload:
+                path = _receive_large_file(payload, target_dir, cache, release)
+            else:
+                path = _receive_file(
+                    event, identity, payload, target_dir, cache, release
+                )
+        except _TransferFailed as e:
+            ledger.finish(row_id, FAILED, error=str(e))
+            return False
+        except BaseException as e:
+            ledger.finish(row_id, FAILED, error=str(e) or type(e).__name__)
+            raise
+        finally:
+            release()
+        # Partial bundle extractions must not block a later full one
+        status = PARTIAL if include and "bundle" in payload else DONE
+        ledger.finish(row_id, status, path=path)
+        return True
+
+    if include:
+        console.print(f"🔎 [bold]Bundle filter:[/bold] {', '.join(include)}", style="cyan")
+
+    # Transfers a crashed receiver left queued or running are queued again;
+    # a single --stdout transfer leaves them to a regular receiver
+    interrupted = [] if to_stdout else ledger.recover()
+    if interrupted:
+        console.print(
+            f"🩹 [bold]Resuming {len(interrupted):,} interrupted transfers[/bold]",
+            style="cyan",
+        )
+    for row in interrupted:
+        data = json.loads(row["event"])
+        try:
+            callback(DMEvent.from_dict(data, data.get("recipient")))
+        except Exception as e:
+            print_error_message(f"Failed to resume message {data['id'][:8]}...", e)
 
-                # Create temporary file for download
-                import tempfile
+    # Catch up on transfers sent while we were offline, then listen from the
+    # end of the backfill window so nothing in between is missed
+    listen_since = None
+    if since_ts is not None:
+        listen_since = int(time.time())
+        _backfill(keyring, relays, since_ts, listen_since, callback, scheduler)
 
-                temp_file = tempfile.NamedTemporaryFile(delete=False)
-                temp_file_path = temp_file.name
-                temp_file.close()
+    if to_stdout:
+        _receive_to_stdout(keyring, relays, listen_since, callback, taken, scheduler)
+        return
 
-                try:
-                    success = download_from_ipfs(payload["cid"], temp_file_path)
-                    if not success:
-                        raise Exception("Download failed from all sources")
+    # Start listening
+    console.print("🎧 [bold]Starting to listen for Nostr DMs...[/bold]", style="cyan")
+    console.print("   📡 Waiting for file transfer messages...", style="cyan")
+    console.print("   ⏹️  Press Ctrl+C to stop", style="cyan")
+    console.print("=" * 60, style="cyan")
 
-                    # Read the downloaded data
-                    with open(temp_file_path, "rb") as f:
-                        data = f.read()
+    try:
+        receive_loop(keyring, relays, callback, since=listen_since)
+    except KeyboardInterrupt:
+        console.print("\n👋 [bold]Stopping receiver...[/bold]", style="yellow")
+    except Exception as e:
+        print_error_message("Receiver error", e)
+    finally:
+        scheduler.shutdown(wait=False, cancel_pending=True)
 
-                    progress.update(task, completed=100)
-                finally:
-                    # Clean up temp file
-                    os.unlink(temp_file_path)
 
-            print_step(2, "IPFS download completed", "success")
-            console.print(f"   📊 Downloaded: {len(data):,} bytes", style="green")
+class _TransferFailed(Exception):
+    """A transfer failure that has already been reported to the user"""
 
-        except Exception as e:
-            print_step(2, "IPFS download failed", "error")
-            print_error_message("Failed to download from IPFS", e)
-            return
 
-        # Step 3: Decrypt file
-        print_step(3, "Decrypting file")
-        try:
-            with create_progress_bar("Decrypting file...") as progress:
-                task = progress.add_task("Decrypting", total=100)
-                plaintext = decrypt_file(
-                    data, bytes.fromhex(payload["key"]), bytes.fromhex(payload["nonce"])
-                )
-                progress.update(task, completed=100)
+def _no_release() -> None:
+    pass
 
-            print_step(3, "File decryption completed", "success")
-            console.print(f"   📊 Decrypted: {len(plaintext):,} bytes", style="green")
 
+def _receive_to_stdout(
+    keyring: Keyring,
+    relays: List[str],
+    since: Optional[int],
+    callback: Callable,
+    taken: List[Future],
+    scheduler: TransferScheduler,
+) -> None:
+    """Wait for one transfer (unless the backfill found one) and exit"""
+    try:
+        if not taken:
+            console.print(
+                "🎧 [bold]Waiting for a file to write to stdout...[/bold]",
+                style="cyan",
+            )
+            asyncio.run(_take_one(keyring, relays, since, callback, taken))
+        ok = bool(taken) and taken[0].result()
+    except KeyboardInterrupt:
+        console.print("\n👋 [bold]Stopping receiver...[/bold]", style="yellow")
+        ok = False
+    finally:
+        scheduler.shutdown(wait=False, cancel_pending=True)
+    if not ok:
+        raise typer.Exit(1)
+
+
+async def _take_one(
+    keyring: Keyring,
+    relays: List[str],
+    since: Optional[int],
+    callback: Callable,
+    taken: List[Future],
+) -> None:
+    events = iter_dm_events(keyring, relays, since=since)
+    try:
+        async for event in events:
+            try:
+                callback(event)
+            except Exception as e:
+                print_error_message(f"Failed to process message {event.id[:8]}...", e)
+            if taken:
+                return
+    finally:
+        await events.aclose()  # type: ignore[attr-defined]
+
+
+def _is_within(path: str, directory: str) -> bool:
+    directory = os.path.abspath(directory)
+    return os.path.commonpath([os.path.abspath(path), directory]) == directory
+
+
+def _backfill(
+    keyring: Keyring,
+    relays: List[str],
+    since: int,
+    until: int,
+    callback: Callable,
+    scheduler: TransferScheduler,
+) -> None:
+    console.print(
+        f"📚 [bold]Backfilling transfers since {time.strftime('%Y-%m-%d %H:%M', time.localtime(since))}...[/bold]",
+        style="cyan",
+    )
+    try:
+        events = asyncio.run(fetch_dm_history(keyring, since, until, relays))
+    except Exception as e:
+        print_error_message("Backfill failed", e)
+        return
+
+    # Queue the whole backlog before waiting, so the scheduler can move the
+    # smallest transfers ahead of the large ones
+    queued = []
+    processed = 0
+    for event in events:
+        try:
+            future = callback(event)
+        except Exception as e:
+            print_error_message(f"Failed to process message {event.id[:8]}...", e)
+            continue
+        if future is None:
+            processed += 1
+        else:
+            queued.append((event, future))
+
+    for event, future in queued:
+        try:
+            future.result()
+            processed += 1
         except Exception as e:
-            print_step(3, "File decryption failed", "error")
-            print_error_message("Failed to decrypt file", e)
-            return
+            print_error_message(f"Failed to process message {event.id[:8]}...", e)
 
-        # Step 4: Save file
-        print_step(4, "Saving file")
+    console.print(
+        f"📚 [bold]Backfill complete:[/bold] {processed:,} of {len(events):,} messages processed",
+        style="green",
+    )
+    emit_json(
+        {"event": "backfill", "messages": len(events), "processed": processed}
+    )
 
-        filename = build_filename_from_payload(payload)
-        filepath = os.path.join(output_dir, filename)
 
-        # Save file
-        with open(filepath, "wb") as f:
-            f.write(plaintext)
+def _receive_bundle(
+    payload: dict,
+    output_dir: str,
+    include: Optional[List[str]],
+    cache: Optional[ReceiveCache],
+) -> str:
+    info = payload["bundle"]
+    name = build_filename_from_payload(payload)
+    bundle_dir = os.path.join(output_dir, os.path.basename(name))
+    console.print(
+        f"   📦 Bundle: {info['count']:,} files, {info['size']:,} bytes", style="green"
+    )
+
+    # Step 2: Download and extract
+    print_step(2, "Downloading and extracting bundle")
+    try:
+        with create_progress_bar("Extracting bundle...") as progress:
+            task = progress.add_task("Extracting", total=100)
+            written = extract_bundle(payload, bundle_dir, include)
+            progress.update(task, completed=100)
+    except Exception as e:
+        print_step(2, "Bundle extraction failed", "error")
+        print_error_message("Failed to extract bundle", e)
+        raise _TransferFailed(str(e)) from e
+
+    print_step(2, "Bundle extracted successfully", "success")
+    # Partial extractions must not block a later full one
+    if cache and not include:
+        cache.mark_saved(payload["cid"], bundle_dir)
+
+    success_details = {
+        "Bundle": name,
+        "Files": f"{len(written):,} of {info['count']:,}",
+        "Saved to": bundle_dir,
+    }
+    print_success_message("Bundle received successfully!", success_details)
+    emit_json(
+        {
+            "event": "received",
+            "bundle": name,
+            "files": len(written),
+            "path": bundle_dir,
+            "cid": payload["cid"],
+        }
+    )
 
-        print_step(4, "File saved successfully", "success")
-        console.print(f"   📁 Saved: {filepath}", style="green")
+    console.print("=" * 60, style="bright_magenta")
+    return bundle_dir
 
-        print_file_info(filename, len(plaintext), [])
 
-        # Success message
-        success_details = {
-            "File": filename,
-            "Size": f"{len(plaintext):,} bytes",
-            "Saved to": filepath,
+def _receive_large_file(
+    payload: dict,
+    output_dir: str,
+    cache: Optional[ReceiveCache],
+    release: Callable[[], None],
+) -> str:
+    info = payload["manifest"]
+    filename = build_filename_from_payload(payload)
+    filepath = os.path.join(output_dir, os.path.basename(filename))
+    console.print(
+        f"   🧩 Large file: {info['parts']:,} parts, {info['size']:,} bytes",
+        style="green",
+    )
+
+    # Steps 2-4: Download, verify, decrypt and write parts in order
+    print_step(2, "Downloading and decrypting parts")
+    try:
+        with create_progress_bar("Downloading parts...") as progress:
+            task = progress.add_task("Downloading", total=100)
+            # Preallocated space shows up as used, so the reservation is
+            # dropped then instead of counting the file twice
+            size = receive_manifest(payload, filepath, on_allocated=release)
+            progress.update(task, completed=100)
+    except Exception as e:
+        print_step(2, "Part download failed", "error")
+        print_error_message("Failed to receive large file", e)
+        raise _TransferFailed(str(e)) from e
+
+    print_step(4, "File saved successfully", "success")
+    console.print(f"   📁 Saved: {filepath}", style="green")
+    if cache:
+        cache.mark_saved(payload["cid"], filepath, size)
+
+    print_file_info(filename, size, [f"{info['parts']:,} parts"])
+
+    success_details = {
+        "File": filename,
+        "Size": f"{size:,} bytes",
+        "Saved to": filepath,
+    }
+    print_success_message("File received successfully!", success_details)
+    emit_json(
+        {
+            "event": "received",
+            "file": filename,
+            "size": size,
+            "path": filepath,
+            "cid": payload["cid"],
         }
+    )
+
+    console.print("=" * 60, style="bright_magenta")
+    return filepath
+
+
+def _fetch_file(payload: dict, cache: Optional[ReceiveCache]) -> bytes:
+    """Download (or take from the DM or cache) and decrypt a single file"""
+    cid = payload.get("cid")
+    # Step 2: Download from IPFS (inline payloads already carry the data)
+    data = inline_data_from_payload(payload)
+    cached = False
+    if data is None and cache and cid:
+        data = cache.get(cid)
+        cached = data is not None
+
+    if cached:
+        print_step(2, "Served from local cache, skipping IPFS download", "success")
+    elif data is not None:
+        print_step(2, "File embedded in DM, skipping IPFS download", "success")
+    else:
+        print_step(2, "Downloading from IPFS")
+        try:
+            with create_progress_bar("Downloading from IPFS...") as progress:
+                task = progress.add_task("Downloading", total=100)
 
-        print_success_message("File received successfully!", success_details)
+                data = download_bytes_from_ipfs(payload["cid"], payload.get("peer"))
+                verify_ciphertext(payload, data)
+                progress.update(task, completed=100)
 
-        console.print("=" * 60, style="bright_magenta")
+            print_step(2, "IPFS download completed", "success")
+            console.print(f"   📊 Downloaded: {len(data):,} bytes", style="green")
 
-    # Start listening
-    console.print("🎧 [bold]Starting to listen for Nostr DMs...[/bold]", style="cyan")
-    console.print("   📡 Waiting for file transfer messages...", style="cyan")
-    console.print("   ⏹️  Press Ctrl+C to stop", style="cyan")
-    console.print("=" * 60, style="cyan")
+        except Exception as e:
+            print_step(2, "IPFS download failed", "error")
+            print_error_message("Failed to download from IPFS", e)
+            raise _TransferFailed(str(e)) from e
 
+    # Step 3: Decrypt file
+    print_step(3, "Decrypting file")
     try:
-        receive_loop(from_nsec, DEFAULT_RELAYS, callback)
-    except KeyboardInterrupt:
-        console.print("\n👋 [bold]Stopping receiver...[/bold]", style="yellow")
+        with create_progress_bar("Decrypting file...") as progress:
+            task = progress.add_task("Decrypting", total=100)
+            plaintext = decrypt_file(
+                data,
+                bytes.fromhex(payload["key"]),
+                bytes.fromhex(payload["nonce"]),
+                suite=payload.get("suite"),
+                dictionary=payload_dictionary(payload),
+            )
+            progress.update(task, completed=100)
+
+        print_step(3, "File decryption completed", "success")
+        console.print(f"   📊 Decrypted: {len(plaintext):,} bytes", style="green")
+
+        # Only ciphertexts that passed authentication are cached
+        if cache and cid and not cached:
+            cache.put(cid, data)
+
     except Exception as e:
-        print_error_message("Receiver error", e)
+        print_step(3, "File decryption failed", "error")
+        print_error_message("Failed to decrypt file", e)
+        raise _TransferFailed(str(e)) from e
+    return plaintext
+
+
+def _stream_transfer(
+    event,
+    identity,
+    payload: dict,
+    command: Optional[str],
+) -> None:
+    filename = build_filename_from_payload(payload)
+    if "bundle" in payload:
+        e = ValueError("Bundles cannot be streamed; receive them to a directory")
+        print_error_message(f"Cannot stream {filename}", e)
+        raise _TransferFailed(str(e))
+
+    chunks: Iterable[bytes]
+    if "manifest" in payload:
+        info = payload["manifest"]
+        console.print(
+            f"   🧩 Large file: {info['parts']:,} parts, {info['size']:,} bytes",
+            style="green",
+        )
+        # Parts are downloaded ahead and released one by one as they verify
+        chunks = iter_manifest_parts(payload)
+    else:
+        # The ciphertext is held in memory and never written to the cache
+        chunks = [_fetch_file(payload, None)]
+
+    _, plain_size = transfer_sizes(payload)
+    target = command or "stdout"
+    print_step(4, f"Streaming to {target}")
+    try:
+        with create_progress_bar("Streaming file...") as progress:
+            task = progress.add_task("Streaming", total=100)
+            if command is None:
+                size = stream_to_stdout(chunks)
+            else:
+                env = handler_env(
+                    filename,
+                    size=plain_size,
+                    cid=payload.get("cid"),
+                    sender=event.pubkey,
+                    identity=identity.name,
+                    event_id=event.id,
+                )
+                size = stream_to_command(command, chunks, env)
+            progress.update(task, completed=100)
+    except Exception as e:
+        print_step(4, "Streaming failed", "error")
+        print_error_message(f"Failed to stream {filename} to {target}", e)
+        raise _TransferFailed(str(e)) from e
+
+    print_step(4, "File streamed successfully", "success")
+    print_success_message(
+        "File received successfully!",
+        {"File": filename, "Size": f"{size:,} bytes", "Sent to": target},
+    )
+    emit_json(
+        {
+            "event": "received",
+            "file": filename,
+            "size": size,
+            "sink": target,
+            "cid": payload.get("cid"),
+            "from": event.pubkey,
+            "identity": identity.name,
+        }
+    )
+    console.print("=" * 60, style="bright_magenta")
+
+
+def _receive_file(
+    event,
+    identity,
+    payload: dict,
+    output_dir: str,
+    cache: Optional[ReceiveCache],
+    release: Callable[[], None],
+) -> str:
+    cid = payload.get("cid")
+    plaintext = _fetch_file(payload, cache)
+
+    # Step 4: Save file
+    print_step(4, "Saving file")
+
+    filename = build_filename_from_payload(payload)
+    filepath = os.path.join(output_dir, filename)
+
+    # Save file
+    with open(filepath, "wb") as f:
+        if preallocate(f, len(plaintext)):
+            release()
+        f.write(plaintext)
+
+    print_step(4, "File saved successfully", "success")
+    console.print(f"   📁 Saved: {filepath}", style="green")
+    if cache and cid:
+        cache.mark_saved(cid, filepath, len(plaintext))
+
+    print_file_info(filename, len(plaintext), [])
+
+    # Success message
+    success_details = {
+        "File": filename,
+        "Size": f"{len(plaintext):,} bytes",
+        "Saved to": filepath,
+    }
+
+    print_success_message("File received successfully!", success_details)
+    emit_json(
+        {
+            "event": "received",
+            "file": filename,
+            "size": len(plaintext),
+            "path": filepath,
+            "cid": cid,
+            "from": event.pubkey,
+            "identity": identity.name,
+        }
+    )
+
+    console.print("=" * 60, style="bright_magenta")
+    return filepath
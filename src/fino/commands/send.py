@@ -1,11 +1,37 @@
+import hashlib
+import sys
 import typer
 from pathlib import Path
-from ..encryption import encrypt_file
-from ..ipfs import upload_to_ipfs
-from ..nostr import encrypt_payload, send_dm, DEFAULT_RELAYS
-from ..utils import build_payload
+from typing import List, Optional
+from ..encryption import encrypt_data, generate_key, preferred_suite
+from ..bundle import build_bundle_payload, create_bundle
+from ..dictionaries import dictionary_for
+from ..manifest import (
+    get_manifest_threshold,
+    get_part_size,
+    send_manifest,
+    send_manifest_stream,
+)
+from ..ipfs import (
+    discard_upload_file,
+    get_node_peer_info,
+    upload_bytes_to_ipfs,
+    upload_to_ipfs,
+)
+from ..ledger import FAILED, SEND, get_ledger
+from ..nostr import encrypt_payload, send_dm
+from ..profiling import stage
+from ..relays import select_relays
+from ..utils import (
+    build_payload,
+    get_inline_threshold,
+    read_full,
+    transfer_sizes,
+)
 from ..console import (
     console,
+    emit_json,
+    print_error_message,
     print_header,
     print_step,
     print_file_info,
@@ -18,96 +44,441 @@ app = typer.Typer(help="Send encrypted files via Nostr DMs and IPFS storage")
 
 @app.command()
 def send(
-    file: Path = typer.Argument(..., exists=True, help="File to send"),
+    file: Path = typer.Argument(
+        ...,
+        exists=True,
+        allow_dash=True,
+        help="File to send, a directory to send as one bundle, or - for stdin",
+    ),
     to: str = typer.Option(..., "--to", help="Recipient's npub (public key)"),
     from_nsec: str = typer.Option(..., "--from", help="Your nsec (private key)"),
+    name: Optional[str] = typer.Option(
+        None, "--name", help="File name to send stdin under (required with -)"
+    ),
+    inline_threshold: Optional[int] = typer.Option(
+        None,
+        "--inline-threshold",
+        help="Embed encrypted files up to this many bytes in the DM instead of IPFS",
+    ),
+    part_size: Optional[int] = typer.Option(
+        None,
+        "--part-size",
+        help="Split files larger than the manifest threshold into parts of this many bytes",
+    ),
+    relay: Optional[List[str]] = typer.Option(
+        None,
+        "--relay",
+        help="Relay to publish to (repeatable; default: best configured relays)",
+    ),
+    dict_name: Optional[str] = typer.Option(
+        None,
+        "--dict",
+        help="Compress with this zstd dictionary (name or ID; see fino dict)",
+    ),
 ):
     """
     Send an encrypted file via Nostr DMs and IPFS storage.
 
     This command:
-    1. Encrypts the file with AES-256-GCM
+    1. Encrypts the file with AES-256-GCM or ChaCha20-Poly1305 (whichever
+       is faster on this machine)
     2. Uploads the encrypted file to IPFS
     3. Sends the decryption metadata via Nostr DMs
     4. Recipient can download and decrypt the file
 
+    Directories are sent as a single encrypted bundle (one CID, one DM).
+    Large files are split into parts uploaded in parallel under a manifest.
+    Small files are compressed with the recipient's zstd dictionary when one
+    has been trained for them (see fino dict).
+
+    With - as the file, stdin is read part by part and each part is
+    encrypted and uploaded while the producer is still writing, e.g.
+    pg_dump mydb | fino send - --name mydb.sql --to ... --from ...
+
     ⚠️  This is experimental software for innovation research only.
     """
     # Beautiful header
     print_header("FiNo File Sending Process", "Secure, Anonymous, Decentralized")
 
+    stdin = str(file) == "-"
+    if stdin and not name:
+        raise typer.BadParameter(
+            "A file name is required when sending stdin", param_hint="--name"
+        )
+
+    relays = select_relays(relay)
+
+    # Recorded as running now, so a crash shows up in `fino history`
+    ledger = get_ledger()
+    if stdin:
+        row_id = ledger.begin(SEND, name, to)
+    else:
+        row_id = ledger.begin(
+            SEND, file.name, to, None if file.is_dir() else file.stat().st_size
+        )
+    try:
+        if stdin:
+            assert name is not None
+            _send_stdin(
+                name,
+                to,
+                from_nsec,
+                inline_threshold,
+                part_size,
+                relays,
+                dict_name,
+                row_id,
+            )
+        else:
+            _send(
+                file,
+                to,
+                from_nsec,
+                inline_threshold,
+                part_size,
+                relays,
+                dict_name,
+                row_id,
+            )
+    except BaseException as e:
+        ledger.finish(row_id, FAILED, error=str(e) or type(e).__name__)
+        raise
+
+
+def _send(
+    file: Path,
+    to: str,
+    from_nsec: str,
+    inline_threshold: Optional[int],
+    part_size: Optional[int],
+    relays: List[str],
+    dict_name: Optional[str],
+    row_id: int,
+) -> None:
+    if file.is_dir():
+        _send_directory(file, to, from_nsec, relays, row_id)
+        return
+
     # Show file info
     file_size = file.stat().st_size
     print_file_info(file.name, file_size, [])
 
     console.print("=" * 60, style="cyan")
 
+    if file_size >= get_manifest_threshold():
+        _send_large_file(file, file_size, to, from_nsec, part_size, relays, row_id)
+        return
+
+    with stage("read"):
+        data = file.read_bytes()
+    _send_data(
+        data, file.name, to, from_nsec, inline_threshold, relays, dict_name, row_id
+    )
+
+
+def _send_stdin(
+    name: str,
+    to: str,
+    from_nsec: str,
+    inline_threshold: Optional[int],
+    part_size: Optional[int],
+    relays: List[str],
+    dict_name: Optional[str],
+    row_id: int,
+) -> None:
+    stream = sys.stdin.buffer
+    part_size = part_size or get_part_size()
+
+    # Input that ends within the first part is sent like a regular file
+    # (inline or one CID); anything longer is streamed as manifest parts
+    with stage("read"):
+        head = read_full(stream, part_size)
+    if len(head) < part_size:
+        print_file_info(name, len(head), ["Read from stdin"])
+        console.print("=" * 60, style="cyan")
+        _send_data(
+            head, name, to, from_nsec, inline_threshold, relays, dict_name, row_id
+        )
+        return
+
+    console.print(f"📥 Streaming stdin as {name}", style="cyan")
+    console.print("=" * 60, style="cyan")
+    suite = preferred_suite()
+    print_step(1, f"Encrypting and uploading stdin with {suite.upper()}")
+    with create_progress_bar("Uploading parts...") as progress:
+        task = progress.add_task("Uploading", total=100)
+        payload = send_manifest_stream(
+            stream, name, part_size=part_size, suite=suite, first=head
+        )
+        progress.update(task, completed=100)
+
+    size = payload["manifest"]["size"]
+    parts = payload["manifest"]["parts"]
+    print_step(2, f"Uploaded {size:,} bytes in {parts:,} parts", "success")
+    console.print(f"   🔗 Manifest CID: {payload['cid']}", style="green")
+
+    # Step 4: Send via Nostr
+    _send_payload(payload, to, from_nsec, relays, row_id)
+
+    success_details = {
+        "File": name,
+        "Size": f"{size:,} bytes",
+        "Parts": f"{parts:,}",
+        "Manifest CID": payload["cid"],
+        "Recipient": f"{to[:8]}...",
+    }
+    print_success_message("Stream sent successfully!", success_details)
+    emit_json(
+        {
+            "event": "sent",
+            "file": name,
+            "size": size,
+            "parts": parts,
+            "cid": payload["cid"],
+            "to": to,
+        }
+    )
+
+    console.print(
+        "\n⚠️  [italic]This is experimental software for innovation research only.[/italic]",
+        style="yellow",
+    )
+
+
+def _send_data(
+    data: bytes,
+    name: str,
+    to: str,
+    from_nsec: str,
+    inline_threshold: Optional[int],
+    relays: List[str],
+    dict_name: Optional[str],
+    row_id: int,
+) -> None:
+    file_size = len(data)
+
     # Step 1: File encryption
-    print_step(1, "Encrypting file with AES-256-GCM")
+    suite = preferred_suite()
+    try:
+        dictionary, dict_ref = dictionary_for(to, file_size, dict_name)
+    except (KeyError, RuntimeError, FileNotFoundError) as e:
+        raise typer.BadParameter(str(e), param_hint="--dict")
+    compression = " and a zstd dictionary" if dictionary else ""
+    print_step(1, f"Encrypting file with {suite.upper()}{compression}")
     with create_progress_bar("Encrypting file...") as progress:
         task = progress.add_task("Encrypting", total=100)
-        ciphertext, key, nonce = encrypt_file(str(file))
+        key = generate_key()
+        ciphertext, nonce = encrypt_data(
+            data, key, suite=suite, dictionary=dictionary
+        )
         progress.update(task, completed=100)
 
     print_step(1, "File encryption completed", "success")
     console.print(f"   📊 Encrypted size: {len(ciphertext):,} bytes", style="green")
 
-    # Step 2: IPFS upload
-    print_step(2, "Uploading to IPFS")
-    with create_progress_bar("Uploading to IPFS...") as progress:
-        task = progress.add_task("Uploading", total=100)
+    if inline_threshold is None:
+        inline_threshold = get_inline_threshold()
+    inline = len(ciphertext) <= inline_threshold
 
-        # Create temporary file for upload
-        import tempfile
-        import os
-
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=f"_{file.name}"
-        ) as temp_file:
-            temp_file.write(ciphertext)
-            temp_file_path = temp_file.name
-
-        try:
-            cid = upload_to_ipfs(
-                temp_file_path,
+    # Step 2: IPFS upload
+    cid = None
+    if inline:
+        print_step(2, "Small file - embedding in DM, skipping IPFS", "success")
+    else:
+        print_step(2, "Uploading to IPFS")
+        with create_progress_bar("Uploading to IPFS...") as progress:
+            task = progress.add_task("Uploading", total=100)
+            cid = upload_bytes_to_ipfs(
+                ciphertext,
+                suffix=f"_{name}",
                 announce=True,
                 background_announce=True,
             )
             progress.update(task, completed=100)
-        finally:
-            # Clean up temp file
-            os.unlink(temp_file_path)
 
-    print_step(2, "IPFS upload completed", "success")
-    console.print(f"   🔗 IPFS CID: {cid}", style="green")
+        print_step(2, "IPFS upload completed", "success")
+        console.print(f"   🔗 IPFS CID: {cid}", style="green")
 
     # Step 3: Metadata preparation
     print_step(3, "Preparing encrypted metadata")
 
     # Build payload
-    payload = build_payload(cid, key, nonce, file.name)
+    payload = build_payload(
+        cid,
+        key,
+        nonce,
+        name,
+        data=ciphertext if inline else None,
+        peer=None if inline else get_node_peer_info(),
+        size=None if inline else len(ciphertext),
+        plain_size=file_size,
+        sha256=None if inline else hashlib.sha256(ciphertext).hexdigest(),
+        suite=suite,
+        dictionary=dict_ref,
+    )
 
     print_step(3, "Metadata preparation completed", "success")
 
     # Step 4: Send via Nostr
+    _send_payload(payload, to, from_nsec, relays, row_id)
+
+    # Success message
+    success_details = {
+        "File": name,
+        "Size": f"{file_size:,} bytes",
+        "IPFS CID": cid or "inline (sent in DM)",
+        "Recipient": f"{to[:8]}...",
+    }
+
+    print_success_message("File sent successfully!", success_details)
+    emit_json(
+        {
+            "event": "sent",
+            "file": name,
+            "size": file_size,
+            "cid": cid,
+            "inline": inline,
+            "to": to,
+        }
+    )
+
+    console.print(
+        "\n⚠️  [italic]This is experimental software for innovation research only.[/italic]",
+        style="yellow",
+    )
+
+
+def _send_payload(
+    payload: dict, to: str, from_nsec: str, relays: List[str], row_id: int
+) -> None:
     print_step(4, "Sending via Nostr DM")
-    with create_progress_bar("Sending encrypted metadata...") as progress:
-        task = progress.add_task("Sending", total=100)
-        enc = encrypt_payload(payload, to, from_nsec)
-        send_dm(from_nsec, to, enc, DEFAULT_RELAYS)
-        progress.update(task, completed=100)
+    try:
+        with create_progress_bar("Sending encrypted metadata...") as progress:
+            task = progress.add_task("Sending", total=100)
+            enc = encrypt_payload(payload, to, from_nsec)
+            event_id, results = send_dm(from_nsec, to, enc, relays)
+            progress.update(task, completed=100)
+    except ConnectionError as e:
+        # Raised on so the ledger records the send as failed
+        print_step(4, "Nostr transmission failed", "error")
+        print_error_message("No relay accepted the message", e)
+        raise
 
     print_step(4, "Nostr transmission completed", "success")
+    accepted = sum(results.values())
+    console.print(f"   📡 Accepted by {accepted}/{len(results)} relays", style="green")
+    size, plain_size = transfer_sizes(payload)
+    get_ledger().finish(
+        row_id,
+        event_id=event_id,
+        cid=payload.get("cid"),
+        size=size,
+        plain_size=plain_size,
+    )
+
+
+def _send_directory(
+    directory: Path, to: str, from_nsec: str, relays: List[str], row_id: int
+) -> None:
+    # Step 1: Bundle and encrypt every file
+    suite = preferred_suite()
+    print_step(1, f"Bundling and encrypting files with {suite.upper()}")
+    with create_progress_bar("Bundling files...") as progress:
+        task = progress.add_task("Bundling", total=100)
+        bundle_path, key, index_nonce, info = create_bundle(directory, suite)
+        progress.update(task, completed=100)
+
+    print_step(1, "Bundle encryption completed", "success")
+    print_file_info(directory.name, info["size"], [f"Bundle of {info['count']:,} files"])
+
+    # Step 2: IPFS upload
+    print_step(2, "Uploading bundle to IPFS")
+    try:
+        with create_progress_bar("Uploading to IPFS...") as progress:
+            task = progress.add_task("Uploading", total=100)
+            cid = upload_to_ipfs(bundle_path, announce=True, background_announce=True)
+            progress.update(task, completed=100)
+    finally:
+        discard_upload_file(bundle_path)
+
+    print_step(2, "IPFS upload completed", "success")
+    console.print(f"   🔗 IPFS CID: {cid}", style="green")
+
+    # Step 3: Metadata preparation
+    print_step(3, "Preparing encrypted metadata")
+    payload = build_bundle_payload(cid, key, index_nonce, directory.name, info)
+    print_step(3, "Metadata preparation completed", "success")
+
+    # Step 4: Send via Nostr
+    _send_payload(payload, to, from_nsec, relays, row_id)
 
-    # Success message
     success_details = {
-        "File": file.name,
-        "Size": f"{file_size:,} bytes",
+        "Bundle": directory.name,
+        "Files": f"{info['count']:,}",
+        "Size": f"{info['size']:,} bytes",
         "IPFS CID": cid,
         "Recipient": f"{to[:8]}...",
     }
+    print_success_message("Bundle sent successfully!", success_details)
+    emit_json(
+        {
+            "event": "sent",
+            "bundle": directory.name,
+            "files": info["count"],
+            "size": info["size"],
+            "cid": cid,
+            "to": to,
+        }
+    )
+
+    console.print(
+        "\n⚠️  [italic]This is experimental software for innovation research only.[/italic]",
+        style="yellow",
+    )
+
 
+def _send_large_file(
+    file: Path,
+    file_size: int,
+    to: str,
+    from_nsec: str,
+    part_size: Optional[int],
+    relays: List[str],
+    row_id: int,
+) -> None:
+    # Steps 1-2: Encrypt and upload parts in parallel
+    suite = preferred_suite()
+    print_step(1, f"Encrypting and uploading parts with {suite.upper()}")
+    with create_progress_bar("Uploading parts...") as progress:
+        task = progress.add_task("Uploading", total=100)
+        payload = send_manifest(file, part_size=part_size, suite=suite)
+        progress.update(task, completed=100)
+
+    parts = payload["manifest"]["parts"]
+    print_step(2, f"Uploaded {parts:,} parts and manifest", "success")
+    console.print(f"   🔗 Manifest CID: {payload['cid']}", style="green")
+
+    # Step 4: Send via Nostr
+    _send_payload(payload, to, from_nsec, relays, row_id)
+
+    success_details = {
+        "File": file.name,
+        "Size": f"{file_size:,} bytes",
+        "Parts": f"{parts:,}",
+        "Manifest CID": payload["cid"],
+        "Recipient": f"{to[:8]}...",
+    }
     print_success_message("File sent successfully!", success_details)
+    emit_json(
+        {
+            "event": "sent",
+            "file": file.name,
+            "size": file_size,
+            "parts": parts,
+            "cid": payload["cid"],
+            "to": to,
+        }
+    )
 
     console.print(
         "\n⚠️  [italic]This is experimental software for innovation research only.[/italic]",
@@ -0,0 +1,123 @@
+import asyncio
+import typer
+from pathlib import Path
+from typing import List, Optional
+from ..pins import start_background_gc
+from ..provide import resume_pending_provides
+from ..watch import FolderWatcher
+from ..console import (
+    console,
+    emit_json,
+    print_header,
+    print_error_message,
+    print_warning_message,
+)
+
+app = typer.Typer(help="Send files dropped into a directory as they appear")
+
+
+@app.command()
+def watch(
+    directory: Path = typer.Argument(
+        ..., exists=True, file_okay=False, help="Directory to watch"
+    ),
+    to: str = typer.Option(..., "--to", help="Recipient's npub (public key)"),
+    from_nsec: str = typer.Option(..., "--from", help="Your nsec (private key)"),
+    relay: Optional[List[str]] = typer.Option(
+        None,
+        "--relay",
+        help="Relay to publish to (repeatable; default: best configured relays)",
+    ),
+    concurrency: Optional[int] = typer.Option(
+        None,
+        "--concurrency",
+        help="Files to send at once (default: config transfer_workers)",
+    ),
+    settle: Optional[float] = typer.Option(
+        None,
+        "--settle",
+        help="Seconds a file must stay unchanged before it is sent (default: 2)",
+    ),
+    interval: Optional[float] = typer.Option(
+        None,
+        "--interval",
+        help="Seconds between scans when polling (default: 2)",
+    ),
+    ignore: Optional[List[str]] = typer.Option(
+        None,
+        "--ignore",
+        help="Glob of file or directory names to skip (repeatable)",
+    ),
+    dict_name: Optional[str] = typer.Option(
+        None,
+        "--dict",
+        help="Compress with this zstd dictionary (name or ID; see fino dict)",
+    ),
+    poll: bool = typer.Option(
+        False, "--poll", help="Poll the directory instead of using inotify"
+    ),
+    once: bool = typer.Option(
+        False, "--once", help="Send new and changed files, then exit"
+    ),
+):
+    """
+    Watch a directory and send new or changed files to a recipient.
+
+    Files are sent once they stop changing for --settle seconds, so files
+    still being written are not shipped half done. What was sent is
+    remembered in ~/.fino/watch/, so restarting the watcher (or running it
+    with --once from cron) only sends new or modified files. Hidden files
+    and temporary names (*.tmp, *.part, *~, ...) are skipped. Files in
+    subdirectories are sent under their own file name.
+    """
+    print_header("FiNo Watch Folder", "Send files as they appear")
+
+    def on_sent(rel: str, size: int, cid: Optional[str]) -> None:
+        console.print(
+            f"📤 Sent {rel} ({size:,} bytes) → {cid or 'inline'}", style="green"
+        )
+        emit_json(
+            {
+                "event": "sent",
+                "file": rel,
+                "size": size,
+                "cid": cid,
+                "inline": cid is None,
+                "to": to,
+            }
+        )
+
+    def on_failed(rel: str, error: Exception) -> None:
+        print_warning_message(f"Sending {rel} failed: {error}")
+        emit_json({"event": "send_failed", "file": rel, "error": str(error)})
+
+    watcher = FolderWatcher(
+        directory,
+        to,
+        from_nsec,
+        relays=relay,
+        concurrency=concurrency,
+        settle=settle,
+        interval=interval,
+        ignore=ignore,
+        use_inotify=not poll,
+        dictionary=dict_name,
+        on_sent=on_sent,
+        on_failed=on_failed,
+    )
+
+    if not once:
+        console.print(
+            f"👀 Watching {directory} for {to[:8]}... (Ctrl+C to stop)",
+            style="cyan",
+        )
+        start_background_gc()
+    resume_pending_provides()
+
+    try:
+        asyncio.run(watcher.run(once=once))
+    except KeyboardInterrupt:
+        console.print("\n👋 Stopped watching", style="yellow")
+    except Exception as e:
+        print_error_message("Watcher error", e)
+        raise typer.Exit(1)
@@ -1,4 +1,8 @@
-from typing import Any, Dict, List, Optional
+import json
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
@@ -26,17 +30,65 @@ custom_theme = Theme(
     }
 )
 
-# Shared Rich console with custom theme
+# Shared Rich console with custom theme; styling only applies on a terminal
 console = Console(
-    theme=custom_theme, markup=True, emoji=True, force_terminal=True, color_system="256"
+    theme=custom_theme,
+    markup=True,
+    emoji=True,
+    color_system="256" if sys.stdout.isatty() else None,
 )
 
-# Pretty tracebacks
-install(show_locals=False, console=console)
+# Pretty tracebacks for interactive use only
+if console.is_terminal:
+    install(show_locals=False, console=console)
+
+_json_mode = False
+_json_stream = sys.stdout
+
+
+def configure_output(quiet: bool = False, json_out: bool = False) -> None:
+    """
+    Apply the global output flags to the shared console.
+
+    Rich output is disabled entirely with ``--quiet`` and in ``--json`` mode,
+    where stdout carries one JSON object per line instead. The ``print_*``
+    helpers then return before building any panel or table.
+    """
+    global _json_mode
+    _json_mode = json_out
+    console.quiet = quiet or json_out
+
+
+def _silenced() -> bool:
+    # Rich renders everything before dropping it on a quiet console
+    return console.quiet
+
+
+def use_stderr() -> None:
+    """
+    Move all console output and ``--json`` records to stderr, for commands
+    that write file data to stdout.
+    """
+    global _json_stream
+    _json_stream = sys.stderr
+    console.file = sys.stderr
+
+
+def is_json_mode() -> bool:
+    return _json_mode
+
+
+def emit_json(record: Dict[str, Any]) -> None:
+    """Write one machine-readable result line to stdout in ``--json`` mode"""
+    if _json_mode:
+        _json_stream.write(json.dumps(record) + "\n")
+        _json_stream.flush()
 
 
 def print_header(title: str, subtitle: Optional[str] = None) -> None:
     """Print a SICK header with title and optional subtitle"""
+    if _silenced():
+        return
     header_text = Text(f"🔥 {title}", style="bright_magenta bold")
     if subtitle:
         header_text.append(f"\n{subtitle}", style="cyan")
@@ -53,6 +105,8 @@ def print_header(title: str, subtitle: Optional[str] = None) -> None:
 
 def print_step(step_num: int, title: str, status: str = "working") -> None:
     """Print a step with status indicator"""
+    if _silenced():
+        return
     step_emoji = "🔄" if status == "working" else "✅" if status == "success" else "❌"
     step_style = (
         "cyan" if status == "working" else "green" if status == "success" else "red"
@@ -65,28 +119,61 @@ def print_step(step_num: int, title: str, status: str = "working") -> None:
 
 def print_feature_badge(feature: str, enabled: bool = True) -> None:
     """Print a feature badge"""
+    if _silenced():
+        return
     if enabled:
         console.print(f"🎭 [bold]{feature}[/bold]", style="bright_magenta")
     else:
         console.print(f"⚪ {feature}", style="dim")
 
 
-def create_progress_bar(description: str):
-    """Create a progress bar for operations"""
-    return Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TimeElapsedColumn(),
-        console=console,
-    )
+class _NoProgress:
+    """Stand-in for a progress bar while another one is on screen"""
+
+    def add_task(self, *args: Any, **kwargs: Any) -> int:
+        return 0
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+# Rich allows one live display per console; concurrent transfers share it
+_progress_lock = threading.Lock()
+
+
+@contextmanager
+def create_progress_bar(description: str) -> Iterator[Union[Progress, _NoProgress]]:
+    """
+    Create a progress bar for operations.
+
+    Only one bar is shown at a time: while transfers run in parallel, the
+    others get a stand-in that ignores updates, so live displays never
+    collide (an error on older rich) or interleave. Nothing is drawn when
+    output is silenced.
+    """
+    if _silenced() or not _progress_lock.acquire(blocking=False):
+        yield _NoProgress()
+        return
+    try:
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+            TimeElapsedColumn(),
+            console=console,
+        ) as progress:
+            yield progress
+    finally:
+        _progress_lock.release()
 
 
 def print_file_info(
     filename: str, size: int, features: Optional[List[Any]] = None
 ) -> None:
     """Print file information in a beautiful table"""
+    if _silenced():
+        return
     table = Table(
         title="📁 File Information", show_header=True, header_style="bold magenta"
     )
@@ -105,6 +192,8 @@ def print_file_info(
 
 def animate_loading(description: str, duration: float = 2.0) -> None:
     """Animate a loading spinner"""
+    if _silenced():
+        return
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -119,6 +208,8 @@ def print_success_message(
     message: str, details: Optional[Dict[str, Any]] = None
 ) -> None:
     """Print a success message with optional details"""
+    if _silenced():
+        return
     success_panel = Panel(
         Text(f"🎉 {message}", style="bright_green bold"), border_style="green"
     )
@@ -137,18 +228,80 @@ def print_success_message(
 
 def print_error_message(message: str, error: Optional[Exception] = None) -> None:
     """Print an error message with optional exception details"""
-    error_panel = Panel(
-        Text(f"❌ {message}", style="bright_red bold"), border_style="red"
-    )
-    console.print(error_panel)
+    if not _silenced():
+        error_panel = Panel(
+            Text(f"❌ {message}", style="bright_red bold"), border_style="red"
+        )
+        console.print(error_panel)
 
+        if error:
+            console.print(f"Error details: {error}", style="red")
+
+    record: Dict[str, Any] = {"event": "error", "message": message}
     if error:
-        console.print(f"Error details: {error}", style="red")
+        record["error"] = str(error)
+    emit_json(record)
 
 
 def print_warning_message(message: str) -> None:
     """Print a warning message"""
+    if _silenced():
+        return
     warning_panel = Panel(
         Text(f"⚠️ {message}", style="bright_yellow bold"), border_style="yellow"
     )
     console.print(warning_panel)
+
+
+def print_profile_report(
+    wall_time: float,
+    stages: Dict[str, Tuple[float, int]],
+    hot: List[Tuple[str, float, float]],
+    output_path: Optional[str],
+) -> None:
+    """
+    Print ``--profile`` results to stderr, or emit them as one JSON record in
+    ``--json`` mode, so stdout stays clean either way.
+    """
+    if _json_mode:
+        emit_json(
+            {
+                "event": "profile",
+                "wall_time": wall_time,
+                "stages": {
+                    name: {"seconds": seconds, "calls": calls}
+                    for name, (seconds, calls) in stages.items()
+                },
+                "hot": [
+                    {"function": name, "self": own, "cumulative": cumulative}
+                    for name, own, cumulative in hot
+                ],
+                "output": output_path,
+            }
+        )
+        return
+
+    err = Console(stderr=True, theme=custom_theme)
+    err.print(f"\n⏱️  [bold]Profile[/bold] ({wall_time:.2f}s wall time)", style="cyan")
+
+    if stages:
+        table = Table(title="Pipeline stages", header_style="bold magenta")
+        table.add_column("Stage", style="cyan")
+        table.add_column("Seconds", justify="right")
+        table.add_column("Calls", justify="right")
+        table.add_column("% of wall", justify="right")
+        for name, (seconds, calls) in stages.items():
+            share = 100 * seconds / wall_time if wall_time else 0.0
+            table.add_row(name, f"{seconds:.3f}", f"{calls:,}", f"{share:.1f}")
+        err.print(table)
+
+    table = Table(title="Hottest functions", header_style="bold magenta")
+    table.add_column("Function", style="cyan", overflow="fold")
+    table.add_column("Self s", justify="right")
+    table.add_column("Cumulative s", justify="right")
+    for name, own, cumulative in hot:
+        table.add_row(name, f"{own:.3f}", f"{cumulative:.3f}")
+    err.print(table)
+
+    if output_path:
+        err.print(f"📄 Profile written to {output_path}", style="green")
@@ -0,0 +1,252 @@
+"""
+Shared zstd dictionaries for sending many small, similar files.
+
+Compressed one at a time, small JSON or log files barely shrink because
+each one starts without context. A dictionary trained on a sample corpus
+(``fino dict train``) gives every file that context up front. Dictionaries
+are stored in ``~/.fino/dicts`` under an ID derived from their SHA-256 and
+selected per recipient or by name. The first transfer that uses one uploads
+it encrypted to IPFS; payloads then reference it by ID with that upload's
+CID and key, so a receiver fetches each dictionary once and serves later
+files from its own cache.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .encryption import (
+    DEFAULT_SUITE,
+    decrypt_file,
+    encrypt_data,
+    generate_key,
+    require_zstd,
+    zstd_available,
+)
+from .ledger import peer_hex
+from .utils import get_config_dir, get_config_value, get_size_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DICT_SIZE = 112 * 1024
+# Larger files carry enough context of their own
+DEFAULT_DICT_MAX_FILE = 1024 * 1024
+# Uploads are republished when their pin is about to expire
+_REPUBLISH_MARGIN = 24 * 3600
+_ID_LENGTH = 32
+
+
+def dictionary_id(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:_ID_LENGTH]
+
+
+def train_dictionary(samples: Iterable[bytes], size: int = DEFAULT_DICT_SIZE) -> bytes:
+    """Train a zstd dictionary of at most ``size`` bytes from sample files"""
+    zstd = require_zstd()
+    return zstd.train_dictionary(size, list(samples)).as_bytes()
+
+
+class DictionaryStore:
+    """Dictionaries on disk, their names, recipients and IPFS uploads"""
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = directory or get_config_dir() / "dicts"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._index_file = self.directory / "index.json"
+        self._lock = threading.Lock()
+        # Serializes uploads so concurrent sends publish a dictionary once
+        self._publish_lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {}
+        if self._index_file.exists():
+            try:
+                with open(self._index_file, "r") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                pass
+        for section in ("dicts", "names", "peers"):
+            data.setdefault(section, {})
+        return data
+
+    def _save(self, data: Dict[str, Any]) -> None:
+        tmp = self._index_file.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self._index_file)
+
+    def _path(self, dict_id: str) -> Path:
+        return self.directory / f"{dict_id}.zdict"
+
+    def add(self, data: bytes) -> str:
+        """Store a dictionary; returns its ID"""
+        dict_id = dictionary_id(data)
+        path = self._path(dict_id)
+        if not path.exists():
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        with self._lock:
+            index = self._load()
+            index["dicts"].setdefault(
+                dict_id, {"size": len(data), "created_at": time.time()}
+            )
+            self._save(index)
+        return dict_id
+
+    def load(self, dict_id: str) -> Optional[bytes]:
+        try:
+            return self._path(dict_id).read_bytes()
+        except OSError:
+            return None
+
+    def assign(
+        self, dict_id: str, name: Optional[str] = None, peer: Optional[str] = None
+    ) -> None:
+        """Make ``dict_id`` the dictionary for a name and/or a recipient"""
+        with self._lock:
+            index = self._load()
+            if name:
+                index["names"][name] = dict_id
+            if peer:
+                index["peers"][peer_hex(peer)] = dict_id
+            self._save(index)
+
+    def resolve(
+        self, name: Optional[str] = None, peer: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Dictionary ID for an explicit name (or ID), else the recipient's
+        dictionary, else the one named by the ``zstd_dict`` config value
+        """
+        index = self._load()
+        if name:
+            if name in index["dicts"]:
+                return name
+            if name not in index["names"]:
+                raise KeyError(f"Unknown dictionary {name!r}")
+            return index["names"][name]
+        if peer and peer_hex(peer) in index["peers"]:
+            return index["peers"][peer_hex(peer)]
+        default = get_config_value("zstd_dict")
+        return index["names"].get(default) if default else None
+
+    def entries(self) -> Dict[str, Any]:
+        return self._load()
+
+    def reference(self, dict_id: str, data: bytes) -> Dict[str, Any]:
+        """
+        Payload reference for ``dict_id``, uploading the dictionary first if
+        it has no live upload
+        """
+        from .ipfs import upload_bytes_to_ipfs
+        from .pins import get_pin_index
+
+        with self._publish_lock:
+            upload = self._load()["dicts"].get(dict_id, {}).get("upload")
+            pin = get_pin_index().pins.get(upload["cid"]) if upload else None
+            expires_at = pin.get("expires_at", 0) if pin else 0
+            if expires_at - time.time() < _REPUBLISH_MARGIN:
+                key = generate_key()
+                ciphertext, nonce = encrypt_data(data, key, suite=DEFAULT_SUITE)
+                cid = upload_bytes_to_ipfs(ciphertext, suffix=f"_{dict_id}.zdict")
+                upload = {
+                    "cid": cid,
+                    "key": key.hex(),
+                    "nonce": nonce.hex(),
+                    "suite": DEFAULT_SUITE,
+                }
+                with self._lock:
+                    index = self._load()
+                    index["dicts"].setdefault(dict_id, {"size": len(data)})
+                    index["dicts"][dict_id]["upload"] = upload
+                    self._save(index)
+                logger.info("📚 Published dictionary %s... as %s", dict_id[:8], cid)
+        return {"id": dict_id, **upload}
+
+    def fetch(self, ref: Dict[str, Any]) -> bytes:
+        """Dictionary for a payload reference, downloading it if not cached"""
+        from .ipfs import download_bytes_from_ipfs
+
+        dict_id = ref["id"]
+        data = self.load(dict_id)
+        if data is not None:
+            return data
+        logger.info("📚 Fetching dictionary %s...", dict_id[:8])
+        ciphertext = download_bytes_from_ipfs(ref["cid"])
+        data = decrypt_file(
+            ciphertext,
+            bytes.fromhex(ref["key"]),
+            bytes.fromhex(ref["nonce"]),
+            suite=ref.get("suite"),
+        )
+        if dictionary_id(data) != dict_id:
+            raise ValueError(f"Dictionary {dict_id[:8]}... does not match its ID")
+        self.add(data)
+        return data
+
+
+_store: Optional[DictionaryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_dictionary_store() -> DictionaryStore:
+    """Get the process-wide dictionary store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DictionaryStore()
+        return _store
+
+
+def dictionary_for(
+    to_npub: str, size: int, name: Optional[str] = None
+) -> Tuple[Optional[bytes], Optional[Dict[str, Any]]]:
+    """
+    Dictionary to compress a ``size``-byte file for ``to_npub`` with, and its
+    payload reference; (None, None) to fall back on gzip.
+
+    An explicit ``name`` that cannot be used is an error; otherwise files
+    above ``zstd_dict_max_bytes`` and machines without zstandard use gzip.
+    """
+    if not name and (
+        not zstd_available()
+        or size > get_size_config("zstd_dict_max_bytes", DEFAULT_DICT_MAX_FILE)
+    ):
+        return None, None
+    store = get_dictionary_store()
+    dict_id = store.resolve(name, to_npub)
+    if dict_id is None:
+        return None, None
+    require_zstd()
+    data = store.load(dict_id)
+    if data is None:
+        raise FileNotFoundError(f"Dictionary {dict_id[:8]}... is missing")
+    return data, store.reference(dict_id, data)
+
+
+def payload_dictionary(payload: Dict[str, Any]) -> Optional[bytes]:
+    """Dictionary a received payload was compressed with, if any"""
+    ref = payload.get("dict")
+    if not ref:
+        return None
+    require_zstd()
+    return get_dictionary_store().fetch(ref)
+
+
+def read_samples(paths: Iterable[Path]) -> List[bytes]:
+    """Contents of the sample files, walking directories"""
+    samples = []
+    for path in paths:
+        if path.is_dir():
+            files = sorted(p for p in path.rglob("*") if p.is_file())
+        else:
+            files = [path]
+        for file in files:
+            samples.append(file.read_bytes())
+    return samples
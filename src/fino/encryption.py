@@ -1,21 +1,204 @@
 import os
 import gzip
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import json
+import logging
+import platform
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 
+from .profiling import stage
+from .utils import get_config_dir, get_config_value, get_int_config
 
-def encrypt_file(filepath: str):
-    data = open(filepath, "rb").read()
+# Dictionary compression is optional: pip install 'pyfino[zstd]'
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Both AEADs take 256-bit keys and 96-bit nonces, so only the name travels
+# in the payload. Payloads without a suite predate this field and use AES-GCM.
+SUITES = {
+    "aes-256-gcm": AESGCM,
+    "chacha20-poly1305": ChaCha20Poly1305,
+}
+DEFAULT_SUITE = "aes-256-gcm"
+
+_BENCH_SIZE = 1024 * 1024
+_BENCH_SECONDS = 0.05
+
+DEFAULT_ZSTD_LEVEL = 9
+
+_preferred: Optional[str] = None
+_preferred_lock = threading.Lock()
+
+
+def _aead(suite: Optional[str], key: bytes):
+    try:
+        return SUITES[suite or DEFAULT_SUITE](key)
+    except KeyError:
+        raise ValueError(f"Unknown cipher suite {suite!r}")
+
+
+def generate_key() -> bytes:
+    return os.urandom(32)
+
+
+def benchmark_suites(
+    size: int = _BENCH_SIZE, seconds: float = _BENCH_SECONDS
+) -> Dict[str, float]:
+    """Measure encryption throughput of every suite in bytes per second"""
+    data = os.urandom(size)
+    nonce = os.urandom(12)
+    results = {}
+    for suite in SUITES:
+        aead = _aead(suite, generate_key())
+        aead.encrypt(nonce, data, None)  # warm up
+        rounds = 0
+        started = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < seconds:
+            aead.encrypt(nonce, data, None)
+            rounds += 1
+            elapsed = time.perf_counter() - started
+        results[suite] = rounds * size / elapsed
+    return results
+
+
+def preferred_suite() -> str:
+    """
+    Cipher suite for new transfers.
+
+    The ``cipher_suite`` config value wins; otherwise ("auto") the suites are
+    benchmarked once per machine and the fastest one is remembered in
+    ``~/.fino/cipher_suite.json``.
+    """
+    global _preferred
+    configured = get_config_value("cipher_suite", "auto")
+    if configured in SUITES:
+        return configured
+
+    with _preferred_lock:
+        if _preferred is not None:
+            return _preferred
+
+        cache_file = get_config_dir() / "cipher_suite.json"
+        machine = platform.machine()
+        try:
+            with open(cache_file, "r") as f:
+                cached = json.load(f)
+            if cached.get("machine") == machine and cached.get("suite") in SUITES:
+                _preferred = cached["suite"]
+                return _preferred
+        except (OSError, ValueError):
+            pass
+
+        results = benchmark_suites()
+        _preferred = max(results, key=lambda suite: results[suite])
+        logger.debug(
+            "Cipher suite benchmark: %s",
+            ", ".join(f"{s} {rate / 1e6:.0f} MB/s" for s, rate in results.items()),
+        )
+        try:
+            tmp = cache_file.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(
+                    {"suite": _preferred, "machine": machine, "results": results}, f
+                )
+            os.replace(tmp, cache_file)
+        except OSError:
+            pass
+        return _preferred
+
+
+def zstd_available() -> bool:
+    return zstandard is not None
+
+
+def require_zstd() -> Any:
+    if zstandard is None:
+        raise RuntimeError(
+            "Dictionary compression needs the zstandard package "
+            "(pip install 'pyfino[zstd]')"
+        )
+    return zstandard
+
+
+@lru_cache(maxsize=8)
+def _zstd_dict(dictionary: bytes, level: int) -> Any:
+    # Digesting a dictionary costs more than compressing a small file, so
+    # the prepared form is shared by every file compressed with it
+    zstd_dict = require_zstd().ZstdCompressionDict(dictionary)
+    zstd_dict.precompute_compress(level=level)
+    return zstd_dict
+
+
+def _compress(data: bytes, dictionary: Optional[bytes]) -> bytes:
+    if dictionary is None:
+        return gzip.compress(data, compresslevel=6)
+    level = get_int_config("zstd_level", DEFAULT_ZSTD_LEVEL)
+    compressor = require_zstd().ZstdCompressor(
+        level=level, dict_data=_zstd_dict(dictionary, level)
+    )
+    return compressor.compress(data)
+
+
+def _decompress(data: bytes, dictionary: Optional[bytes]) -> bytes:
+    if dictionary is None:
+        return gzip.decompress(data)
+    zstd = require_zstd()
+    decompressor = zstd.ZstdDecompressor(
+        dict_data=zstd.ZstdCompressionDict(dictionary)
+    )
+    return decompressor.decompress(data)
+
+
+def encrypt_data(
+    data: bytes,
+    key: bytes,
+    associated_data: Optional[bytes] = None,
+    suite: str = DEFAULT_SUITE,
+    dictionary: Optional[bytes] = None,
+) -> Tuple[bytes, bytes]:
+    """
+    Compress and encrypt ``data``; returns (ciphertext, nonce).
+
+    Data is gzipped, or compressed with zstd against ``dictionary`` when
+    one is given.
+    """
     # Compress before encrypting to reduce size and speed up upload
-    compressed = gzip.compress(data, compresslevel=6)
-    key = AESGCM.generate_key(bit_length=256)
-    aesgcm = AESGCM(key)
+    with stage("compress"):
+        compressed = _compress(data, dictionary)
     nonce = os.urandom(12)
-    ciphertext = aesgcm.encrypt(nonce, compressed, None)
+    with stage("encrypt"):
+        ciphertext = _aead(suite, key).encrypt(nonce, compressed, associated_data)
+    return ciphertext, nonce
+
+
+def encrypt_file(
+    filepath: str, suite: str = DEFAULT_SUITE, dictionary: Optional[bytes] = None
+):
+    with stage("read"):
+        data = open(filepath, "rb").read()
+    key = generate_key()
+    ciphertext, nonce = encrypt_data(data, key, suite=suite, dictionary=dictionary)
     return ciphertext, key, nonce
 
 
-def decrypt_file(ciphertext: bytes, key: bytes, nonce: bytes):
-    aesgcm = AESGCM(key)
-    compressed = aesgcm.decrypt(nonce, ciphertext, None)
+def decrypt_file(
+    ciphertext: bytes,
+    key: bytes,
+    nonce: bytes,
+    associated_data: Optional[bytes] = None,
+    suite: Optional[str] = None,
+    dictionary: Optional[bytes] = None,
+):
+    with stage("decrypt"):
+        compressed = _aead(suite, key).decrypt(nonce, ciphertext, associated_data)
     # Decompress after decrypting
-    return gzip.decompress(compressed)
+    with stage("decompress"):
+        return _decompress(compressed, dictionary)
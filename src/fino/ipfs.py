@@ -1,8 +1,128 @@
+import atexit
+import io
+import json
+import logging
+import os
+import signal
 import subprocess
+import tempfile
+import threading
 import time
+import uuid
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
-from .console import console
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+from . import throttle
+from .pins import get_pin_index, get_staging_dir
+from .profiling import stage
+from .provide import get_provide_queue, provide_cids
+from .utils import get_bool_config, get_config_value, get_int_config
+
+logger = logging.getLogger(__name__)
+
+# Read/write size for streamed uploads and downloads
+_CHUNK_SIZE = 1024 * 1024
+
+# ``ipfs add`` defaults: 1 MiB chunks (fewer blocks to hash, store and
+# announce than the 256 KiB default, still under the bitswap block limit)
+# with raw leaves under a CIDv1 root
+DEFAULT_CHUNKER = "size-1048576"
+DEFAULT_CID_VERSION = 1
+
+# Set once the daemon reports that the filestore is disabled
+_filestore_unavailable = False
+
+# Maximum number of multiaddrs advertised to the receiver
+MAX_PEER_ADDRS = 8
+
+# Peers dialed recently, by peer ID, so repeated fetches do not redial.
+# Failed dials are remembered for a shorter time so the parts of a large
+# transfer do not each wait out the dial timeout on an unreachable sender.
+_DIAL_TTL = 60.0
+_DIAL_FAILURE_TTL = 30.0
+_dialed: Dict[str, float] = {}
+_dial_failed: Dict[str, float] = {}
+# Concurrent fetches from one sender wait for a single dial; fetches from
+# other senders dial in parallel. ``_dial_lock`` guards the lock table
+_dial_locks: Dict[str, threading.Lock] = {}
+_dial_lock = threading.Lock()
+
+# This node's own peer info, cached as (fetched at, info)
+_PEER_INFO_TTL = 60.0
+_peer_info: Optional[Tuple[float, Dict[str, Any]]] = None
+
+# Keep-alive connections to the daemon API kept open for concurrent transfers
+_API_POOL_SIZE = 16
+
+
+def get_add_options(nocopy: bool = False) -> Dict[str, str]:
+    """
+    ``ipfs add`` parameters from config (``ipfs_chunker``,
+    ``ipfs_raw_leaves``, ``ipfs_cid_version``), as API query parameters
+    """
+    options = {"pin": "true"}
+    chunker = get_config_value("ipfs_chunker", DEFAULT_CHUNKER)
+    if chunker:
+        options["chunker"] = str(chunker)
+    raw_leaves = get_bool_config("ipfs_raw_leaves", True)
+    options["raw-leaves"] = "true" if raw_leaves else "false"
+    options["cid-version"] = str(
+        get_int_config("ipfs_cid_version", DEFAULT_CID_VERSION)
+    )
+    if nocopy:
+        # The filestore only references raw leaves
+        options["nocopy"] = "true"
+        options["raw-leaves"] = "true"
+    return options
+
+
+def nocopy_enabled() -> bool:
+    """Whether uploads are staged and added with ``--nocopy``"""
+    return get_bool_config("ipfs_nocopy", False) and not _filestore_unavailable
+
+
+def upload_tempfile(suffix: str = "") -> str:
+    """
+    Create an empty file to write a ciphertext into before uploading it.
+
+    With ``ipfs_nocopy`` enabled the file lives in the staging directory so
+    the filestore can keep referencing it after the upload; otherwise it is
+    an ordinary temporary file. Release it with :func:`discard_upload_file`.
+    """
+    directory = str(get_staging_dir()) if nocopy_enabled() else None
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    os.close(fd)
+    return path
+
+
+def discard_upload_file(path: str) -> None:
+    """Delete an upload file unless a pin's filestore blocks still use it"""
+    if get_pin_index().references(path):
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _is_staged(path: Path) -> bool:
+    return nocopy_enabled() and path.resolve().parent == get_staging_dir().resolve()
+
+
+@stage("ipfs add")
+def _add(path: Path, nocopy: bool, meter: "throttle.TransferMeter") -> str:
+    api_url = get_node().api_url()
+    if api_url is not None:
+        # Streamed through the rate limiter
+        return _add_via_api(api_url, path, meter, nocopy)
+    if throttle.is_limited("upload"):
+        logger.warning("⚠️  No IPFS API address, upload is not rate limited")
+    meter.begin()
+    cid = _add_via_cli(path, nocopy)
+    meter.account(path.stat().st_size)
+    return cid
 
 
 def upload_to_ipfs(
@@ -10,7 +130,12 @@ def upload_to_ipfs(
 ) -> str:
     """
     Upload file to IPFS - simple and fast with minimal network announcement
+
+    Files created with :func:`upload_tempfile` while ``ipfs_nocopy`` is
+    enabled are added through the filestore instead of being copied into
+    the blockstore; the pin record keeps the file until the pin expires.
     """
+    global _filestore_unavailable
     path = Path(file_path)
 
     if not path.exists():
@@ -18,189 +143,674 @@ def upload_to_ipfs(
 
     try:
         # Start IPFS daemon if not running
-        _start_ipfs_daemon()
+        node = get_node()
+        node.ensure_running()
 
-        # Upload file (pin by default; avoid redundant extra pin step)
+        nocopy = _is_staged(path)
+        with throttle.transfer("upload", path.name) as meter:
+            try:
+                cid = _add(path, nocopy, meter)
+            except Exception as e:
+                if not nocopy or "filestore is not enabled" not in str(e):
+                    raise
+                logger.warning(
+                    "⚠️  IPFS filestore is disabled, copying into the blockstore "
+                    "instead (enable it with: ipfs config --json "
+                    "Experimental.FilestoreEnabled true)"
+                )
+                _filestore_unavailable = True
+                nocopy = False
+                cid = _add(path, nocopy, meter)
+        logger.info("✅ Uploaded to IPFS: %s", cid)
+        # Tracked so the pin can expire instead of living forever
+        get_pin_index().record(
+            cid,
+            path.stat().st_size,
+            path.name,
+            path=str(path) if nocopy else None,
+        )
+
+        # Optional: Announce to DHT so other nodes can find it
+        if announce:
+            if background_announce:
+                # Batched and retried by a bounded pool of provide workers
+                logger.info("📡 Announcing to network (background)...")
+                get_provide_queue().enqueue(cid)
+            else:
+                logger.info("📡 Announcing to network...")
+                try:
+                    provide_cids([cid], timeout=30)
+                    logger.info("✅ File announced to network")
+                except Exception as e:
+                    logger.warning("⚠️  Announce failed (%s), queued for retry", e)
+                    get_provide_queue().enqueue(cid)
+
+        return cid
+
+    except Exception as e:
+        get_node().mark_unhealthy()
+        logger.error("❌ IPFS upload failed: %s", e)
+        raise
+
+
+def _add_via_cli(path: Path, nocopy: bool = False) -> str:
+    # Upload file (pin by default; avoid redundant extra pin step)
+    flags = [f"--{name}={value}" for name, value in get_add_options(nocopy).items()]
+    try:
         result = subprocess.run(
-            ["ipfs", "add", "--pin=true", str(path)],
+            ["ipfs", "add", *flags, str(path)],
             capture_output=True,
             text=True,
             check=True,
             timeout=60,
         )
+    except subprocess.CalledProcessError as e:
+        raise Exception(e.stderr.strip() or str(e)) from e
 
-        # Extract CID from output
-        lines = result.stdout.strip().split("\n")
-        for line in lines:
-            if "added" in line:
-                parts = line.split()
-                if len(parts) >= 2:
-                    cid = parts[1]  # The CID is the second word
-                    console.print(f"   ✅ Uploaded to IPFS: {cid}", style="green")
-
-                    # Optional: Announce to DHT so other nodes can find it
-                    if announce:
-                        if background_announce:
-                            console.print(
-                                "   📡 Announcing to network (background)...",
-                                style="cyan",
-                            )
-                            try:
-                                subprocess.Popen(
-                                    ["ipfs", "routing", "provide", cid],
-                                    stdout=subprocess.DEVNULL,
-                                    stderr=subprocess.DEVNULL,
-                                )
-                            except Exception:
-                                console.print(
-                                    "   ⚠️  Background announce failed to start, but file uploaded",
-                                    style="yellow",
-                                )
-                        else:
-                            console.print(
-                                "   📡 Announcing to network...", style="cyan"
-                            )
-                            try:
-                                subprocess.run(
-                                    ["ipfs", "routing", "provide", cid],
-                                    capture_output=True,
-                                    timeout=30,
-                                )
-                                console.print(
-                                    "   ✅ File announced to network", style="green"
-                                )
-                            except (
-                                subprocess.CalledProcessError,
-                                subprocess.TimeoutExpired,
-                            ):
-                                console.print(
-                                    "   ⚠️  Announce failed, but file uploaded",
-                                    style="yellow",
-                                )
-
-                    return cid
-
-        raise Exception("Could not extract CID from IPFS output")
+    # Extract CID from output
+    for line in result.stdout.strip().split("\n"):
+        if "added" in line:
+            parts = line.split()
+            if len(parts) >= 2:
+                return parts[1]  # The CID is the second word
 
-    except Exception as e:
-        console.print(f"   ❌ IPFS upload failed: {e}", style="red")
-        raise
+    raise Exception("Could not extract CID from IPFS output")
 
 
-def _start_ipfs_daemon():
-    """Start IPFS daemon if not running"""
-    try:
-        # Check if daemon is already running
-        try:
-            subprocess.run(["ipfs", "id"], capture_output=True, check=True, timeout=5)
-            return
-        except (
-            subprocess.CalledProcessError,
-            subprocess.TimeoutExpired,
-            FileNotFoundError,
-        ):
-            pass
+def _multipart_body(
+    path: Path, boundary: str, meter: "throttle.TransferMeter", nocopy: bool = False
+) -> Iterator[bytes]:
+    filename = quote(path.name)
+    # The filestore records where the blocks live on disk
+    abspath = f"Abspath: {path.resolve()}\r\n" if nocopy else ""
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"{abspath}"
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode("utf-8")
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            meter.add(len(chunk))
+            yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+
 
-        # Start daemon in background
-        subprocess.Popen(
-            ["ipfs", "daemon"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+def _add_via_api(
+    api_url: str, path: Path, meter: "throttle.TransferMeter", nocopy: bool = False
+) -> str:
+    """Add a file through the daemon's HTTP API, streaming the request body"""
+    boundary = uuid.uuid4().hex
+    response = get_node().session.post(
+        f"{api_url}/api/v0/add",
+        params={**get_add_options(nocopy), "quieter": "true"},
+        data=_multipart_body(path, boundary, meter, nocopy),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        timeout=(10, 300),
+    )
+    if not response.ok:
+        # Errors come back as {"Message": ...}; keep the daemon's reason
+        raise Exception(
+            f"IPFS add failed ({response.status_code}): {response.text.strip()}"
         )
+    # One JSON object per added entry; the last one is the file itself
+    lines = [line for line in response.text.splitlines() if line.strip()]
+    if not lines:
+        raise Exception("Could not extract CID from IPFS API response")
+    return json.loads(lines[-1])["Hash"]
 
-        # Wait for daemon to start
-        time.sleep(3)
 
-    except Exception as e:
-        console.print(f"   ❌ Failed to start IPFS daemon: {e}", style="red")
-        raise
+def upload_bytes_to_ipfs(
+    data: bytes,
+    suffix: str = "",
+    announce: bool = True,
+    background_announce: bool = True,
+) -> str:
+    """
+    Upload in-memory data to IPFS through a temporary (or staged) file
+    """
+    temp_file_path = upload_tempfile(suffix)
+    with open(temp_file_path, "wb") as temp_file:
+        temp_file.write(data)
+
+    try:
+        return upload_to_ipfs(
+            temp_file_path, announce=announce, background_announce=background_announce
+        )
+    finally:
+        # Clean up temp file (staged files stay until their pin is removed)
+        discard_upload_file(temp_file_path)
 
 
-def download_from_ipfs(cid: str, output_path: str) -> bool:
+class IPFSNode:
     """
-    Download file from IPFS with fallback to HTTP gateways
+    Lifecycle of the local IPFS daemon.
+
+    Health is probed through the daemon's HTTP API (the address is read from
+    the repo's ``api`` file) and cached for ``HEALTH_TTL`` seconds, so back to
+    back uploads do not re-probe. A daemon that fino starts is polled until
+    its API answers instead of sleeping blindly, can optionally be launched
+    with transfer-tuned settings (written to the repo config only until the
+    daemon has read it, then put back), and can be shut down cleanly. API
+    requests share one keep-alive HTTP session.
     """
-    console.print(f"   🔍 Downloading {cid} from IPFS...", style="cyan")
 
-    # Try local IPFS first
-    try:
+    HEALTH_TTL = 30.0
+
+    # ``ipfs config --json`` settings applied by the transfer-tuned profile:
+    # wider connection manager limits, the accelerated DHT client for faster
+    # provides, and full DHT routing (the lowpower profile sets dhtclient)
+    TRANSFER_PROFILE = {
+        "Swarm.ConnMgr.LowWater": 200,
+        "Swarm.ConnMgr.HighWater": 600,
+        "Swarm.ConnMgr.GracePeriod": "30s",
+        "Routing.AcceleratedDHTClient": True,
+        "Routing.Type": "auto",
+    }
+
+    def __init__(self, repo_path: Optional[Path] = None):
+        self.repo_path = repo_path or Path(
+            os.environ.get("IPFS_PATH", str(Path.home() / ".ipfs"))
+        )
+        self._healthy_at = 0.0
+        self._process: Optional[subprocess.Popen] = None
+        self._saved_config: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """HTTP session for API requests, pooled across threads"""
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=_API_POOL_SIZE
+                )
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    @property
+    def started_by_us(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def api_url(self) -> Optional[str]:
+        """HTTP URL of the daemon API, from the repo's ``api`` file"""
+        try:
+            multiaddr = (self.repo_path / "api").read_text().strip()
+        except OSError:
+            return None
+
+        parts = multiaddr.strip("/").split("/")
+        if len(parts) < 4 or parts[2] != "tcp":
+            return None
+        host = f"[{parts[1]}]" if parts[0] == "ip6" else parts[1]
+        return f"http://{host}:{parts[3]}"
+
+    def is_ready(self, timeout: float = 2.0) -> bool:
+        """Check whether the daemon API answers right now"""
+        url = self.api_url()
+        if url is None:
+            return False
+        try:
+            response = self.session.post(f"{url}/api/v0/id", timeout=timeout)
+            return response.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def mark_unhealthy(self) -> None:
+        """Forget the cached health state so the next use re-probes"""
+        self._healthy_at = 0.0
+
+    @stage("ipfs daemon")
+    def ensure_running(
+        self, deadline: float = 30.0, tuned: Optional[bool] = None
+    ) -> None:
+        """Make sure a daemon is serving, starting one if necessary"""
+        with self._lock:
+            if time.time() - self._healthy_at < self.HEALTH_TTL:
+                return
+            if not self.is_ready():
+                if tuned is None:
+                    tuned = get_bool_config("ipfs_tuned_profile", False)
+                self.start(tuned=tuned)
+                try:
+                    self.wait_ready(deadline)
+                finally:
+                    # The daemon has read its config once the API answers
+                    self.restore_config()
+            self._healthy_at = time.time()
+
+    def _read_config(self) -> Optional[Dict[str, Any]]:
         result = subprocess.run(
-            ["ipfs", "get", cid, "-o", output_path],
-            capture_output=True,
-            text=True,
-            timeout=120,
+            ["ipfs", "config", "show"], capture_output=True, text=True, timeout=10
         )
+        if result.returncode != 0:
+            return None
+        try:
+            return json.loads(result.stdout)
+        except json.JSONDecodeError:
+            return None
 
-        if result.returncode == 0:
-            console.print("   ✅ Downloaded from local IPFS", style="green")
-            return True
-        else:
-            console.print(
-                "   ⚠️  Local IPFS download failed, trying HTTP gateways...",
-                style="yellow",
+    def _set_config(self, values: Dict[str, Any]) -> None:
+        for key, value in values.items():
+            subprocess.run(
+                ["ipfs", "config", "--json", key, json.dumps(value)],
+                capture_output=True,
+                timeout=10,
+            )
+
+    def apply_transfer_profile(self) -> bool:
+        """
+        Write ``TRANSFER_PROFILE`` into the repo config, remembering the
+        values it replaces for :meth:`restore_config`. Nothing is changed if
+        the current config cannot be read.
+        """
+        config = self._read_config()
+        if config is None:
+            logger.warning("⚠️  Could not read the IPFS config, not tuning")
+            return False
+        saved: Dict[str, Any] = {}
+        for key in self.TRANSFER_PROFILE:
+            value: Any = config
+            for part in key.split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            # Unset keys go back as null, which kubo reads as its default
+            saved[key] = value
+        self._saved_config = saved
+        self._set_config(self.TRANSFER_PROFILE)
+        return True
+
+    def restore_config(self) -> None:
+        """Put back the config values replaced by the transfer profile"""
+        saved, self._saved_config = self._saved_config, None
+        if saved:
+            self._set_config(saved)
+
+    def start(self, tuned: bool = False) -> None:
+        """Launch a daemon in the background"""
+        try:
+            if tuned:
+                logger.info("🔧 Applying transfer-tuned IPFS settings...")
+                self.apply_transfer_profile()
+            if nocopy_enabled():
+                # --nocopy adds need the filestore, read at daemon startup
+                subprocess.run(
+                    [
+                        "ipfs",
+                        "config",
+                        "--json",
+                        "Experimental.FilestoreEnabled",
+                        "true",
+                    ],
+                    capture_output=True,
+                    timeout=10,
+                )
+
+            logger.info("🚀 Starting IPFS daemon...")
+            self._process = subprocess.Popen(
+                ["ipfs", "daemon"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
             )
+        except Exception as e:
+            logger.error("❌ Failed to start IPFS daemon: %s", e)
+            self.restore_config()
+            raise
+
+        if get_bool_config("ipfs_stop_on_exit", False):
+            atexit.register(self.stop)
+
+    def wait_ready(self, deadline: float = 30.0) -> None:
+        """Poll the API until it answers, failing fast if the daemon exits"""
+        until = time.time() + deadline
+        delay = 0.1
+        while time.time() < until:
+            if self.is_ready(timeout=1.0):
+                logger.info("✅ IPFS daemon is ready")
+                return
+            if self._process is not None and self._process.poll() is not None:
+                raise RuntimeError(
+                    f"IPFS daemon exited with code {self._process.returncode}"
+                )
+            time.sleep(min(delay, max(0.0, until - time.time())))
+            delay = min(delay * 2, 1.0)
+        raise TimeoutError(f"IPFS daemon not ready after {deadline:.0f}s")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Shut down the daemon, but only if fino started it"""
+        if not self.started_by_us:
+            return
+        process = self._process
+        assert process is not None
+        # SIGINT lets the daemon flush and release the repo lock
+        try:
+            process.send_signal(signal.SIGINT)
+        except ValueError:
+            process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        self._process = None
+        self.mark_unhealthy()
+
+
+_node = IPFSNode()
+
+
+def get_node() -> IPFSNode:
+    """Get the process-wide IPFS node manager"""
+    return _node
+
+
+def get_node_peer_info() -> Optional[Dict[str, Any]]:
+    """
+    Return this node's peer ID and dialable multiaddrs, or None if unavailable
+
+    The answer is cached for ``_PEER_INFO_TTL`` seconds so back to back sends
+    do not each run ``ipfs id``.
+    """
+    global _peer_info
+    if _peer_info is not None and time.time() - _peer_info[0] < _PEER_INFO_TTL:
+        return _peer_info[1]
+    try:
+        result = subprocess.run(
+            ["ipfs", "id"], capture_output=True, text=True, check=True, timeout=5
+        )
+        info = json.loads(result.stdout)
     except (
         subprocess.CalledProcessError,
         subprocess.TimeoutExpired,
         FileNotFoundError,
+        json.JSONDecodeError,
     ):
-        console.print(
-            "   ⚠️  Local IPFS not available, trying HTTP gateways...", style="yellow"
-        )
-    except Exception as e:
-        console.print(
-            f"   ⚠️  Local IPFS error: {e}, trying HTTP gateways...", style="yellow"
-        )
+        return None
+
+    # Loopback addresses are useless to anyone but ourselves
+    addrs = [
+        addr
+        for addr in info.get("Addresses") or []
+        if not addr.startswith(("/ip4/127.", "/ip6/::1/"))
+    ]
+    if not info.get("ID") or not addrs:
+        return None
+    peer = {"id": info["ID"], "addrs": addrs[:MAX_PEER_ADDRS]}
+    _peer_info = (time.time(), peer)
+    return peer
 
-    # Fallback to HTTP gateways
-    gateways = [
+
+@stage("dial sender")
+def dial_peer(peer: Optional[Dict[str, Any]], timeout: float = 10.0) -> bool:
+    """
+    Connect the local node straight to a provider so fetches skip DHT lookup
+    """
+    if not peer or not peer.get("addrs"):
+        return False
+
+    peer_id = peer.get("id", "")
+    with _dial_lock:
+        peer_lock = _dial_locks.setdefault(peer_id, threading.Lock())
+    with peer_lock:
+        if time.time() - _dialed.get(peer_id, 0.0) < _DIAL_TTL:
+            return True
+        if time.time() - _dial_failed.get(peer_id, 0.0) < _DIAL_FAILURE_TTL:
+            return False
+        if _dial(peer_id, peer["addrs"], timeout):
+            _dialed[peer_id] = time.time()
+            return True
+        _dial_failed[peer_id] = time.time()
+        return False
+
+
+def _dial(peer_id: str, addrs: List[str], timeout: float) -> bool:
+    deadline = time.time() + timeout
+    for addr in addrs:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        if peer_id and "/p2p/" not in addr:
+            addr = f"{addr}/p2p/{peer_id}"
+        try:
+            result = subprocess.run(
+                ["ipfs", "swarm", "connect", addr],
+                capture_output=True,
+                text=True,
+                timeout=remaining,
+            )
+        except (subprocess.TimeoutExpired, FileNotFoundError):
+            break
+        if result.returncode == 0:
+            logger.info("🤝 Connected directly to sender %s...", peer_id[:12])
+            return True
+
+    logger.warning("⚠️  Could not dial sender directly, falling back to DHT lookup")
+    return False
+
+
+def _gateway_urls(cid: str) -> List[str]:
+    return [
         f"https://ipfs.io/ipfs/{cid}",
         f"https://gateway.pinata.cloud/ipfs/{cid}",
         f"https://cloudflare-ipfs.com/ipfs/{cid}",
         f"https://dweb.link/ipfs/{cid}",
     ]
 
-    for gateway_url in gateways:
+
+def _stream_response(
+    response: requests.Response,
+    out: BinaryIO,
+    meter: "throttle.TransferMeter",
+) -> None:
+    """Copy a streamed response into ``out`` through the rate limiter"""
+    # Get file size for progress tracking
+    total_size = int(response.headers.get("content-length", 0))
+
+    downloaded = 0
+    last_reported = 0
+    last_report_time = time.time()
+    for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+        if chunk:
+            meter.add(len(chunk))
+            out.write(chunk)
+            downloaded += len(chunk)
+
+            # Throttled progress for large files
+            if total_size > 0:
+                now = time.time()
+                bytes_since = downloaded - last_reported
+                if bytes_since >= 50 * 1024 * 1024 or (now - last_report_time) >= 2.0:
+                    progress = (downloaded / total_size) * 100
+                    logger.info(
+                        "📥 Downloaded: %sMB / %sMB (%.1f%%)",
+                        downloaded // (1024 * 1024),
+                        total_size // (1024 * 1024),
+                        progress,
+                    )
+                    last_reported = downloaded
+                    last_report_time = now
+
+
+def _rewind(out: BinaryIO) -> None:
+    """Drop whatever a failed attempt left in ``out``"""
+    out.seek(0)
+    out.truncate()
+
+
+def _cat_cli(cid: str, out: BinaryIO) -> bool:
+    # A real file takes ``ipfs cat`` output directly; a memory buffer has no
+    # descriptor, so the output is captured and copied in
+    try:
+        fileno: Optional[int] = out.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        fileno = None
+    if fileno is None:
+        result = subprocess.run(["ipfs", "cat", cid], capture_output=True, timeout=120)
+        if result.returncode != 0:
+            return False
+        out.write(result.stdout)
+        return True
+    out.flush()
+    result = subprocess.run(
+        ["ipfs", "cat", cid], stdout=fileno, stderr=subprocess.PIPE, timeout=120
+    )
+    out.seek(0, os.SEEK_END)
+    return result.returncode == 0
+
+
+def _download_local(cid: str, out: BinaryIO, meter: "throttle.TransferMeter") -> bool:
+    api_url = get_node().api_url()
+    if api_url is not None:
+        # Streamed from the daemon API so the download can be rate limited
         try:
-            console.print(f"   🌐 Trying {gateway_url.split('/')[2]}...", style="cyan")
-
-            response = requests.get(gateway_url, stream=True, timeout=30)
-            response.raise_for_status()
-
-            # Get file size for progress tracking
-            total_size = int(response.headers.get("content-length", 0))
-
-            with open(output_path, "wb") as f:
-                downloaded = 0
-                last_reported = 0
-                last_report_time = time.time()
-                for chunk in response.iter_content(chunk_size=1024 * 1024):  # 1 MiB chunks
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-
-                        # Throttled progress for large files
-                        if total_size > 0:
-                            now = time.time()
-                            bytes_since = downloaded - last_reported
-                            if bytes_since >= 50 * 1024 * 1024 or (now - last_report_time) >= 2.0:
-                                progress = (downloaded / total_size) * 100
-                                console.print(
-                                    f"   📥 Downloaded: {downloaded // (1024 * 1024)}MB / {total_size // (1024 * 1024)}MB ({progress:.1f}%)",
-                                    style="cyan",
-                                )
-                                last_reported = downloaded
-                                last_report_time = now
-
-            console.print(
-                f"   ✅ Downloaded from {gateway_url.split('/')[2]}", style="green"
-            )
+            with get_node().session.post(
+                f"{api_url}/api/v0/cat",
+                params={"arg": cid},
+                stream=True,
+                timeout=(5, 120),
+            ) as response:
+                response.raise_for_status()
+                _stream_response(response, out, meter)
             return True
+        except requests.RequestException as e:
+            logger.warning("⚠️  Local IPFS API download failed: %s", e)
+            _rewind(out)
 
+    if throttle.is_limited("download"):
+        logger.warning("⚠️  No IPFS API address, local download is not rate limited")
+    meter.begin()
+    if not _cat_cli(cid, out):
+        _rewind(out)
+        return False
+    meter.account(out.tell())
+    return True
+
+
+def _download(cid: str, out: BinaryIO, peer: Optional[Dict[str, Any]]) -> bool:
+    """Fetch a CID into ``out``, trying the local node and then the gateways"""
+    logger.info("🔍 Downloading %s from IPFS...", cid)
+    dial_peer(peer)
+
+    with throttle.transfer("download", cid) as meter:
+        # Try local IPFS first
+        try:
+            if _download_local(cid, out, meter):
+                logger.info("✅ Downloaded from local IPFS")
+                return True
+            else:
+                logger.warning("⚠️  Local IPFS download failed, trying HTTP gateways...")
+        except (
+            subprocess.CalledProcessError,
+            subprocess.TimeoutExpired,
+            FileNotFoundError,
+        ):
+            logger.warning("⚠️  Local IPFS not available, trying HTTP gateways...")
         except Exception as e:
-            console.print(
-                f"   ❌ {gateway_url.split('/')[2]} failed: {str(e)[:50]}...",
-                style="red",
-            )
-            continue
+            logger.warning("⚠️  Local IPFS error: %s, trying HTTP gateways...", e)
+
+        # Fallback to HTTP gateways
+        for gateway_url in _gateway_urls(cid):
+            _rewind(out)
+            try:
+                logger.debug("Trying %s", gateway_url.split("/")[2])
 
-    console.print("   ❌ All download methods failed", style="red")
+                response = requests.get(gateway_url, stream=True, timeout=30)
+                response.raise_for_status()
+                _stream_response(response, out, meter)
+
+                logger.info("✅ Downloaded from %s", gateway_url.split("/")[2])
+                return True
+
+            except Exception as e:
+                logger.warning(
+                    "❌ %s failed: %s...", gateway_url.split("/")[2], str(e)[:50]
+                )
+                continue
+
+    logger.error("❌ All download methods failed")
     return False
+
+
+@stage("ipfs download")
+def download_from_ipfs(
+    cid: str, output_path: str, peer: Optional[Dict[str, Any]] = None
+) -> bool:
+    """
+    Download file from IPFS with fallback to HTTP gateways
+
+    ``peer`` is the sender's peer info from the payload; when given, the local
+    node dials it before fetching.
+    """
+    with open(output_path, "wb") as f:
+        return _download(cid, f, peer)
+
+
+@stage("ipfs download")
+def download_bytes_from_ipfs(cid: str, peer: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Download a CID into memory, raising if every source fails
+
+    The content is read from ``/api/v0/cat`` (or ``ipfs cat``) straight into
+    a buffer, so nothing is staged on disk.
+    """
+    buf = io.BytesIO()
+    if not _download(cid, buf, peer):
+        raise Exception("Download failed from all sources")
+    return buf.getvalue()
+
+
+@stage("ipfs download")
+def fetch_range_from_ipfs(
+    cid: str, offset: int, length: int, peer: Optional[Dict[str, Any]] = None
+) -> bytes:
+    """
+    Fetch ``length`` bytes at ``offset`` of a CID without downloading the rest
+    """
+    dial_peer(peer)
+
+    with throttle.transfer("download", f"{cid}@{offset}+{length}") as meter:
+        # Try local IPFS first
+        try:
+            meter.begin()
+            result = subprocess.run(
+                ["ipfs", "cat", "--offset", str(offset), "--length", str(length), cid],
+                capture_output=True,
+                timeout=120,
+            )
+            if result.returncode == 0 and len(result.stdout) == length:
+                meter.account(length)
+                return result.stdout
+        except (subprocess.TimeoutExpired, FileNotFoundError):
+            pass
+
+        # Fallback to HTTP gateways with Range requests
+        headers = {"Range": f"bytes={offset}-{offset + length - 1}"}
+        for gateway_url in _gateway_urls(cid):
+            try:
+                response = requests.get(
+                    gateway_url, headers=headers, stream=True, timeout=30
+                )
+                response.raise_for_status()
+
+                # A gateway that ignores Range sends the whole object from byte 0
+                skip = 0 if response.status_code == 206 else offset
+                buf = bytearray()
+                for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                    meter.add(len(chunk))
+                    buf += chunk
+                    if len(buf) >= skip + length:
+                        break
+                response.close()
+
+                data = bytes(buf[skip : skip + length])
+                if len(data) == length:
+                    return data
+            except Exception as e:
+                logger.warning(
+                    "❌ %s range fetch failed: %s...",
+                    gateway_url.split("/")[2],
+                    str(e)[:50],
+                )
+
+    raise Exception(f"Range fetch of {cid} failed from all sources")
@@ -0,0 +1,90 @@
+"""
+Sets of receiving identities served by one receiver.
+
+A keyring maps each identity's hex public key to its nsec and a short name,
+so events arriving on a shared subscription can be routed to the right key
+and written into that identity's own output directory.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pynostr.key import PrivateKey  # type: ignore[import-untyped]
+
+
+class Identity:
+    """One receiving identity"""
+
+    __slots__ = ("name", "nsec", "pub_hex")
+
+    def __init__(self, name: str, nsec: str, pub_hex: str):
+        self.name = name
+        self.nsec = nsec
+        self.pub_hex = pub_hex
+
+
+class Keyring:
+    """Receiving identities, looked up by hex public key"""
+
+    def __init__(self, identities: Iterable[Tuple[Optional[str], str]] = ()):
+        self._by_pub: Dict[str, Identity] = {}
+        for name, nsec in identities:
+            self.add(nsec, name)
+
+    def add(self, nsec: str, name: Optional[str] = None) -> Identity:
+        priv = PrivateKey.from_nsec(nsec)
+        pub_hex = priv.public_key.hex()
+        # Unnamed identities are named after their npub
+        identity = Identity(name or priv.public_key.bech32()[:16], nsec, pub_hex)
+        self._by_pub[pub_hex] = identity
+        return identity
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Keyring":
+        """
+        Load a keyring file: a JSON object mapping names to nsecs, or a JSON
+        list of nsecs.
+        """
+        with open(path, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return cls(data.items())
+        if isinstance(data, list):
+            return cls((None, nsec) for nsec in data)
+        raise ValueError(f"Keyring {path} must be a JSON object or list")
+
+    @classmethod
+    def of(cls, nsec: Union[str, "Keyring"]) -> "Keyring":
+        """Wrap a single nsec in a keyring; keyrings are returned unchanged"""
+        if isinstance(nsec, Keyring):
+            return nsec
+        return cls([(None, nsec)])
+
+    @property
+    def pubkeys(self) -> List[str]:
+        return list(self._by_pub)
+
+    def get(self, pub_hex: Optional[str]) -> Optional[Identity]:
+        return self._by_pub.get(pub_hex) if pub_hex else None
+
+    def output_dir(self, base: str, identity: Identity) -> str:
+        """Output directory for an identity; a lone identity uses ``base``"""
+        if len(self._by_pub) == 1:
+            return base
+        # Names come from the keyring file, keep them to a single component
+        # that stays inside ``base``
+        name = os.path.basename(identity.name)
+        if name in ("", os.curdir, os.pardir):
+            name = identity.pub_hex
+        return os.path.join(base, name)
+
+    def __contains__(self, pub_hex: object) -> bool:
+        return pub_hex in self._by_pub
+
+    def __iter__(self) -> Iterator[Identity]:
+        return iter(self._by_pub.values())
+
+    def __len__(self) -> int:
+        return len(self._by_pub)
@@ -0,0 +1,325 @@
+"""
+Durable record of every transfer in ``~/.fino/ledger.db``.
+
+Each send and receive gets a row in an SQLite database (WAL mode, so
+concurrent fino processes can read while one writes) holding the Nostr
+event ID, CID, peer, sizes, status and the time it was queued, started and
+finished. Receivers use it to skip events they already delivered and to
+resume jobs a crashed process left queued or running; ``fino history``
+queries it without touching any relay.
+
+Received rows keep the encrypted DM event as it came from the relay, never
+the decrypted payload, so no file keys are stored at rest.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pynostr.key import PublicKey  # type: ignore[import-untyped]
+
+from .utils import get_config_dir, get_int_config, process_alive
+
+logger = logging.getLogger(__name__)
+
+SEND = "send"
+RECEIVE = "receive"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+PARTIAL = "partial"
+REJECTED = "rejected"
+INTERRUPTED = "interrupted"
+# Messages that can never succeed, e.g. metadata that does not decrypt.
+# Receivers only claim events whose id matches their content, so a forged
+# copy of a real event cannot settle the real one as invalid
+INVALID = "invalid"
+
+# Receives are attempted at most this many times per event
+DEFAULT_RECEIVE_ATTEMPTS = 3
+
+# Statuses of jobs still owned by the process in the ``pid`` column
+_ACTIVE = (QUEUED, RUNNING)
+# Receives in these states are not attempted again
+_SETTLED = (DONE, SKIPPED, INVALID)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    id INTEGER PRIMARY KEY,
+    direction TEXT NOT NULL,
+    event_id TEXT,
+    cid TEXT,
+    peer TEXT,
+    identity TEXT,
+    name TEXT,
+    size INTEGER,
+    plain_size INTEGER,
+    path TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    event TEXT,
+    pid INTEGER,
+    queued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS transfers_event
+    ON transfers (direction, event_id);
+CREATE INDEX IF NOT EXISTS transfers_cid ON transfers (cid);
+CREATE INDEX IF NOT EXISTS transfers_peer ON transfers (peer, queued_at);
+CREATE INDEX IF NOT EXISTS transfers_queued ON transfers (queued_at);
+"""
+
+# Columns ``update`` may set
+_FIELDS = {
+    "event_id",
+    "cid",
+    "peer",
+    "identity",
+    "name",
+    "size",
+    "plain_size",
+    "path",
+    "status",
+    "error",
+    "started_at",
+    "finished_at",
+}
+
+
+def peer_hex(peer: str) -> str:
+    """Hex public key for an npub; anything else is returned unchanged"""
+    if peer.startswith("npub"):
+        try:
+            return PublicKey.from_npub(peer).hex()
+        except Exception:
+            pass
+    return peer
+
+
+class Ledger:
+    """Transfer history and in-flight job state, shared by all fino processes"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or get_config_dir() / "ledger.db"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=10.0, check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Commits survive a process crash; only a power loss can drop the
+        # last few, which costs a re-download, not a lost file
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            columns = {
+                row["name"]
+                for row in self._conn.execute("PRAGMA table_info(transfers)")
+            }
+            if "attempts" not in columns:
+                self._conn.execute(
+                    "ALTER TABLE transfers"
+                    " ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"
+                )
+        self.max_attempts = max(
+            1, get_int_config("receive_attempts", DEFAULT_RECEIVE_ATTEMPTS)
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def begin(
+        self,
+        direction: str,
+        name: Optional[str] = None,
+        peer: Optional[str] = None,
+        plain_size: Optional[int] = None,
+    ) -> int:
+        """Add a running job; returns its row ID"""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO transfers (direction, name, peer, plain_size, status,"
+                " pid, queued_at, started_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    direction,
+                    name,
+                    peer_hex(peer) if peer else None,
+                    plain_size,
+                    RUNNING,
+                    os.getpid(),
+                    now,
+                    now,
+                ),
+            )
+            return int(cursor.lastrowid)
+
+    def claim_receive(
+        self, event: Any, identity: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Take ownership of receiving ``event``; returns the row ID.
+
+        Returns None if the event was already delivered (or skipped), if it
+        can never succeed, or if it is queued or running in a live process,
+        so replays from several relays, restarts and ``--since`` backfills
+        never repeat a download. Failed, rejected and interrupted receives
+        are claimed again until ``receive_attempts`` attempts were made.
+        """
+        record = json.dumps(
+            {
+                "id": event.id,
+                "pubkey": event.pubkey,
+                "created_at": event.created_at,
+                "kind": event.kind,
+                "tags": event.tags,
+                "content": event.content,
+                "sig": event.sig,
+                "recipient": getattr(event, "recipient", None),
+            }
+        )
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, status, pid, attempts FROM transfers"
+                " WHERE direction = ? AND event_id = ?",
+                (RECEIVE, event.id),
+            ).fetchone()
+            if row is None:
+                cursor = self._conn.execute(
+                    "INSERT INTO transfers (direction, event_id, peer, identity,"
+                    " status, attempts, event, pid, queued_at)"
+                    " VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)",
+                    (
+                        RECEIVE,
+                        event.id,
+                        event.pubkey,
+                        identity,
+                        QUEUED,
+                        record,
+                        os.getpid(),
+                        now,
+                    ),
+                )
+                return int(cursor.lastrowid)
+            if row["status"] in _SETTLED:
+                return None
+            if row["status"] in _ACTIVE and process_alive(row["pid"]):
+                return None
+            if row["attempts"] >= self.max_attempts:
+                return None
+            self._conn.execute(
+                "UPDATE transfers SET status = ?, error = NULL, pid = ?,"
+                " attempts = attempts + 1, queued_at = ?, started_at = NULL,"
+                " finished_at = NULL WHERE id = ?",
+                (QUEUED, os.getpid(), now, row["id"]),
+            )
+            return int(row["id"])
+
+    def update(self, row_id: int, **fields: Any) -> None:
+        unknown = set(fields) - _FIELDS
+        if unknown:
+            raise ValueError(f"Unknown ledger fields: {', '.join(sorted(unknown))}")
+        if not fields:
+            return
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE transfers SET {columns} WHERE id = ?",
+                (*fields.values(), row_id),
+            )
+
+    def start(self, row_id: int) -> None:
+        self.update(row_id, status=RUNNING, started_at=time.time())
+
+    def finish(
+        self,
+        row_id: int,
+        status: str = DONE,
+        error: Optional[str] = None,
+        **fields: Any,
+    ) -> None:
+        self.update(
+            row_id, status=status, error=error, finished_at=time.time(), **fields
+        )
+
+    def recover(self) -> List[Dict[str, Any]]:
+        """
+        Mark jobs of processes that are gone as interrupted.
+
+        Returns the interrupted receives (with their stored event) so the
+        caller can run them again; interrupted sends are only reported.
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT * FROM transfers WHERE status IN (?, ?)", _ACTIVE
+            ).fetchall()
+            stale = [dict(row) for row in rows if not process_alive(row["pid"])]
+            self._conn.executemany(
+                "UPDATE transfers SET status = ?, finished_at = ? WHERE id = ?",
+                [(INTERRUPTED, time.time(), row["id"]) for row in stale],
+            )
+        if stale:
+            logger.info("🩹 %d transfers were interrupted by a crash", len(stale))
+        return [
+            row for row in stale if row["direction"] == RECEIVE and row["event"]
+        ]
+
+    def history(
+        self,
+        direction: Optional[str] = None,
+        peer: Optional[str] = None,
+        cid: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """Most recent transfers first, filtered through the indexes"""
+        clauses = []
+        args: List[Any] = []
+        for column, value in (
+            ("direction", direction),
+            ("peer", peer_hex(peer) if peer else None),
+            ("cid", cid),
+            ("status", status),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            clauses.append("queued_at >= ?")
+            args.append(since)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, direction, event_id, cid, peer, identity, name, size,"
+                " plain_size, path, status, error, attempts, queued_at, started_at,"
+                f" finished_at FROM transfers{where}"
+                " ORDER BY queued_at DESC LIMIT ?",
+                (*args, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_ledger: Optional[Ledger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> Ledger:
+    """Get the process-wide transfer ledger"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = Ledger()
+        return _ledger
@@ -1,9 +1,15 @@
 from dotenv import load_dotenv
 import typer
+from typing import Optional
 from importlib.metadata import version, PackageNotFoundError
 from fino.commands.send import send as send_cmd
 from fino.commands.receive import receive as receive_cmd
 from fino.commands.gen_key import gen_key as gen_key_cmd
+from fino.commands.gc import gc as gc_cmd
+from fino.commands.provide import provide as provide_cmd
+from fino.commands.watch import watch as watch_cmd
+from fino.commands.history import history as history_cmd
+from fino.commands.dictionary import app as dict_app
 
 load_dotenv()
 
@@ -22,6 +28,28 @@ def callback(
     ),
     quiet: bool = typer.Option(False, "--quiet", "-q", help="Suppress all output"),
     json_out: bool = typer.Option(False, "--json", help="Output in JSON format"),
+    upload_limit: Optional[str] = typer.Option(
+        None, "--upload-limit", help="Total upload bandwidth, e.g. 10M (bytes/s)"
+    ),
+    download_limit: Optional[str] = typer.Option(
+        None, "--download-limit", help="Total download bandwidth, e.g. 10M (bytes/s)"
+    ),
+    transfer_limit: Optional[str] = typer.Option(
+        None, "--transfer-limit", help="Bandwidth of each single transfer (bytes/s)"
+    ),
+    max_transfers: Optional[int] = typer.Option(
+        None, "--max-transfers", help="Uploads/downloads allowed to run at once"
+    ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        help="Profile the command and print per-stage timings and hot functions",
+    ),
+    profile_output: Optional[str] = typer.Option(
+        None,
+        "--profile-output",
+        help="Path prefix for the profile file (default: fino-<command>-<time>)",
+    ),
     version_flag: bool = typer.Option(
         False,
         "--version",
@@ -75,7 +103,12 @@ def callback(
             "  [green]fino send[/green]     - Send encrypted files via IPFS + Nostr"
         )
         console.print("  [green]fino receive[/green]  - Receive and decrypt files")
+        console.print("  [green]fino watch[/green]    - Send files dropped into a folder")
         console.print("  [green]fino gen-key[/green]  - Generate new Nostr key pair")
+        console.print("  [green]fino history[/green]  - Show sent and received transfers")
+        console.print("  [green]fino dict[/green]     - Train zstd dictionaries for small files")
+        console.print("  [green]fino gc[/green]       - Unpin expired transfers")
+        console.print("  [green]fino provide[/green]  - Finish pending DHT announcements")
         console.print("\n[bold cyan]💡 Pro Tips:[/bold cyan]")
         console.print(
             "  • Use [yellow]--help[/yellow] with any command for detailed options"
@@ -88,13 +121,58 @@ def callback(
         raise typer.Exit(0)
     import fino.utils as utils
 
+    from fino import throttle
+
     # Apply global options
     utils.configure_logging(verbose, quiet, False, json_out)
 
+    limits = {}
+    for name, value in (
+        ("upload_limit", upload_limit),
+        ("download_limit", download_limit),
+        ("transfer_limit", transfer_limit),
+    ):
+        if value is not None:
+            try:
+                limits[name] = utils.parse_size(value)
+            except ValueError as e:
+                raise typer.BadParameter(str(e), param_hint="--" + name.replace("_", "-"))
+    throttle.configure(max_transfers=max_transfers, **limits)
+
+    if profile:
+        _start_profiling(ctx, profile_output)
+
+
+def _start_profiling(ctx: typer.Context, output_prefix: Optional[str]) -> None:
+    import time
+
+    from fino import profiling
+    from fino.console import print_profile_report
+
+    if output_prefix is None:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output_prefix = f"fino-{ctx.invoked_subcommand}-{stamp}"
+    profiler = profiling.CommandProfiler(output_prefix)
+    profiler.start()
+
+    # Runs once the subcommand has finished, whether or not it succeeded
+    def report() -> None:
+        hot = profiler.stop()
+        print_profile_report(
+            profiler.wall_time, profiling.stage_timings(), hot, profiler.output_path
+        )
+
+    ctx.call_on_close(report)
+
 
 app.command()(gen_key_cmd)
 app.command()(send_cmd)
 app.command()(receive_cmd)
+app.command()(gc_cmd)
+app.command()(provide_cmd)
+app.command()(watch_cmd)
+app.command()(history_cmd)
+app.add_typer(dict_app, name="dict")
 
 
 def main():
@@ -0,0 +1,363 @@
+"""
+Large-file transfers split into independently encrypted parts.
+
+Each part is compressed, encrypted and uploaded as its own CID, so parts can
+move in parallel and be retried one at a time. A small encrypted manifest
+lists the parts (CID, nonce, sizes, SHA-256 of the ciphertext) and is the
+only CID referenced from the DM.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+)
+
+from .encryption import decrypt_file, encrypt_data, generate_key, preferred_suite
+from .ipfs import download_bytes_from_ipfs, get_node_peer_info, upload_bytes_to_ipfs
+from .utils import build_payload, get_int_config, preallocate, read_full
+
+logger = logging.getLogger(__name__)
+
+# Files at least this large are sent as a manifest of parts
+DEFAULT_MANIFEST_THRESHOLD = 256 * 1024 * 1024
+DEFAULT_PART_SIZE = 32 * 1024 * 1024
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+
+_MANIFEST_AAD = b"fino-manifest"
+
+T = TypeVar("T")
+
+
+def get_manifest_threshold() -> int:
+    return get_int_config("manifest_threshold", DEFAULT_MANIFEST_THRESHOLD)
+
+
+def get_part_size() -> int:
+    return get_int_config("part_size", DEFAULT_PART_SIZE)
+
+
+def get_transfer_workers() -> int:
+    return max(1, get_int_config("transfer_workers", DEFAULT_WORKERS))
+
+
+def _part_aad(index: int) -> bytes:
+    # Binds each part to its position so parts cannot be reordered
+    return f"fino-part:{index}".encode("ascii")
+
+
+def _with_retries(fn: Callable[[], T], retries: int, what: str) -> T:
+    for attempt in range(1, retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = 2 ** (attempt - 1)
+            logger.warning(
+                "⚠️  %s failed (%s), retrying in %ss [%s/%s]",
+                what,
+                e,
+                delay,
+                attempt,
+                retries,
+            )
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def _upload_part(
+    path: Path, key: bytes, index: int, part_size: int, retries: int, suite: str
+) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        f.seek(index * part_size)
+        data = f.read(part_size)
+    return _upload_data(data, path.name, key, index, retries, suite)
+
+
+def _upload_data(
+    data: bytes, name: str, key: bytes, index: int, retries: int, suite: str
+) -> Dict[str, Any]:
+    ciphertext, nonce = encrypt_data(data, key, _part_aad(index), suite)
+    cid = _with_retries(
+        lambda: upload_bytes_to_ipfs(
+            ciphertext, suffix=f"_{name}.part{index}", background_announce=True
+        ),
+        retries,
+        f"Upload of part {index}",
+    )
+    return {
+        "cid": cid,
+        "nonce": nonce.hex(),
+        "size": len(ciphertext),
+        "plain_size": len(data),
+        "sha256": hashlib.sha256(ciphertext).hexdigest(),
+    }
+
+
+def send_manifest(
+    path: Path,
+    part_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    retries: int = DEFAULT_RETRIES,
+    suite: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Encrypt and upload a file as parallel parts plus a manifest.
+
+    Returns the DM payload, which references only the manifest CID.
+    """
+    part_size = part_size or get_part_size()
+    workers = workers or get_transfer_workers()
+    suite = suite or preferred_suite()
+    size = path.stat().st_size
+    count = max(1, -(-size // part_size))
+    key = generate_key()
+
+    logger.info(
+        "🧩 Splitting %d bytes into %d parts (%s in parallel)", size, count, workers
+    )
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parts = list(
+            pool.map(
+                lambda i: _upload_part(path, key, i, part_size, retries, suite),
+                range(count),
+            )
+        )
+    return _publish_manifest(path.name, size, part_size, parts, key, retries, suite)
+
+
+def send_manifest_stream(
+    stream: BinaryIO,
+    name: str,
+    part_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    retries: int = DEFAULT_RETRIES,
+    suite: Optional[str] = None,
+    first: bytes = b"",
+) -> Dict[str, Any]:
+    """
+    Encrypt and upload a stream of unknown length as parts plus a manifest.
+
+    Each part is handed to the upload pool as soon as it has been read, and
+    reading pauses while ``workers`` parts are in flight, so memory stays
+    around ``workers`` parts however long the stream runs. ``first`` is data
+    already read from the stream. Returns the DM payload.
+    """
+    part_size = part_size or get_part_size()
+    workers = workers or get_transfer_workers()
+    suite = suite or preferred_suite()
+    key = generate_key()
+
+    logger.info("🧩 Streaming %s in %d-byte parts", name, part_size)
+    parts: List[Dict[str, Any]] = []
+    pending: Deque["Future[Dict[str, Any]]"] = deque()
+    size = 0
+    index = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while True:
+                data = first + read_full(stream, part_size - len(first))
+                first = b""
+                # An empty stream is still sent as one (empty) part
+                if not data and index > 0:
+                    break
+                if len(pending) >= workers:
+                    parts.append(pending.popleft().result())
+                pending.append(
+                    pool.submit(_upload_data, data, name, key, index, retries, suite)
+                )
+                size += len(data)
+                index += 1
+                if len(data) < part_size:
+                    break
+            while pending:
+                parts.append(pending.popleft().result())
+        except BaseException:
+            for fut in pending:
+                fut.cancel()
+            raise
+    return _publish_manifest(name, size, part_size, parts, key, retries, suite)
+
+
+def _publish_manifest(
+    name: str,
+    size: int,
+    part_size: int,
+    parts: List[Dict[str, Any]],
+    key: bytes,
+    retries: int,
+    suite: str,
+) -> Dict[str, Any]:
+    manifest = {
+        "filename": name,
+        "size": size,
+        "part_size": part_size,
+        "parts": parts,
+    }
+    manifest_ct, manifest_nonce = encrypt_data(
+        json.dumps(manifest).encode("utf-8"), key, _MANIFEST_AAD, suite
+    )
+    manifest_cid = _with_retries(
+        lambda: upload_bytes_to_ipfs(manifest_ct, suffix=f"_{name}.manifest"),
+        retries,
+        "Manifest upload",
+    )
+
+    payload = build_payload(
+        manifest_cid,
+        key,
+        manifest_nonce,
+        name,
+        peer=get_node_peer_info(),
+        size=sum(part["size"] for part in parts) + len(manifest_ct),
+        plain_size=size,
+        sha256=hashlib.sha256(manifest_ct).hexdigest(),
+        suite=suite,
+    )
+    payload["manifest"] = {"parts": len(parts), "size": size}
+    return payload
+
+
+def fetch_manifest(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Download and decrypt the manifest referenced by a DM payload"""
+    data = download_bytes_from_ipfs(payload["cid"], payload.get("peer"))
+    digest = payload.get("sha256")
+    if digest and hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError("Manifest failed hash verification")
+    manifest_json = decrypt_file(
+        data,
+        bytes.fromhex(payload["key"]),
+        bytes.fromhex(payload["nonce"]),
+        _MANIFEST_AAD,
+        payload.get("suite"),
+    )
+    return json.loads(manifest_json)
+
+
+def _fetch_part(
+    key: bytes,
+    index: int,
+    part: Dict[str, Any],
+    retries: int,
+    peer: Optional[Dict[str, Any]] = None,
+    suite: Optional[str] = None,
+) -> bytes:
+    def attempt() -> bytes:
+        ciphertext = download_bytes_from_ipfs(part["cid"], peer)
+        if hashlib.sha256(ciphertext).hexdigest() != part["sha256"]:
+            raise ValueError(f"Part {index} failed hash verification")
+        return decrypt_file(
+            ciphertext, key, bytes.fromhex(part["nonce"]), _part_aad(index), suite
+        )
+
+    return _with_retries(attempt, retries, f"Download of part {index}")
+
+
+def iter_manifest_parts(
+    payload: Dict[str, Any],
+    manifest: Optional[Dict[str, Any]] = None,
+    workers: Optional[int] = None,
+    retries: int = DEFAULT_RETRIES,
+) -> Iterator[bytes]:
+    """
+    Yield decrypted parts in file order while later parts download.
+
+    Up to ``workers`` parts are fetched ahead of the consumer, which bounds
+    memory to roughly ``workers`` parts no matter how large the file is.
+    """
+    manifest = manifest or fetch_manifest(payload)
+    workers = workers or get_transfer_workers()
+    key = bytes.fromhex(payload["key"])
+    peer = payload.get("peer")
+    suite = payload.get("suite")
+    parts: List[Dict[str, Any]] = manifest["parts"]
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending: Deque["Future[bytes]"] = deque()
+    next_index = 0
+    try:
+        while next_index < len(parts) and len(pending) < workers:
+            pending.append(
+                pool.submit(
+                    _fetch_part,
+                    key,
+                    next_index,
+                    parts[next_index],
+                    retries,
+                    peer,
+                    suite,
+                )
+            )
+            next_index += 1
+
+        while pending:
+            plaintext = pending.popleft().result()
+            if next_index < len(parts):
+                pending.append(
+                    pool.submit(
+                        _fetch_part,
+                        key,
+                        next_index,
+                        parts[next_index],
+                        retries,
+                        peer,
+                        suite,
+                    )
+                )
+                next_index += 1
+            yield plaintext
+    finally:
+        for fut in pending:
+            fut.cancel()
+        pool.shutdown(wait=False)
+
+
+def receive_manifest(
+    payload: Dict[str, Any],
+    output_path: str,
+    workers: Optional[int] = None,
+    retries: int = DEFAULT_RETRIES,
+    on_allocated: Optional[Callable[[], None]] = None,
+) -> int:
+    """
+    Download, verify and decrypt all parts into ``output_path``.
+
+    The output file is preallocated to the full size first, so a disk that
+    cannot hold it fails before any part is downloaded; ``on_allocated`` is
+    called once that space is taken. Returns the number of bytes written. A
+    partial file is removed on failure.
+    """
+    manifest = fetch_manifest(payload)
+    written = 0
+    try:
+        with open(output_path, "wb") as out:
+            if preallocate(out, manifest["size"]) and on_allocated:
+                on_allocated()
+            for index, plaintext in enumerate(
+                iter_manifest_parts(payload, manifest, workers, retries)
+            ):
+                out.write(plaintext)
+                written += len(plaintext)
+                logger.debug("Part %s/%s written", index + 1, len(manifest["parts"]))
+            out.truncate(written)
+    except Exception:
+        if os.path.exists(output_path):
+            os.unlink(output_path)
+        raise
+    return written
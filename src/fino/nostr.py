@@ -1,23 +1,142 @@
-from typing import List, Callable
+from collections import OrderedDict
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Container,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+import base64
+import hashlib
 import json
 import asyncio
+import logging
+import os
+import time
 import websockets
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from pynostr.key import PrivateKey, PublicKey  # type: ignore[import-untyped]
 from pynostr.encrypted_dm import EncryptedDirectMessage  # type: ignore[import-untyped]
 from pynostr.event import Event  # type: ignore[import-untyped]
-from .console import console
+from .keyring import Keyring
+from .profiling import stage
+from .relays import DEFAULT_RELAYS, RelayManager, get_relay_manager
+
+logger = logging.getLogger(__name__)
+
+# How many recent event IDs to remember for cross-relay de-duplication
+_SEEN_EVENTS_LIMIT = 10000
+# Largest page a backfill asks for, as a multiple of the page size, when
+# many messages share one timestamp
+_BACKFILL_MAX_LIMIT_FACTOR = 16
+# Most pubkeys sent in one "#p" filter; larger keyrings use several filters
+_MAX_FILTER_PUBKEYS = 256
+
+# Fastest available JSON decoder for relay frames; the stdlib is the fallback
+try:
+    import orjson  # type: ignore[import-not-found]
+
+    _loads: Callable[[Union[str, bytes]], Any] = orjson.loads
+    _JSON_ERRORS: Tuple[type, ...] = (ValueError,)
+    JSON_BACKEND = "orjson"
+except ImportError:
+    try:
+        import msgspec  # type: ignore[import-not-found]
+
+        _loads = msgspec.json.decode
+        _JSON_ERRORS = (msgspec.DecodeError,)
+        JSON_BACKEND = "msgspec"
+    except ImportError:
+        _loads = json.loads
+        _JSON_ERRORS = (ValueError,)
+        JSON_BACKEND = "json"
+
+
+class DMEvent:
+    """
+    Compact record of an event received from a relay.
+
+    Built straight from the relay's JSON without the validation done by
+    pynostr's ``Event``. The relay iterators only pass on events whose ``id``
+    matches their content; the signature is not checked, and the DM payload
+    is authenticated when it is decrypted.
+    """
+
+    __slots__ = (
+        "id",
+        "pubkey",
+        "created_at",
+        "kind",
+        "tags",
+        "content",
+        "sig",
+        "recipient",
+    )
 
-DEFAULT_RELAYS = ["wss://nos.lol"]
+    def __init__(
+        self,
+        id: str,
+        pubkey: str,
+        created_at: int,
+        kind: int,
+        tags: List[List[str]],
+        content: str,
+        sig: str,
+        recipient: Optional[str] = None,
+    ):
+        self.id = id
+        self.pubkey = pubkey
+        self.created_at = created_at
+        self.kind = kind
+        self.tags = tags
+        self.content = content
+        self.sig = sig
+        # Hex pubkey of the receiving identity this event was routed to
+        self.recipient = recipient
+
+    @classmethod
+    def from_dict(
+        cls, ev_data: Dict[str, Any], recipient: Optional[str] = None
+    ) -> "DMEvent":
+        return cls(
+            ev_data["id"],
+            ev_data["pubkey"],
+            ev_data["created_at"],
+            ev_data["kind"],
+            ev_data["tags"],
+            ev_data["content"],
+            ev_data["sig"],
+            recipient,
+        )
+
+    def id_matches(self) -> bool:
+        """Whether ``id`` is the NIP-01 id of this event's content"""
+        return _id_matches(
+            {
+                "id": self.id,
+                "pubkey": self.pubkey,
+                "created_at": self.created_at,
+                "kind": self.kind,
+                "tags": self.tags,
+                "content": self.content,
+            }
+        )
 
+    def __repr__(self) -> str:
+        return f"DMEvent(id={self.id!r}, pubkey={self.pubkey!r})"
 
+
+@stage("metadata encrypt")
 def encrypt_payload(payload: dict, recipient_npub: str, sender_nsec: str) -> str:
     """Encrypt payload using ECDH shared secret for cross-key communication"""
-    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-    from cryptography.hazmat.primitives import hashes
-    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
-    import base64
-    import os
-
     # Get keys
     sender_priv = PrivateKey.from_nsec(sender_nsec)
     recipient_pub = PublicKey.from_npub(recipient_npub)
@@ -55,22 +174,21 @@ def encrypt_payload(payload: dict, recipient_npub: str, sender_nsec: str) -> str
     return f"{encrypted_b64}?iv={iv_b64}"
 
 
-def decrypt_payload(event: Event, your_nsec: str) -> dict:
+@stage("metadata decrypt")
+def decrypt_payload(event: Union[Event, DMEvent], your_nsec: str) -> dict:
     """Decrypt payload using ECDH shared secret for cross-key communication"""
-    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-    from cryptography.hazmat.primitives import hashes
-    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
-    import base64
-
     priv = PrivateKey.from_nsec(your_nsec)
 
-    console.print(f"🔍 Debug: Event content length: {len(event.content)}", style="cyan")
-    console.print(f"🔍 Debug: Event pubkey: {event.pubkey[:8]}...", style="cyan")
-    console.print(f"🔍 Debug: Our pubkey: {priv.public_key.hex()[:8]}...", style="cyan")
+    logger.debug(
+        "Decrypting event %s from %s (%d bytes)",
+        event.id,
+        event.pubkey,
+        len(event.content),
+    )
 
     # Check if it's our custom format (base64?iv=base64)
     if "?iv=" in event.content:
-        console.print("🔄 Using custom ECDH decryption...", style="cyan")
+        logger.debug("Using custom ECDH decryption")
 
         # Parse the encrypted content
         encrypted_part, iv_part = event.content.split("?iv=")
@@ -101,14 +219,11 @@ def decrypt_payload(event: Event, your_nsec: str) -> dict:
 
         # Parse as JSON
         json_str = decrypted_data.decode("utf-8")
-        console.print(
-            f"🔍 Debug: Custom decryption successful: {json_str}", style="green"
-        )
         return json.loads(json_str)
 
     else:
         # Fallback to pynostr's built-in decryption (for self-send)
-        console.print("🔄 Trying pynostr's built-in decryption...", style="cyan")
+        logger.debug("Using pynostr's built-in decryption")
         try:
             dm = EncryptedDirectMessage()
             dm.encrypted_message = event.content
@@ -116,220 +231,607 @@ def decrypt_payload(event: Event, your_nsec: str) -> dict:
             dm.recipient_pubkey = priv.public_key.hex()
 
             dm.decrypt(priv.hex())
-            console.print(
-                f"🔍 Debug: Pynostr decryption successful: {dm.cleartext_content}",
-                style="green",
-            )
             return json.loads(dm.cleartext_content)
         except Exception as e:
-            console.print(f"❌ Debug: Pynostr decryption failed: {e}", style="red")
+            logger.debug("Pynostr decryption failed: %s", e)
             raise e
 
 
-async def send_dm_async(
-    from_nsec: str, to_npub: str, encrypted_content: str, relays: List[str]
-):
-    console.print("🚀 STARTING SEND PROCESS", style="bright_magenta")
-
+@stage("sign event")
+def build_dm_event(from_nsec: str, to_npub: str, encrypted_content: str) -> Event:
+    """Build and sign a Kind 4 DM event carrying already encrypted content"""
     priv = PrivateKey.from_nsec(from_nsec)
-    console.print(
-        f"🔑 Sender private key: {priv.public_key.hex()[:8]}...", style="cyan"
-    )
-
     pub = PublicKey.from_npub(to_npub)
-    console.print(f"👤 Recipient public key: {pub.hex()[:8]}...", style="cyan")
 
     dm = EncryptedDirectMessage()
-    console.print("🔐 Creating DM event...", style="cyan")
     # The content is already encrypted, just create the event
     dm.encrypted_message = encrypted_content
     dm.pubkey = priv.public_key.hex()
     dm.recipient_pubkey = pub.hex()
-    console.print("✅ DM event created successfully", style="green")
 
     ev = dm.to_event()
     ev.sign(priv.hex())
-    console.print(f"📝 Event created - ID: {ev.id[:8]}...", style="cyan")
-    console.print(f"📝 Event kind: {ev.kind}", style="cyan")
-    console.print(f"📝 Event pubkey: {ev.pubkey[:8]}...", style="cyan")
-    console.print(f"📝 Event tags: {ev.tags}", style="cyan")
-
-    # Send to each relay directly
-    chosen_relays = relays if relays else DEFAULT_RELAYS
-    for relay_url in chosen_relays:
-        console.print(f"🔌 Connecting to {relay_url}...", style="cyan")
+    return ev
+
+
+def event_to_message(ev: Event) -> str:
+    """Serialize a signed event as a relay EVENT message"""
+    event_data = {
+        "id": ev.id,
+        "pubkey": ev.pubkey,
+        "created_at": ev.created_at,
+        "kind": ev.kind,
+        "tags": ev.tags,
+        "content": ev.content,
+        "sig": ev.sig,
+    }
+    return json.dumps(["EVENT", event_data])
+
+
+class RelayPool:
+    """
+    Shared set of open relay connections that can publish from many coroutines.
+
+    Each connection has a reader task that routes relay OK replies to the
+    publisher waiting on that event ID, so concurrent sends never race on
+    ``recv()``. Connections that drop are reopened on the next ``connect()``.
+    Connect times, OK latencies and failures are reported to the relay manager.
+    """
+
+    def __init__(
+        self,
+        relays: Optional[List[str]] = None,
+        timeout: float = 5.0,
+        stats: Optional[RelayManager] = None,
+    ):
+        self.relays = list(relays) if relays else list(DEFAULT_RELAYS)
+        self.timeout = timeout
+        self.stats = stats or get_relay_manager()
+        self._conns: Dict[str, Any] = {}
+        self._readers: Dict[str, "asyncio.Task[None]"] = {}
+        self._opening: Dict[str, "asyncio.Task[None]"] = {}
+        self._pending: Dict[Tuple[str, str], "asyncio.Future[bool]"] = {}
+
+    async def __aenter__(self) -> "RelayPool":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    @property
+    def connected(self) -> List[str]:
+        return list(self._conns)
+
+    async def connect(self) -> List[str]:
+        """Open connections to every relay not already connected"""
+        tasks = []
+        for relay_url in self.relays:
+            if relay_url in self._conns:
+                continue
+            task = self._opening.get(relay_url)
+            if task is None or task.done():
+                task = asyncio.ensure_future(self._open(relay_url))
+                self._opening[relay_url] = task
+            tasks.append(task)
+        if tasks:
+            with stage("relay connect"):
+                await asyncio.gather(*tasks, return_exceptions=True)
+        return self.connected
+
+    async def _open(self, relay_url: str) -> None:
+        logger.debug("Connecting to %s", relay_url)
+        started = time.perf_counter()
         try:
-            async with websockets.connect(relay_url, proxy=None) as websocket:
-                console.print(f"✅ Connected to {relay_url}", style="green")
-
-                # Send the event
-                event_data = {
-                    "id": ev.id,
-                    "pubkey": ev.pubkey,
-                    "created_at": ev.created_at,
-                    "kind": ev.kind,
-                    "tags": ev.tags,
-                    "content": ev.content,
-                    "sig": ev.sig,
-                }
-                event_msg = json.dumps(["EVENT", event_data])
-                console.print(f"📤 Sending event to {relay_url}...", style="cyan")
-                await websocket.send(event_msg)
-
-                # Wait for OK response
-                response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                console.print(
-                    f"📨 Response from {relay_url}: {str(response)}", style="cyan"
-                )
+            websocket = await websockets.connect(relay_url, proxy=None)
+        except Exception as e:
+            self.stats.record_failure(relay_url)
+            logger.warning("❌ Failed to connect to %s: %s", relay_url, e)
+            return
+        self.stats.record_connect(relay_url, (time.perf_counter() - started) * 1000)
+        logger.info("✅ Connected to %s", relay_url)
+        self._conns[relay_url] = websocket
+        self._readers[relay_url] = asyncio.ensure_future(
+            self._read(relay_url, websocket)
+        )
 
+    async def _read(self, relay_url: str, websocket: Any) -> None:
+        try:
+            async for response in websocket:
+                try:
+                    data = _loads(response)
+                except _JSON_ERRORS:
+                    continue
+                # Anything but an ["OK", <event id>, ...] frame is ignored; an
+                # error here would end the reader for the whole connection
+                if (
+                    isinstance(data, list)
+                    and len(data) >= 3
+                    and data[0] == "OK"
+                    and isinstance(data[1], str)
+                ):
+                    fut = self._pending.pop((relay_url, data[1]), None)
+                    if fut is not None and not fut.done():
+                        fut.set_result(bool(data[2]))
+        except Exception:
+            pass
+        finally:
+            self._conns.pop(relay_url, None)
+            for key in [k for k in self._pending if k[0] == relay_url]:
+                fut = self._pending.pop(key)
+                if not fut.done():
+                    fut.set_result(False)
+
+    async def _publish_one(self, relay_url: str, ev: Event, message: str) -> bool:
+        websocket = self._conns.get(relay_url)
+        if websocket is None:
+            return False
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[(relay_url, ev.id)] = fut
+        try:
+            logger.debug("Sending event %s to %s", ev.id, relay_url)
+            sent = time.perf_counter()
+            await websocket.send(message)
+            accepted = await asyncio.wait_for(fut, timeout=self.timeout)
+            if accepted:
+                self.stats.record_ok(relay_url, (time.perf_counter() - sent) * 1000)
+            else:
+                self.stats.record_failure(relay_url)
+            logger.debug(
+                "Response from %s: %s", relay_url, "OK" if accepted else "rejected"
+            )
+            return accepted
         except Exception as e:
-            console.print(f"❌ Failed to send to {relay_url}: {e}", style="red")
+            self.stats.record_failure(relay_url)
+            logger.warning("❌ Failed to send to %s: %s", relay_url, e)
+            return False
+        finally:
+            self._pending.pop((relay_url, ev.id), None)
+
+    async def publish(self, ev: Event) -> Dict[str, bool]:
+        """Publish a signed event to all connected relays concurrently"""
+        message = event_to_message(ev)
+        relay_urls = self.connected
+        with stage("relay publish"):
+            results = await asyncio.gather(
+                *(self._publish_one(url, ev, message) for url in relay_urls)
+            )
+        return dict(zip(relay_urls, results))
 
-    console.print("✅ Send process completed", style="green")
+    async def close(self) -> None:
+        for task in self._opening.values():
+            task.cancel()
+        for websocket in list(self._conns.values()):
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+        for task in self._readers.values():
+            task.cancel()
+        self._conns.clear()
+        self._readers.clear()
+        self._opening.clear()
+        self.stats.save()
 
 
-def send_dm(from_nsec: str, to_npub: str, encrypted_content: str, relays: List[str]):
-    asyncio.run(send_dm_async(from_nsec, to_npub, encrypted_content, relays))
+async def send_dm_async(
+    from_nsec: str, to_npub: str, encrypted_content: str, relays: List[str]
+) -> Tuple[str, Dict[str, bool]]:
+    """
+    Publish a DM to the relays; returns the event ID and each relay's OK.
+
+    Raises ConnectionError if no relay accepted the event.
+    """
+    ev = build_dm_event(from_nsec, to_npub, encrypted_content)
+    logger.debug(
+        "Created DM event %s (kind %s) from %s, tags %s",
+        ev.id,
+        ev.kind,
+        ev.pubkey,
+        ev.tags,
+    )
 
+    # Send to each relay directly
+    async with RelayPool(relays) as pool:
+        results = await pool.publish(ev)
 
-async def receive_loop_async(your_nsec: str, relays: List[str], callback: Callable):
-    console.print("🎧 STARTING RECEIVE PROCESS", style="bright_magenta")
+    if not any(results.values()):
+        raise ConnectionError("No relay accepted the DM event")
+    logger.debug("Send process completed")
+    return ev.id, results
 
-    try:
-        priv = PrivateKey.from_nsec(your_nsec)
-        pub_hex = priv.public_key.hex()
-        console.print(f"🔑 Receiver private key: {pub_hex[:8]}...", style="cyan")
 
-        default = DEFAULT_RELAYS
-        chosen = relays if relays else default
-        console.print(f"🌐 Using relays: {chosen}", style="cyan")
+def send_dm(
+    from_nsec: str, to_npub: str, encrypted_content: str, relays: List[str]
+) -> Tuple[str, Dict[str, bool]]:
+    """Publish a DM to the relays; see :func:`send_dm_async`"""
+    return asyncio.run(send_dm_async(from_nsec, to_npub, encrypted_content, relays))
+
+
+def dm_filter(
+    pubkeys: Sequence[str],
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Relay-side filter for DMs addressed to any of ``pubkeys``"""
+    flt: Dict[str, Any] = {"kinds": [4], "#p": list(pubkeys)}
+    if since is not None:
+        flt["since"] = since
+    if until is not None:
+        flt["until"] = until
+    if limit is not None:
+        flt["limit"] = limit
+    return flt
+
+
+def _event_id(ev_data: Dict[str, Any]) -> str:
+    """NIP-01 event id: SHA-256 of the event's canonical serialization"""
+    serialized = json.dumps(
+        [
+            0,
+            ev_data["pubkey"],
+            ev_data["created_at"],
+            ev_data["kind"],
+            ev_data["tags"],
+            ev_data["content"],
+        ],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
 
-        # Connect to the first relay
-        relay_url = chosen[0]
-        console.print(f"🔌 Connecting to {relay_url}...", style="cyan")
 
-        # Record start time to only process recent messages
-        import time
+def _id_matches(ev_data: Dict[str, Any]) -> bool:
+    """Whether a relay-supplied event carries the id of its own content"""
+    try:
+        return _event_id(ev_data) == ev_data["id"]
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def _pubkey_chunks(pubkeys: Sequence[str]) -> List[Sequence[str]]:
+    # Relays cap the number of values in one filter
+    return [
+        pubkeys[i : i + _MAX_FILTER_PUBKEYS]
+        for i in range(0, len(pubkeys), _MAX_FILTER_PUBKEYS)
+    ]
+
+
+def _dm_recipient(ev_data: Dict[str, Any], pubkeys: Container[str]) -> Optional[str]:
+    """Return which of ``pubkeys`` a DM event is addressed to, if any"""
+    if ev_data.get("kind") != 4:
+        return None
+    for tag in ev_data.get("tags", ()):
+        # Look up the key first; it rules out almost every tag
+        if len(tag) > 1 and tag[1] in pubkeys and tag[0] == "p":
+            return tag[1]
+    return None
+
+
+async def _subscribe_dms(
+    relay_url: str,
+    pubkeys: Sequence[str],
+    start_time: int,
+    queue: "asyncio.Queue[Any]",
+    stats: RelayManager,
+    limit: Optional[int] = None,
+) -> None:
+    """Stream DM events for any of ``pubkeys`` from one relay into ``queue``"""
+    wanted = frozenset(pubkeys)
+    try:
+        logger.debug("Connecting to %s", relay_url)
+        started = time.perf_counter()
+        async with websockets.connect(relay_url, proxy=None) as websocket:
+            stats.record_connect(relay_url, (time.perf_counter() - started) * 1000)
+            logger.info("✅ Connected to %s", relay_url)
+
+            # One subscription for every identity, filtered by the relay
+            filters = [
+                dm_filter(chunk, since=start_time + 1, limit=limit)
+                for chunk in _pubkey_chunks(pubkeys)
+            ]
+            req_msg = json.dumps(["REQ", "dm", *filters])
+            logger.debug(
+                "Subscribing on %s for %s identities", relay_url, len(pubkeys)
+            )
+            await websocket.send(req_msg)
 
-        start_time = int(time.time())
-        console.print(f"⏰ Started listening at: {start_time}", style="cyan")
+            async for response in websocket:
+                # Drop NOTICE/EOSE/OK frames (and binary ones) before paying
+                # for a full parse; EVENT frames start with ["EVENT"
+                if type(response) is not str or '"EVENT"' not in response[:16]:
+                    continue
+                try:
+                    data = _loads(response)
+                    ev_data = data[2]
+                except _JSON_ERRORS + (IndexError, TypeError):
+                    # Malformed frame, skip silently
+                    continue
+                if data[0] != "EVENT":
+                    continue
+
+                # Only process Kind 4 (DM) events addressed to us
+                recipient = _dm_recipient(ev_data, wanted)
+                if recipient is None:
+                    continue
+
+                # Relays may ignore the filter, so re-check the window here
+                if ev_data["created_at"] <= start_time:
+                    continue
+
+                # Blocks while the consumer is behind, which stops reading
+                # from the socket and pushes back on the relay
+                await queue.put((ev_data, recipient))
+
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        console.print(f"❌ Error initializing receiver: {e}", style="red")
-        return
+        stats.record_failure(relay_url)
+        logger.warning("❌ Relay %s failed: %s", relay_url, e)
+
+    await queue.put(None)
+
+
+async def iter_dm_events(
+    your_nsec: Union[str, Keyring],
+    relays: Optional[List[str]] = None,
+    since: Optional[int] = None,
+    max_queue: int = 64,
+    stats: Optional[RelayManager] = None,
+) -> AsyncIterator[DMEvent]:
+    """
+    Yield DM events addressed to ``your_nsec`` from all relays, de-duplicated.
+
+    ``your_nsec`` may be a :class:`Keyring`, in which case every identity
+    shares one subscription per relay and each event's ``recipient`` tells
+    which identity it is for. Events are buffered in a queue of at most
+    ``max_queue`` entries; when the consumer falls behind, relay reads pause
+    until it catches up. Closing the iterator closes every relay connection.
+    """
+    pubkeys = Keyring.of(your_nsec).pubkeys
+    chosen = relays if relays else DEFAULT_RELAYS
+    start_time = int(time.time()) if since is None else since
+    stats = stats or get_relay_manager()
+    # When listening from now on, "limit": 0 asks relays to skip stored events
+    limit = 0 if since is None else None
+
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_queue)
+    readers = [
+        asyncio.ensure_future(
+            _subscribe_dms(url, pubkeys, start_time, queue, stats, limit)
+        )
+        for url in chosen
+    ]
+    seen: "OrderedDict[str, None]" = OrderedDict()
+    remaining = len(readers)
 
     try:
-        console.print(f"🔌 Attempting to connect to {relay_url}...", style="cyan")
+        while remaining:
+            item = await queue.get()
+            if item is None:
+                remaining -= 1
+                continue
+            ev_data, recipient = item
+
+            # The same event usually arrives from every relay. Only an id
+            # that matches the content is remembered, so a relay cannot
+            # shadow a real event by sending another one under its id
+            if ev_data["id"] in seen:
+                continue
+            if not _id_matches(ev_data):
+                logger.debug("Dropping event with a mismatched id %s", ev_data["id"])
+                continue
+            seen[ev_data["id"]] = None
+            if len(seen) > _SEEN_EVENTS_LIMIT:
+                seen.popitem(last=False)
+
+            yield DMEvent.from_dict(ev_data, recipient)
+    finally:
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        stats.save()
+
+
+async def _fetch_history_pages(
+    websocket: Any,
+    relay_url: str,
+    pubkeys: Sequence[str],
+    since: int,
+    until: int,
+    page_size: int,
+    timeout: float,
+) -> List[Dict[str, Any]]:
+    """
+    Page backwards through the stored DMs for ``pubkeys`` in ``[since, until]``.
+
+    Each page asks for at most ``page_size`` events with ``until`` set to the
+    oldest timestamp seen so far. ``until`` is inclusive, so a page that
+    brings nothing new either means the window is exhausted or that a single
+    second holds more than a page; the latter is retried with a larger limit.
+    """
+    events: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    cursor = until
+    limit = page_size
+    page_no = 0
+    while cursor >= since:
+        sub_id = f"backfill{page_no}"
+        flt = dm_filter(pubkeys, since=since, until=cursor, limit=limit)
+        await websocket.send(json.dumps(["REQ", sub_id, flt]))
+
+        page: List[Dict[str, Any]] = []
+        while True:
+            data = _loads(await asyncio.wait_for(websocket.recv(), timeout=timeout))
+            if data[0] == "EVENT" and data[1] == sub_id:
+                # Events whose id does not match their content are dropped
+                # before they can be de-duplicated against real ones
+                if _id_matches(data[2]):
+                    page.append(data[2])
+            elif data[0] in ("EOSE", "CLOSED") and data[1] == sub_id:
+                break
+        await websocket.send(json.dumps(["CLOSE", sub_id]))
+
+        new = [ev for ev in page if ev["id"] not in seen]
+        logger.debug(
+            "%s: page %s returned %s events (%s new)",
+            relay_url,
+            page_no,
+            len(page),
+            len(new),
+        )
+        page_no += 1
+        if new:
+            seen.update(ev["id"] for ev in new)
+            events.extend(ev for ev in new if since <= ev["created_at"] <= until)
+            cursor = min(ev["created_at"] for ev in page)
+            limit = page_size
+        elif len(page) < limit:
+            break
+        elif limit < page_size * _BACKFILL_MAX_LIMIT_FACTOR:
+            limit *= 2
+        else:
+            logger.warning(
+                "⚠️  %s: more than %s messages at %s, skipping the rest",
+                relay_url,
+                limit,
+                cursor,
+            )
+            cursor -= 1
+            limit = page_size
+    return events
+
+
+async def _fetch_history_from(
+    relay_url: str,
+    pubkeys: Sequence[str],
+    since: int,
+    until: int,
+    page_size: int,
+    stats: RelayManager,
+    timeout: float,
+) -> List[Tuple[Dict[str, Any], str]]:
+    """Fetch one relay's stored DMs for ``pubkeys`` with their recipients"""
+    wanted = frozenset(pubkeys)
+    found: List[Tuple[Dict[str, Any], str]] = []
+    try:
+        started = time.perf_counter()
         async with websockets.connect(relay_url, proxy=None) as websocket:
-            console.print(f"✅ Connected to {relay_url}", style="green")
-
-            # Subscribe to DMs for our pubkey
-            req_msg = json.dumps(["REQ", "dm", {"kinds": [4], "#p": [pub_hex]}])
-            console.print(f"📤 Sending subscription: {req_msg}", style="cyan")
-            await websocket.send(req_msg)
+            stats.record_connect(relay_url, (time.perf_counter() - started) * 1000)
+            # Each chunk is paged on its own so one busy identity's cursor
+            # never skips another's older messages
+            for chunk in _pubkey_chunks(pubkeys):
+                for ev_data in await _fetch_history_pages(
+                    websocket, relay_url, chunk, since, until, page_size, timeout
+                ):
+                    recipient = _dm_recipient(ev_data, wanted)
+                    if recipient is not None:
+                        found.append((ev_data, recipient))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        stats.record_failure(relay_url)
+        logger.warning("❌ Backfill from %s failed: %s", relay_url, e)
+    return found
+
+
+async def fetch_dm_history(
+    your_nsec: Union[str, Keyring],
+    since: int,
+    until: Optional[int] = None,
+    relays: Optional[List[str]] = None,
+    page_size: int = 500,
+    timeout: float = 10.0,
+    stats: Optional[RelayManager] = None,
+) -> List[DMEvent]:
+    """
+    Fetch stored DMs addressed to ``your_nsec`` (an nsec or a keyring) sent
+    between ``since`` and ``until`` (inclusive) from all relays in parallel.
+
+    Results are de-duplicated across relays and returned oldest first.
+    """
+    pubkeys = Keyring.of(your_nsec).pubkeys
+    chosen = relays if relays else DEFAULT_RELAYS
+    until = int(time.time()) if until is None else until
+    stats = stats or get_relay_manager()
 
-            console.print(
-                f"🔍 Subscribed to DMs for pubkey: {pub_hex[:8]}...", style="blue"
-            )
-            console.print(
-                "⏳ Waiting for incoming messages — press Ctrl+C to exit", style="green"
+    try:
+        pages = await asyncio.gather(
+            *(
+                _fetch_history_from(
+                    url, pubkeys, since, until, page_size, stats, timeout
+                )
+                for url in chosen
             )
+        )
+    finally:
+        stats.save()
+
+    unique: Dict[str, Tuple[Dict[str, Any], str]] = {}
+    for found in pages:
+        for ev_data, recipient in found:
+            unique.setdefault(ev_data["id"], (ev_data, recipient))
+    ordered = sorted(unique.values(), key=lambda item: item[0]["created_at"])
+    logger.info(
+        "📚 Found %s stored messages from %s relays", len(ordered), len(chosen)
+    )
+    return [DMEvent.from_dict(ev_data, recipient) for ev_data, recipient in ordered]
 
-            message_count = 0
-            try:
-                while True:
-                    response = await websocket.recv()
-                    message_count += 1
-
-                    try:
-                        data = json.loads(response)
-                        if data[0] == "EVENT":
-                            ev_data = data[2]
-
-                            # Only process Kind 4 (DM) events
-                            if ev_data["kind"] != 4:
-                                continue
-
-                            # Check if this event is for us
-                            tags = ev_data.get("tags", [])
-                            our_tag = None
-                            for tag in tags:
-                                if tag[0] == "p" and tag[1] == pub_hex:
-                                    our_tag = tag
-                                    break
-
-                            if our_tag:
-                                # Check if message is recent (sent after we started listening)
-                                message_age = start_time - ev_data["created_at"]
-                                if (
-                                    message_age < 0
-                                ):  # Message is newer than when we started
-                                    console.print(
-                                        "📨 NEW FILE MESSAGE RECEIVED:",
-                                        style="bright_green",
-                                    )
-                                    console.print(
-                                        f"   📝 Event ID: {ev_data['id'][:8]}...",
-                                        style="green",
-                                    )
-                                    console.print(
-                                        f"   📝 From: {ev_data['pubkey'][:8]}...",
-                                        style="green",
-                                    )
-                                    console.print(
-                                        f"   ⏰ Age: {abs(message_age)}s ago",
-                                        style="green",
-                                    )
-
-                                    # Create Event object for callback
-                                    from pynostr.event import Event
-
-                                    ev = Event(
-                                        id=ev_data["id"],
-                                        pubkey=ev_data["pubkey"],
-                                        created_at=ev_data["created_at"],
-                                        kind=ev_data["kind"],
-                                        tags=ev_data["tags"],
-                                        content=ev_data["content"],
-                                        sig=ev_data["sig"],
-                                    )
-                                    callback(ev)
-                                else:
-                                    # Old message, skip silently
-                                    continue
-                            else:
-                                # Not for us, skip silently
-                                continue
-                        else:
-                            # Non-EVENT messages, skip silently
-                            continue
-
-                    except json.JSONDecodeError:
-                        # Invalid JSON, skip silently
-                        continue
-
-            except KeyboardInterrupt:
-                console.print(
-                    f"\n👋 Stopping receiver... (processed {message_count} messages)",
-                    style="yellow",
-                )
-            except Exception as e:
-                console.print(f"❌ Error in receive loop: {e}", style="red")
 
+async def receive_loop_async(
+    your_nsec: Union[str, Keyring],
+    relays: List[str],
+    callback: Callable,
+    since: Optional[int] = None,
+):
+    try:
+        keyring = Keyring.of(your_nsec)
+        logger.debug("Receiver public keys: %s", keyring.pubkeys)
+
+        chosen = relays if relays else DEFAULT_RELAYS
+        logger.info("🌐 Using relays: %s", chosen)
+
+        # Only messages sent after ``since`` (default: now) are processed
+        start_time = int(time.time()) if since is None else since
+        logger.debug("Listening for messages after: %s", start_time)
     except Exception as e:
-        console.print(f"❌ Failed to connect to relay: {e}", style="red")
-        console.print(f"❌ Exception type: {type(e)}", style="red")
-        import traceback
+        logger.error("❌ Error initializing receiver: %s", e)
+        return
 
-        console.print(f"❌ Traceback: {traceback.format_exc()}", style="red")
+    logger.info("⏳ Waiting for incoming messages — press Ctrl+C to exit")
+
+    message_count = 0
+    try:
+        async for ev in iter_dm_events(keyring, chosen, since=since):
+            message_count += 1
+            logger.debug(
+                "Event %s from %s, %ss old",
+                ev.id,
+                ev.pubkey,
+                int(time.time()) - ev.created_at,
+            )
+            callback(ev)
+    except KeyboardInterrupt:
+        logger.warning("👋 Stopping receiver... (processed %s messages)", message_count)
+    except Exception as e:
+        logger.error("❌ Error in receive loop: %s", e)
 
 
-def receive_loop(your_nsec: str, relays: List[str], callback: Callable):
+def receive_loop(
+    your_nsec: Union[str, Keyring],
+    relays: List[str],
+    callback: Callable,
+    since: Optional[int] = None,
+):
     # Check if we're already in an event loop
     try:
         loop = asyncio.get_running_loop()
         # We're in an event loop, create a task
-        task = loop.create_task(receive_loop_async(your_nsec, relays, callback))
+        task = loop.create_task(
+            receive_loop_async(your_nsec, relays, callback, since)
+        )
         return task
     except RuntimeError:
         # No event loop running, create a new one
-        asyncio.run(receive_loop_async(your_nsec, relays, callback))
+        asyncio.run(receive_loop_async(your_nsec, relays, callback, since))
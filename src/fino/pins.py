@@ -0,0 +1,353 @@
+"""
+Lifecycle of the pins fino creates for sent ciphertexts.
+
+Every upload is recorded in ``~/.fino/pins.json`` with its size and an
+expiry time. Garbage collection unpins expired transfers, then the oldest
+remaining ones while fino's pins together exceed their size budget, and
+finally runs ``ipfs repo gc`` so the blocks are actually freed. Pins fino did
+not create are never touched and do not count against the budget, and
+recent transfers are never evicted for space, so receivers can still fetch
+what was just announced.
+
+Uploads added with ``--nocopy`` keep their ciphertext in a staging file that
+the IPFS filestore references instead of copying it into the blockstore.
+The staging file is recorded with the pin and deleted when the pin is
+removed; staged files no pin refers to are swept during collection.
+"""
+
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from .utils import get_config_dir, get_config_value, get_int_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PIN_TTL = 7 * 24 * 3600
+DEFAULT_PIN_BUDGET = 10 * 1024 * 1024 * 1024
+DEFAULT_GC_INTERVAL = 3600
+# Pins younger than this are only removed once they expire
+DEFAULT_GC_MIN_AGE = 24 * 3600
+# Unreferenced staging files younger than this may belong to an upload
+# still in progress
+_STAGING_GRACE = 3600
+
+
+def get_staging_dir() -> Path:
+    """Durable directory for ciphertexts added to IPFS with ``--nocopy``"""
+    configured = get_config_value("staging_dir")
+    staging_dir = Path(configured) if configured else get_config_dir() / "staging"
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    return staging_dir
+
+
+class PinIndex:
+    """Pins created by fino, keyed by CID"""
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        ttl: Optional[int] = None,
+        budget: Optional[int] = None,
+    ):
+        self.path = path or get_config_dir() / "pins.json"
+        self.ttl = (
+            ttl if ttl is not None else get_int_config("pin_ttl", DEFAULT_PIN_TTL)
+        )
+        # Total size of fino's pins above which the oldest are unpinned;
+        # 0 disables
+        self.budget = (
+            budget
+            if budget is not None
+            else get_int_config("pin_budget_bytes", DEFAULT_PIN_BUDGET)
+        )
+        self.min_age = get_int_config("gc_min_age", DEFAULT_GC_MIN_AGE)
+        self._lock = threading.Lock()
+        self._data: Dict[str, Any] = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                data.setdefault("pins", {})
+                return data
+            except (json.JSONDecodeError, IOError):
+                pass
+        return {"pins": {}, "last_gc": 0}
+
+    def _save(self) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._data, f)
+        os.replace(tmp, self.path)
+
+    @property
+    def pins(self) -> Dict[str, Dict[str, Any]]:
+        return self._data["pins"]
+
+    @property
+    def last_gc(self) -> float:
+        return self._data.get("last_gc", 0)
+
+    def record(
+        self,
+        cid: str,
+        size: int,
+        name: Optional[str] = None,
+        ttl: Optional[int] = None,
+        path: Optional[str] = None,
+    ) -> None:
+        """
+        Track a pin created for an upload; ``path`` is the staging file the
+        filestore references for ``--nocopy`` adds.
+        """
+        now = time.time()
+        with self._lock:
+            # Re-read first so concurrent fino processes do not drop records
+            self._data = self._load()
+            entry: Dict[str, Any] = {
+                "size": size,
+                "name": name,
+                "pinned_at": now,
+                "expires_at": now + (self.ttl if ttl is None else ttl),
+            }
+            if path:
+                entry["path"] = os.path.realpath(path)
+            self.pins[cid] = entry
+            self._save()
+
+    def forget(self, cid: str) -> Optional[Dict[str, Any]]:
+        """Stop tracking a pin; returns its entry"""
+        with self._lock:
+            self._data = self._load()
+            entry = self.pins.pop(cid, None)
+            if entry is not None:
+                self._save()
+            return entry
+
+    def references(self, path: str) -> bool:
+        """Whether a tracked pin keeps ``path`` as its staging file"""
+        # Relative or symlinked staging directories name the same file
+        # differently; compare canonical paths
+        return os.path.realpath(path) in self.staged_paths()
+
+    def staged_paths(self) -> Set[str]:
+        """Canonical paths of the staging files tracked pins refer to"""
+        return {
+            os.path.realpath(entry["path"])
+            for entry in list(self.pins.values())
+            if entry.get("path")
+        }
+
+    def mark_gc(self) -> None:
+        with self._lock:
+            self._data = self._load()
+            self._data["last_gc"] = time.time()
+            self._save()
+
+    def total_bytes(self) -> int:
+        return sum(entry.get("size", 0) for entry in list(self.pins.values()))
+
+    def expired(self, now: Optional[float] = None) -> List[str]:
+        now = time.time() if now is None else now
+        return [
+            cid
+            for cid, entry in list(self.pins.items())
+            if entry.get("expires_at", 0) <= now
+        ]
+
+    def oldest_first(self) -> List[str]:
+        return sorted(self.pins, key=lambda cid: self.pins[cid].get("pinned_at", 0))
+
+
+_index: Optional[PinIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_pin_index() -> PinIndex:
+    """Get the process-wide pin index"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PinIndex()
+        return _index
+
+
+def unpin(cid: str) -> bool:
+    """Remove a pin; a CID that is no longer pinned counts as removed"""
+    try:
+        result = subprocess.run(
+            ["ipfs", "pin", "rm", cid],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+        logger.warning("⚠️  Could not unpin %s: %s", cid, e)
+        return False
+    if result.returncode == 0 or "not pinned" in result.stderr:
+        return True
+    logger.warning("⚠️  Could not unpin %s: %s", cid, result.stderr.strip())
+    return False
+
+
+def remove_staged(path: Optional[str]) -> bool:
+    """Delete a staging file once nothing pins its blocks"""
+    if not path:
+        return False
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.warning("⚠️  Could not remove staged file %s: %s", path, e)
+        return False
+
+
+def sweep_staging(index: PinIndex, grace: float = _STAGING_GRACE) -> int:
+    """Remove staging files no tracked pin refers to; returns the count"""
+    staging_dir = get_staging_dir()
+    referenced = index.staged_paths()
+    cutoff = time.time() - grace
+    removed = 0
+    for path in staging_dir.iterdir():
+        try:
+            stale = path.is_file() and path.stat().st_mtime < cutoff
+        except OSError:
+            continue
+        if (
+            stale
+            and os.path.realpath(path) not in referenced
+            and remove_staged(str(path))
+        ):
+            removed += 1
+    return removed
+
+
+def repo_gc() -> bool:
+    """Run ``ipfs repo gc`` to free the blocks of removed pins"""
+    try:
+        subprocess.run(
+            ["ipfs", "repo", "gc", "--quiet"],
+            capture_output=True,
+            check=True,
+            timeout=600,
+        )
+        return True
+    except Exception as e:
+        logger.warning("⚠️  ipfs repo gc failed: %s", e)
+        return False
+
+
+def collect_garbage(
+    index: Optional[PinIndex] = None,
+    run_repo_gc: bool = True,
+    dry_run: bool = False,
+    unpin_all: bool = False,
+) -> Dict[str, Any]:
+    """
+    Unpin expired transfers, then the oldest ones while fino's pins are over
+    budget, delete their staging files, and run repo GC if anything was
+    unpinned. Only sizes fino tracked count against the budget, and pins
+    younger than ``gc_min_age`` are left alone until they expire.
+
+    Returns a summary with the unpinned CIDs, the bytes they tracked and the
+    number of staging files removed.
+    """
+    index = index or get_pin_index()
+    now = time.time()
+    if unpin_all:
+        victims = index.oldest_first()
+    else:
+        victims = index.expired(now)
+
+        if index.budget:
+            excess = (
+                index.total_bytes()
+                - index.budget
+                - sum(index.pins[cid].get("size", 0) for cid in victims)
+            )
+            cutoff = now - index.min_age
+            for cid in index.oldest_first():
+                if excess <= 0 or index.pins[cid].get("pinned_at", 0) > cutoff:
+                    break
+                if cid not in victims:
+                    victims.append(cid)
+                    excess -= index.pins[cid].get("size", 0)
+
+    unpinned: List[str] = []
+    freed = 0
+    staged = 0
+    for cid in victims:
+        size = index.pins.get(cid, {}).get("size", 0)
+        if dry_run or unpin(cid):
+            unpinned.append(cid)
+            freed += size
+            if not dry_run:
+                entry = index.forget(cid) or {}
+                staged += remove_staged(entry.get("path"))
+    if not dry_run:
+        staged += sweep_staging(index)
+
+    collected = False
+    if unpinned and run_repo_gc and not dry_run:
+        collected = repo_gc()
+    if not dry_run:
+        index.mark_gc()
+
+    if unpinned:
+        logger.info("🧹 Unpinned %s transfers (%d bytes)", len(unpinned), freed)
+    return {
+        "unpinned": unpinned,
+        "freed": freed,
+        "repo_gc": collected,
+        "staged_removed": staged,
+        "remaining": len(index.pins),
+    }
+
+
+class _BackgroundGC(threading.Thread):
+    def __init__(self, interval: int):
+        super().__init__(name="fino-gc", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        index = get_pin_index()
+        while not self._stop_event.is_set():
+            wait = index.last_gc + self.interval - time.time()
+            if wait <= 0:
+                try:
+                    collect_garbage(index)
+                except Exception as e:
+                    logger.warning("⚠️  Background GC failed: %s", e)
+                wait = self.interval
+            self._stop_event.wait(min(wait, self.interval))
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+_gc_thread: Optional[_BackgroundGC] = None
+
+
+def start_background_gc() -> None:
+    """
+    Run garbage collection every ``gc_interval`` seconds in a daemon thread.
+
+    The last run time is persisted, so short-lived processes do not collect
+    more often than the interval. A ``gc_interval`` of 0 disables it.
+    """
+    global _gc_thread
+    interval = get_int_config("gc_interval", DEFAULT_GC_INTERVAL)
+    if interval <= 0 or (_gc_thread is not None and _gc_thread.is_alive()):
+        return
+    _gc_thread = _BackgroundGC(interval)
+    _gc_thread.start()
@@ -0,0 +1,331 @@
+"""
+Async library API for embedding FiNo transfers in an existing event loop.
+"""
+
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from .bundle import extract_bundle
+from .dictionaries import dictionary_for, payload_dictionary
+from .encryption import decrypt_file, encrypt_file, preferred_suite
+from .ipfs import (
+    download_bytes_from_ipfs,
+    get_node_peer_info,
+    upload_bytes_to_ipfs,
+)
+from .manifest import (
+    get_manifest_threshold,
+    iter_manifest_parts,
+    receive_manifest,
+    send_manifest,
+)
+from .nostr import (
+    RelayPool,
+    build_dm_event,
+    decrypt_payload,
+    encrypt_payload,
+    iter_dm_events,
+)
+from .keyring import Keyring
+from .ledger import FAILED, SEND, get_ledger
+from .relays import get_relay_manager
+from .utils import (
+    build_filename_from_payload,
+    build_payload,
+    get_inline_threshold,
+    inline_data_from_payload,
+    transfer_sizes,
+    verify_ciphertext,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _encrypt_and_upload(
+    path: Path, inline_threshold: int, to_npub: str, dict_name: Optional[str]
+) -> Dict[str, Any]:
+    if path.stat().st_size >= get_manifest_threshold():
+        return send_manifest(path)
+    plain_size = path.stat().st_size
+    suite = preferred_suite()
+    dictionary, dict_ref = dictionary_for(to_npub, plain_size, dict_name)
+    ciphertext, key, nonce = encrypt_file(str(path), suite, dictionary)
+    if len(ciphertext) <= inline_threshold:
+        return build_payload(
+            None,
+            key,
+            nonce,
+            path.name,
+            data=ciphertext,
+            plain_size=plain_size,
+            suite=suite,
+            dictionary=dict_ref,
+        )
+    cid = upload_bytes_to_ipfs(
+        ciphertext, suffix=f"_{path.name}", announce=True, background_announce=True
+    )
+    return build_payload(
+        cid,
+        key,
+        nonce,
+        path.name,
+        peer=get_node_peer_info(),
+        size=len(ciphertext),
+        plain_size=plain_size,
+        sha256=hashlib.sha256(ciphertext).hexdigest(),
+        suite=suite,
+        dictionary=dict_ref,
+    )
+
+
+def _build_signed_dm(payload: dict, to_npub: str, from_nsec: str):
+    enc = encrypt_payload(payload, to_npub, from_nsec)
+    return build_dm_event(from_nsec, to_npub, enc)
+
+
+async def send_file_async(
+    file: Union[str, Path],
+    to_npub: str,
+    from_nsec: str,
+    relays: Optional[List[str]] = None,
+    pool: Optional[RelayPool] = None,
+    executor: Optional[Executor] = None,
+    inline_threshold: Optional[int] = None,
+    dictionary: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Encrypt, upload and announce a file without blocking the running loop.
+
+    Relay connections are opened while the file is being encrypted and
+    uploaded, and all blocking work runs in ``executor`` (the loop's default
+    executor when omitted). Pass a shared ``pool`` to reuse relay connections
+    across many concurrent sends. Files whose ciphertext fits in
+    ``inline_threshold`` bytes (the configured threshold by default) are sent
+    inside the DM, and files above the manifest threshold are split into
+    parts. Small files are compressed with the zstd dictionary named by
+    ``dictionary``, or the recipient's dictionary if one is assigned. Every
+    send is recorded in the transfer ledger. Returns the CID referenced by
+    the DM, or None if inlined.
+    """
+    path = Path(file)
+    if not path.is_file():
+        raise FileNotFoundError(f"File not found: {path}")
+
+    if inline_threshold is None:
+        inline_threshold = get_inline_threshold()
+
+    loop = asyncio.get_running_loop()
+    own_pool = pool is None
+    relay_pool = RelayPool(relays) if pool is None else pool
+    auto_select = own_pool and not relays
+
+    async def open_relays() -> List[str]:
+        if auto_select:
+            relay_pool.relays = await get_relay_manager().select()
+        return await relay_pool.connect()
+
+    ledger = get_ledger()
+    row_id = ledger.begin(SEND, path.name, to_npub, path.stat().st_size)
+
+    # Pick and open relays while encryption and upload are in flight
+    connecting = asyncio.ensure_future(open_relays())
+    try:
+        payload = await loop.run_in_executor(
+            executor,
+            _encrypt_and_upload,
+            path,
+            inline_threshold,
+            to_npub,
+            dictionary,
+        )
+        cid = payload.get("cid")
+        ev = await loop.run_in_executor(
+            executor, _build_signed_dm, payload, to_npub, from_nsec
+        )
+
+        connected = await connecting
+        if not connected:
+            raise ConnectionError("Could not connect to any relay")
+
+        results = await relay_pool.publish(ev)
+        if not any(results.values()):
+            raise ConnectionError("No relay accepted the DM event")
+
+        size, plain_size = transfer_sizes(payload)
+        ledger.finish(
+            row_id, event_id=ev.id, cid=cid, size=size, plain_size=plain_size
+        )
+        logger.info("✅ Sent %s (%s)", path.name, cid or "inline")
+        return cid
+    except BaseException as e:
+        ledger.finish(row_id, FAILED, error=str(e) or type(e).__name__)
+        raise
+    finally:
+        if not connecting.done():
+            connecting.cancel()
+        if own_pool:
+            await relay_pool.close()
+
+
+def _download_and_decrypt(payload: Dict[str, Any]) -> bytes:
+    if "manifest" in payload:
+        return b"".join(iter_manifest_parts(payload))
+    data = inline_data_from_payload(payload)
+    if data is None:
+        data = download_bytes_from_ipfs(payload["cid"], payload.get("peer"))
+        verify_ciphertext(payload, data)
+    return decrypt_file(
+        data,
+        bytes.fromhex(payload["key"]),
+        bytes.fromhex(payload["nonce"]),
+        suite=payload.get("suite"),
+        dictionary=payload_dictionary(payload),
+    )
+
+
+class Transfer:
+    """
+    A file announced to us over Nostr whose body has not been fetched yet.
+
+    The body is only downloaded when the caller asks for it, and all blocking
+    download and decryption work runs in the executor.
+    """
+
+    def __init__(
+        self, event: Any, payload: Dict[str, Any], executor: Optional[Executor] = None
+    ):
+        self.event = event
+        self.payload = payload
+        self._executor = executor
+
+    @property
+    def filename(self) -> str:
+        return build_filename_from_payload(self.payload)
+
+    @property
+    def cid(self) -> Optional[str]:
+        return self.payload.get("cid")
+
+    @property
+    def sender(self) -> str:
+        return self.event.pubkey
+
+    @property
+    def recipient(self) -> Optional[str]:
+        """Hex pubkey of the receiving identity"""
+        return self.event.recipient
+
+    @property
+    def size(self) -> Optional[int]:
+        """Ciphertext bytes to download (0 when inline), if announced"""
+        return transfer_sizes(self.payload)[0]
+
+    @property
+    def plain_size(self) -> Optional[int]:
+        """Bytes the file takes on disk, if announced"""
+        return transfer_sizes(self.payload)[1]
+
+    @property
+    def is_bundle(self) -> bool:
+        return "bundle" in self.payload
+
+    async def read(self) -> bytes:
+        """Download and decrypt the whole file"""
+        if self.is_bundle:
+            raise ValueError("Bundles have no single body; use save() instead")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, _download_and_decrypt, self.payload
+        )
+
+    async def iter_chunks(self, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+        """
+        Yield the decrypted file in chunks.
+
+        Nothing is yielded before the authentication tag has been verified.
+        Manifest transfers are yielded part by part as parts arrive.
+        """
+        if "manifest" in self.payload:
+            loop = asyncio.get_running_loop()
+            parts = iter_manifest_parts(self.payload)
+            try:
+                while True:
+                    part = await loop.run_in_executor(self._executor, next, parts, None)
+                    if part is None:
+                        break
+                    view = memoryview(part)
+                    for offset in range(0, len(view), chunk_size):
+                        yield bytes(view[offset : offset + chunk_size])
+            finally:
+                parts.close()
+            return
+
+        plaintext = await self.read()
+        view = memoryview(plaintext)
+        for offset in range(0, len(view), chunk_size):
+            yield bytes(view[offset : offset + chunk_size])
+
+    async def save(self, output_dir: Union[str, Path] = ".") -> Path:
+        """
+        Download, decrypt and write the file into ``output_dir``.
+
+        Bundles are extracted into a subdirectory named after the bundle.
+        """
+        filepath = Path(output_dir) / Path(self.filename).name
+        loop = asyncio.get_running_loop()
+        if self.is_bundle:
+            await loop.run_in_executor(
+                self._executor, extract_bundle, self.payload, str(filepath)
+            )
+            return filepath
+        if "manifest" in self.payload:
+            await loop.run_in_executor(
+                self._executor, receive_manifest, self.payload, str(filepath)
+            )
+            return filepath
+        plaintext = await self.read()
+        await loop.run_in_executor(self._executor, filepath.write_bytes, plaintext)
+        return filepath
+
+
+async def receive_stream(
+    your_nsec: Union[str, Keyring],
+    relays: Optional[List[str]] = None,
+    since: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    max_pending: int = 16,
+) -> AsyncIterator[Transfer]:
+    """
+    Yield incoming transfers for ``your_nsec`` as they arrive.
+
+    With a :class:`Keyring`, all identities share one subscription per relay
+    and each transfer's ``recipient`` names the identity it was sent to.
+    At most ``max_pending`` undelivered events are buffered; beyond that,
+    relay reads pause until the consumer catches up. Cancelling the consumer
+    or closing the iterator closes all relay connections. Messages that cannot
+    be decrypted are skipped.
+    """
+    loop = asyncio.get_running_loop()
+    keyring = Keyring.of(your_nsec)
+    if not relays:
+        relays = await get_relay_manager().select()
+    events = iter_dm_events(keyring, relays, since=since, max_queue=max_pending)
+    try:
+        async for ev in events:
+            identity = keyring.get(ev.recipient)
+            if identity is None:
+                continue
+            try:
+                payload = await loop.run_in_executor(
+                    executor, decrypt_payload, ev, identity.nsec
+                )
+            except Exception as e:
+                logger.error("❌ Failed to decrypt metadata: %s", e)
+                continue
+            yield Transfer(ev, payload, executor)
+    finally:
+        await events.aclose()
@@ -0,0 +1,194 @@
+"""
+Profiling for ``fino --profile``.
+
+The command runs under pyinstrument when it is installed (a low-overhead
+sampling profiler whose wall-clock view also shows time spent waiting on
+subprocesses and sockets) and under cProfile otherwise. cProfile results are
+written as a ``.pstats`` file, pyinstrument results as a collapsed-stack file
+for flamegraph tools. Independently of the profiler, the send and receive
+pipelines time their stages (compression, encryption, IPFS add, provide,
+relay publish, ...) with :func:`stage`, which costs nothing unless profiling
+is enabled.
+"""
+
+import cProfile
+import pstats
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .utils import get_config_value
+
+TOP_FUNCTIONS = 15
+
+_enabled = False
+_stages: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0])
+_stages_lock = threading.Lock()
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Add ``seconds`` to the ``name`` pipeline stage"""
+    if not _enabled:
+        return
+    with _stages_lock:
+        totals = _stages[name]
+        totals[0] += seconds
+        totals[1] += 1
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Add the wall time of the block to the ``name`` pipeline stage.
+
+    Also usable as a decorator on plain (not async) functions.
+    """
+    if not _enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def stage_timings() -> Dict[str, Tuple[float, int]]:
+    """Total seconds and call count per stage, slowest first"""
+    with _stages_lock:
+        items = [(name, (t[0], int(t[1]))) for name, t in _stages.items()]
+    return dict(sorted(items, key=lambda item: -item[1][0]))
+
+
+def _pyinstrument_available() -> bool:
+    try:
+        import pyinstrument  # type: ignore[import-not-found]  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class CommandProfiler:
+    """Profiles one CLI command from :meth:`start` to :meth:`stop`"""
+
+    def __init__(self, output_prefix: str, backend: Optional[str] = None):
+        self.output_prefix = output_prefix
+        if backend is None:
+            backend = get_config_value("profiler", "auto")
+        if backend not in ("cprofile", "pyinstrument"):
+            backend = "pyinstrument" if _pyinstrument_available() else "cprofile"
+        self.backend = backend
+        self.output_path: Optional[str] = None
+        self.wall_time = 0.0
+        self._started = 0.0
+        self._profiler: Any = None
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        global _enabled
+        _enabled = True
+        with _stages_lock:
+            _stages.clear()
+        self._started = time.perf_counter()
+        if self.backend == "pyinstrument":
+            from pyinstrument import Profiler  # type: ignore[import-not-found]
+
+            self._profiler = Profiler(interval=0.001)
+            self._profiler.start()
+            return
+
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+        # Before 3.12 cProfile only sees the thread that enabled it, so
+        # worker threads started from now on get a profiler of their own
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_thread)
+
+    def _profile_thread(self, frame: Any, event: str, arg: Any) -> None:
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self._lock:
+            self._thread_profiles.append(profile)
+        profile.enable()
+
+    def stop(self) -> List[Tuple[str, float, float]]:
+        """
+        Stop profiling and write the output file.
+
+        Returns the hottest functions as (name, self seconds, cumulative
+        seconds).
+        """
+        global _enabled
+        self.wall_time = time.perf_counter() - self._started
+        _enabled = False
+        if self.backend == "pyinstrument":
+            self._profiler.stop()
+            return self._write_collapsed()
+
+        self._profiler.disable()
+        threading.setprofile(None)  # type: ignore[arg-type]
+        stats = pstats.Stats(self._profiler)
+        with self._lock:
+            for profile in self._thread_profiles:
+                try:
+                    stats.add(profile)
+                except (TypeError, ValueError):
+                    pass
+        self.output_path = f"{self.output_prefix}.pstats"
+        stats.dump_stats(self.output_path)
+
+        hot = []
+        rows = stats.stats.items()  # type: ignore[attr-defined]
+        for (filename, line, func), (_, _, self_time, cumulative, _) in rows:
+            name = func if filename == "~" else f"{func} ({_short(filename)}:{line})"
+            hot.append((name, self_time, cumulative))
+        hot.sort(key=lambda entry: -entry[1])
+        return hot[:TOP_FUNCTIONS]
+
+    def _write_collapsed(self) -> List[Tuple[str, float, float]]:
+        session = self._profiler.last_session
+        root = session.root_frame() if session is not None else None
+        self_times: Dict[str, float] = defaultdict(float)
+        cumulative: Dict[str, float] = defaultdict(float)
+        lines: List[str] = []
+
+        def frame_time(frame: Any) -> float:
+            value = frame.time
+            return value() if callable(value) else value
+
+        def walk(frame: Any, path: List[str]) -> None:
+            location = f"{_short(frame.file_path_short or '')}:{frame.line_no}"
+            name = f"{frame.function} ({location})"
+            total = frame_time(frame)
+            own = total - sum(frame_time(child) for child in frame.children)
+            stack = path + [name]
+            if own > 0:
+                self_times[name] += own
+                lines.append(f"{';'.join(stack)} {int(own * 1e6)}")
+            if name not in path:
+                cumulative[name] += total
+            for child in frame.children:
+                walk(child, stack)
+
+        if root is not None:
+            walk(root, [])
+        self.output_path = f"{self.output_prefix}.collapsed"
+        with open(self.output_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        hot = [(name, own, cumulative[name]) for name, own in self_times.items()]
+        hot.sort(key=lambda entry: -entry[1])
+        return hot[:TOP_FUNCTIONS]
+
+
+def _short(filename: str) -> str:
+    # Keep the path from the package or stdlib directory onwards
+    for marker in ("site-packages/", "fino/", "lib/python"):
+        index = filename.rfind(marker)
+        if index != -1:
+            return filename[index:]
+    return filename
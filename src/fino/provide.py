@@ -0,0 +1,538 @@
+"""
+Background DHT announcements for uploaded CIDs.
+
+Uploads enqueue their CID instead of spawning an ``ipfs routing provide``
+process each. A few worker threads take due CIDs in batches, announce them
+through the daemon's HTTP API (or one CLI call per batch), and retry
+failures with exponential backoff. The queue is persisted in
+``~/.fino/provide.json`` and shared by every fino process: a worker leases
+the CIDs of a batch (``owner_pid``/``claimed_at``) before announcing them,
+so concurrent processes never announce the same CIDs. CIDs still due when a
+process exits are handed to a detached drainer process. Only one drainer
+runs at a time (it holds ``~/.fino/provide-drainer.pid``), so a burst of
+short commands leaves at most one process behind, and anything left after
+that is picked up by the next fino run or by ``fino provide``.
+"""
+
+import atexit
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from .profiling import stage
+from .utils import get_config_dir, get_int_config, process_alive
+
+# Advisory file locks keep concurrent processes from leasing the same CIDs
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDE_WORKERS = 2
+DEFAULT_PROVIDE_BATCH = 32
+DEFAULT_PROVIDE_RETRIES = 5
+# Seconds an exiting process waits for announcements before handing the
+# rest to a drainer; short commands like send should not stall at exit
+DEFAULT_PROVIDE_EXIT_WAIT = 0
+DEFAULT_DRAIN_TIMEOUT = 600
+# A lease older than this is taken over even if its owner still runs
+_LEASE_TIMEOUT = 900.0
+# How often CIDs leased by another process are checked on
+_LEASE_POLL = 5.0
+# Set in the drainer so it does not spawn another one at exit
+_DRAINER_ENV = "FINO_PROVIDE_DRAINER"
+# Held (flock'd, with the owner's PID) by the running drainer
+_DRAINER_PIDFILE = "provide-drainer.pid"
+_BACKOFF_BASE = 30.0
+_BACKOFF_MAX = 3600.0
+# Announced CIDs kept for status reporting
+_DONE_HISTORY = 1000
+# Enqueues are written to disk at most this often; workers save after
+# every batch and the queue is saved at exit
+_SAVE_INTERVAL = 1.0
+
+PENDING = "pending"
+PROVIDED = "provided"
+FAILED = "failed"
+
+
+class ProvideQueue:
+    """Persistent, rate-bounded queue of CIDs to announce to the DHT"""
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        retries: Optional[int] = None,
+    ):
+        self.path = path or get_config_dir() / "provide.json"
+        self.workers = max(
+            1,
+            workers
+            if workers is not None
+            else get_int_config("provide_workers", DEFAULT_PROVIDE_WORKERS),
+        )
+        self.batch_size = max(
+            1,
+            batch_size
+            if batch_size is not None
+            else get_int_config("provide_batch", DEFAULT_PROVIDE_BATCH),
+        )
+        self.retries = (
+            retries
+            if retries is not None
+            else get_int_config("provide_retries", DEFAULT_PROVIDE_RETRIES)
+        )
+        self._cond = threading.Condition()
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._in_flight: Set[str] = set()
+        self._threads: List[threading.Thread] = []
+        self._saved_at = 0.0
+        self._dirty = False
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    return json.load(f).get("cids", {})
+            except (json.JSONDecodeError, IOError, AttributeError):
+                pass
+        return {}
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(self.path.with_suffix(".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _merge_locked(self) -> None:
+        # Merge with the file so concurrent fino processes keep each other's
+        # entries; the most recently updated copy of an entry wins
+        merged = self._load()
+        for cid, entry in self._entries.items():
+            current = merged.get(cid)
+            if current is None or current.get("updated_at", 0) <= entry.get(
+                "updated_at", 0
+            ):
+                merged[cid] = entry
+        done = sorted(
+            (cid for cid, entry in merged.items() if entry["status"] == PROVIDED),
+            key=lambda cid: merged[cid].get("updated_at", 0),
+        )
+        for cid in done[:-_DONE_HISTORY]:
+            del merged[cid]
+        self._entries = merged
+
+    def _write_locked(self) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"cids": self._entries}, f)
+        os.replace(tmp, self.path)
+        self._saved_at = time.time()
+        self._dirty = False
+
+    def _save_locked(self) -> None:
+        with self._file_lock():
+            self._merge_locked()
+            self._write_locked()
+
+    @staticmethod
+    def _leased_elsewhere(entry: Dict[str, Any], now: float) -> bool:
+        """Whether another live process is announcing this entry"""
+        owner = entry.get("owner_pid")
+        return (
+            bool(owner)
+            and owner != os.getpid()
+            and now - entry.get("claimed_at", 0) < _LEASE_TIMEOUT
+            and process_alive(owner)
+        )
+
+    def save(self) -> None:
+        with self._cond:
+            if self._dirty:
+                self._save_locked()
+
+    def refresh(self) -> None:
+        """Pick up entries and leases written by other processes"""
+        with self._cond, self._file_lock():
+            self._merge_locked()
+            self._cond.notify_all()
+
+    def enqueue(self, cid: str) -> None:
+        """Schedule ``cid`` for announcement and make sure workers run"""
+        now = time.time()
+        with self._cond:
+            entry = self._entries.get(cid)
+            if entry is not None and entry["status"] == PENDING:
+                return
+            self._entries[cid] = {
+                "status": PENDING,
+                "attempts": 0,
+                "added_at": now,
+                "next_at": now,
+                "updated_at": now,
+            }
+            self._dirty = True
+            if now - self._saved_at >= _SAVE_INTERVAL:
+                self._save_locked()
+            self._cond.notify()
+        self.start()
+
+    def retry_failed(self) -> int:
+        """Put every failed CID back in the queue; returns how many"""
+        now = time.time()
+        count = 0
+        with self._cond:
+            for entry in self._entries.values():
+                if entry["status"] == FAILED:
+                    entry.update(
+                        status=PENDING, attempts=0, next_at=now, updated_at=now
+                    )
+                    count += 1
+            if count:
+                self._save_locked()
+                self._cond.notify_all()
+        return count
+
+    def status(self, cid: str) -> Optional[str]:
+        with self._cond:
+            entry = self._entries.get(cid)
+            return entry["status"] if entry else None
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        with self._cond:
+            return {cid: dict(entry) for cid, entry in self._entries.items()}
+
+    def counts(self) -> Dict[str, int]:
+        counts = {PENDING: 0, PROVIDED: 0, FAILED: 0}
+        with self._cond:
+            for entry in self._entries.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return counts
+
+    def pending(self) -> int:
+        return self.counts()[PENDING]
+
+    def start(self) -> None:
+        """Start the worker threads once per process"""
+        with self._cond:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(
+                    target=self._run, name=f"fino-provide-{i}", daemon=True
+                )
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        atexit.register(self._at_exit)
+
+    def _take_batch(self) -> List[str]:
+        """Lease due CIDs for one batch; waits until some are due"""
+        with self._cond:
+            while True:
+                now = time.time()
+                with self._file_lock():
+                    # Other processes' leases are only visible on disk
+                    self._merge_locked()
+                    due = [
+                        cid
+                        for cid, entry in self._entries.items()
+                        if entry["status"] == PENDING
+                        and entry["next_at"] <= now
+                        and cid not in self._in_flight
+                        and not self._leased_elsewhere(entry, now)
+                    ]
+                    if due:
+                        due.sort(key=lambda cid: self._entries[cid]["next_at"])
+                        batch = due[: self.batch_size]
+                        for cid in batch:
+                            self._entries[cid].update(
+                                owner_pid=os.getpid(), claimed_at=now, updated_at=now
+                            )
+                        self._write_locked()
+                        self._in_flight.update(batch)
+                        return batch
+                waiting = []
+                for cid, entry in self._entries.items():
+                    if entry["status"] != PENDING or cid in self._in_flight:
+                        continue
+                    if self._leased_elsewhere(entry, now):
+                        waiting.append(now + _LEASE_POLL)
+                    else:
+                        waiting.append(entry["next_at"])
+                timeout = min(waiting) - now if waiting else None
+                self._cond.wait(timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            error = None
+            try:
+                provide_cids(batch)
+            except Exception as e:
+                error = str(e)
+            self._finish(batch, error)
+
+    def _finish(self, batch: List[str], error: Optional[str]) -> None:
+        now = time.time()
+        with self._cond:
+            for cid in batch:
+                self._in_flight.discard(cid)
+                entry = self._entries.get(cid)
+                if entry is None:
+                    continue
+                entry["updated_at"] = now
+                entry.pop("owner_pid", None)
+                entry.pop("claimed_at", None)
+                if error is None:
+                    entry.update(status=PROVIDED, provided_at=now)
+                    entry.pop("error", None)
+                    continue
+                entry["attempts"] += 1
+                entry["error"] = error
+                if entry["attempts"] >= self.retries:
+                    entry["status"] = FAILED
+                else:
+                    delay = _BACKOFF_BASE * 2 ** (entry["attempts"] - 1)
+                    entry["next_at"] = now + min(delay, _BACKOFF_MAX)
+            self._dirty = True
+            self._save_locked()
+            self._cond.notify_all()
+
+        if error is None:
+            logger.info("📡 Announced %d CIDs to the network", len(batch))
+        else:
+            logger.warning("⚠️  Announcing %d CIDs failed: %s", len(batch), error)
+
+    def wait(self, timeout: Optional[float] = None, leased: bool = True) -> bool:
+        """
+        Block until nothing is due or in flight; returns False on timeout.
+
+        CIDs waiting out a retry backoff do not count as due; CIDs another
+        process is announcing do, until it finishes or its lease lapses,
+        unless ``leased`` is False.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                busy = self._in_flight or any(
+                    entry["status"] == PENDING
+                    and entry["next_at"] <= now
+                    and (leased or not self._leased_elsewhere(entry, now))
+                    for entry in self._entries.values()
+                )
+                if not busy:
+                    return True
+                if deadline is not None and now >= deadline:
+                    return False
+                self._cond.wait(
+                    1.0 if deadline is None else min(1.0, deadline - now)
+                )
+
+    def due(self) -> int:
+        """CIDs due now that no other live process is announcing"""
+        now = time.time()
+        with self._cond:
+            return sum(
+                1
+                for entry in self._entries.values()
+                if entry["status"] == PENDING
+                and entry["next_at"] <= now
+                and not self._leased_elsewhere(entry, now)
+            )
+
+    def _at_exit(self) -> None:
+        exit_wait = get_int_config("provide_exit_wait", DEFAULT_PROVIDE_EXIT_WAIT)
+        if exit_wait > 0:
+            self.wait(exit_wait)
+        self.save()
+        if os.environ.get(_DRAINER_ENV):
+            return
+        # CIDs leased by another live process are left to it, and a running
+        # drainer picks up whatever was saved above
+        self.refresh()
+        due = self.due()
+        if due and _spawn_drainer():
+            logger.info("📡 Announcing %d CIDs in the background", due)
+            return
+        left = self.pending()
+        if left:
+            logger.info(
+                "📡 %d CIDs still to announce; the next fino run or "
+                "'fino provide' will finish them",
+                left,
+            )
+
+
+def provide_cids(cids: List[str], timeout: float = 300.0) -> None:
+    """Announce CIDs to the DHT in one request, raising on failure"""
+    from .ipfs import get_node
+
+    with stage("provide"):
+        api_url = get_node().api_url()
+        if api_url is not None:
+            response = get_node().session.post(
+                f"{api_url}/api/v0/routing/provide",
+                params=[("arg", cid) for cid in cids],
+                timeout=(10, timeout),
+            )
+            if not response.ok:
+                raise Exception(
+                    f"routing/provide failed ({response.status_code}): "
+                    f"{response.text.strip()}"
+                )
+            return
+
+        result = subprocess.run(
+            ["ipfs", "routing", "provide", *cids],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+        if result.returncode != 0:
+            raise Exception(result.stderr.strip() or "ipfs routing provide failed")
+
+
+_queue: Optional[ProvideQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_provide_queue() -> ProvideQueue:
+    """Get the process-wide provide queue"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ProvideQueue()
+        return _queue
+
+
+def _lock_pidfile(f: Any) -> bool:
+    """Try to take the drainer pidfile without blocking"""
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+    # Without flock, fall back to the PID recorded in the file
+    f.seek(0)
+    owner = f.read().strip()
+    return not (
+        owner.isdigit() and int(owner) != os.getpid() and process_alive(int(owner))
+    )
+
+
+def _record_pid(f: Any, pid: int) -> None:
+    f.seek(0)
+    f.truncate()
+    f.write(str(pid))
+    f.flush()
+
+
+def _spawn_drainer() -> bool:
+    """
+    Make sure the detached drainer runs; returns whether one does.
+
+    The pidfile is locked here and the locked descriptor is inherited by
+    the drainer, so commands exiting together cannot start two of them.
+    """
+    with open(get_config_dir() / _DRAINER_PIDFILE, "a+") as f:
+        if not _lock_pidfile(f):
+            return True
+        try:
+            proc = subprocess.Popen(
+                [sys.executable, "-c", "from fino.provide import drain; drain()"],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env={**os.environ, _DRAINER_ENV: str(f.fileno())},
+                pass_fds=(f.fileno(),) if fcntl is not None else (),
+                start_new_session=True,
+            )
+        except OSError as e:
+            logger.debug("Could not start provide drainer: %s", e)
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            return False
+        # Closing this copy leaves the lock with the drainer
+        _record_pid(f, proc.pid)
+        return True
+
+
+@contextmanager
+def _drainer_lock(inherited: Optional[int] = None) -> Iterator[bool]:
+    """Hold the drainer pidfile; yields False if another drainer has it"""
+    if inherited is not None:
+        f = os.fdopen(inherited, "a+")
+    else:
+        f = open(get_config_dir() / _DRAINER_PIDFILE, "a+")
+    with f:
+        if inherited is None and not _lock_pidfile(f):
+            yield False
+            return
+        _record_pid(f, os.getpid())
+        try:
+            yield True
+        finally:
+            f.seek(0)
+            f.truncate()
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def drain(timeout: float = DEFAULT_DRAIN_TIMEOUT) -> bool:
+    """
+    Announce every due CID, waiting up to ``timeout`` seconds.
+
+    Runs as the single background drainer: returns at once if another one
+    holds the pidfile, and stops waiting once the only CIDs left are being
+    announced by other live processes.
+    """
+    deadline = time.time() + timeout
+    queue = get_provide_queue()
+    # A drainer started by _spawn_drainer inherits the locked pidfile
+    fd = os.environ.get(_DRAINER_ENV, "")
+    inherited: Optional[int] = int(fd) if fd.isdigit() and fcntl is not None else None
+    while True:
+        with _drainer_lock(inherited) as held:
+            if not held:
+                return True
+            queue.start()
+            done = queue.wait(max(0.0, deadline - time.time()), leased=False)
+        inherited = None
+        if not done or time.time() >= deadline:
+            return done
+        # Commands that exited while the pidfile was held left their CIDs
+        # to this drainer; look again now that it has been released
+        queue.refresh()
+        if not queue.due():
+            return True
+
+
+def resume_pending_provides() -> int:
+    """Start announcing CIDs left over from earlier runs; returns how many"""
+    queue = get_provide_queue()
+    pending = queue.pending()
+    if pending:
+        logger.info("📡 Resuming announcement of %d CIDs", pending)
+        queue.start()
+    return pending
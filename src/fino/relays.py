@@ -0,0 +1,193 @@
+"""
+Relay health scoring and automatic relay selection.
+
+Connect time, OK latency and failures are recorded for every relay fino
+talks to, smoothed, and persisted in ``~/.fino/relays.json``. The best K
+relays by score are used for publishing and subscribing, and stale stats are
+refreshed with a lightweight probe before selection. The pinned relays
+(``DEFAULT_RELAYS`` unless configured) are always part of the selection.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+from .utils import get_config_dir, get_int_config, load_config
+
+logger = logging.getLogger(__name__)
+
+# Rendezvous relays always used by both sides, so a sender and receiver that
+# rank the other candidates differently still share at least one relay
+DEFAULT_RELAYS = ["wss://nos.lol"]
+
+# Well-known public relays considered when none are configured
+CANDIDATE_RELAYS = [
+    "wss://nos.lol",
+    "wss://relay.damus.io",
+    "wss://relay.primal.net",
+    "wss://nostr.mom",
+]
+DEFAULT_RELAY_COUNT = 2
+DEFAULT_PROBE_INTERVAL = 3600
+
+# Weight of the newest sample in the smoothed latencies
+_EWMA_ALPHA = 0.3
+# Latency assumed for relays we have no samples for yet
+_UNKNOWN_LATENCY_MS = 500.0
+
+
+class RelayManager:
+    """Tracks relay performance and picks the best relays to use"""
+
+    def __init__(
+        self, candidates: Optional[List[str]] = None, path: Optional[Path] = None
+    ):
+        config = load_config()
+        self.candidates = list(candidates or config.get("relays") or CANDIDATE_RELAYS)
+        self.pinned = list(config.get("pinned_relays", DEFAULT_RELAYS))
+        self.path = path or get_config_dir() / "relays.json"
+        self.count = get_int_config("relay_count", DEFAULT_RELAY_COUNT)
+        self.probe_interval = get_int_config(
+            "relay_probe_interval", DEFAULT_PROBE_INTERVAL
+        )
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, IOError):
+                return {}
+        return {}
+
+    def save(self) -> None:
+        with self._lock:
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(self._stats, f, indent=2)
+            os.replace(tmp, self.path)
+
+    def _entry(self, relay_url: str) -> Dict[str, Any]:
+        return self._stats.setdefault(
+            relay_url,
+            {"connect_ms": None, "ok_ms": None, "successes": 0, "failures": 0},
+        )
+
+    def _smooth(self, entry: Dict[str, Any], field: str, value_ms: float) -> None:
+        old = entry.get(field)
+        entry[field] = (
+            value_ms if old is None else (1 - _EWMA_ALPHA) * old + _EWMA_ALPHA * value_ms
+        )
+
+    def record_connect(self, relay_url: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self._smooth(self._entry(relay_url), "connect_ms", elapsed_ms)
+
+    def record_ok(self, relay_url: str, elapsed_ms: float) -> None:
+        with self._lock:
+            entry = self._entry(relay_url)
+            self._smooth(entry, "ok_ms", elapsed_ms)
+            entry["successes"] += 1
+
+    def record_failure(self, relay_url: str) -> None:
+        with self._lock:
+            self._entry(relay_url)["failures"] += 1
+
+    def failure_rate(self, relay_url: str) -> float:
+        entry = self._stats.get(relay_url, {})
+        successes = entry.get("successes", 0)
+        failures = entry.get("failures", 0)
+        # Smoothed so a single early failure does not blacklist a relay
+        return (failures + 1) / (successes + failures + 2)
+
+    def score(self, relay_url: str) -> float:
+        """Expected cost of using a relay; lower is better"""
+        entry = self._stats.get(relay_url, {})
+        connect_ms = entry.get("connect_ms")
+        ok_ms = entry.get("ok_ms")
+        latency = (connect_ms if connect_ms is not None else _UNKNOWN_LATENCY_MS) + (
+            ok_ms if ok_ms is not None else _UNKNOWN_LATENCY_MS
+        )
+        return latency * (1 + 4 * self.failure_rate(relay_url))
+
+    def needs_probe(self) -> bool:
+        now = time.time()
+        return any(
+            now - self._stats.get(url, {}).get("last_probe", 0) > self.probe_interval
+            for url in self.candidates
+        )
+
+    async def probe(self, relay_url: str, timeout: float = 5.0) -> bool:
+        """Measure connect time and round trip of an empty subscription"""
+        started = time.perf_counter()
+        try:
+            async with websockets.connect(
+                relay_url, proxy=None, open_timeout=timeout
+            ) as websocket:
+                self.record_connect(relay_url, (time.perf_counter() - started) * 1000)
+
+                sub_id = uuid.uuid4().hex[:8]
+                sent = time.perf_counter()
+                await websocket.send(json.dumps(["REQ", sub_id, {"limit": 0}]))
+                while True:
+                    response = await asyncio.wait_for(websocket.recv(), timeout=timeout)
+                    data = json.loads(response)
+                    if data[0] in ("EOSE", "CLOSED") and data[1] == sub_id:
+                        break
+                self.record_ok(relay_url, (time.perf_counter() - sent) * 1000)
+                await websocket.send(json.dumps(["CLOSE", sub_id]))
+                return True
+        except Exception:
+            self.record_failure(relay_url)
+            return False
+        finally:
+            with self._lock:
+                self._entry(relay_url)["last_probe"] = time.time()
+
+    async def probe_all(self) -> None:
+        logger.info("📡 Probing %s relays...", len(self.candidates))
+        await asyncio.gather(*(self.probe(url) for url in self.candidates))
+        self.save()
+
+    def ranked(self) -> List[str]:
+        return sorted(self.candidates, key=self.score)
+
+    async def select(self, k: Optional[int] = None) -> List[str]:
+        """
+        Pick the pinned relays plus the best ``k`` others, re-probing first
+        if stats are stale
+        """
+        if self.needs_probe():
+            await self.probe_all()
+        others = [url for url in self.ranked() if url not in self.pinned]
+        chosen = self.pinned + others[: k or self.count]
+        logger.info("🌐 Selected relays: %s", chosen)
+        return chosen
+
+
+_manager: Optional[RelayManager] = None
+
+
+def get_relay_manager() -> RelayManager:
+    """Get the process-wide relay manager"""
+    global _manager
+    if _manager is None:
+        _manager = RelayManager()
+    return _manager
+
+
+def select_relays(relays: Optional[List[str]] = None, k: Optional[int] = None) -> List[str]:
+    """Return explicit relays as-is, otherwise pick the best configured ones"""
+    if relays:
+        return list(relays)
+    return asyncio.run(get_relay_manager().select(k))
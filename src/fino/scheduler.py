@@ -0,0 +1,149 @@
+"""
+Size-aware scheduling of received transfers.
+
+Announced transfers are queued and run on a fixed pool of workers, shortest
+job first: a transfer's priority is its download size plus the time it has
+waited multiplied by an aging rate, so small files overtake large ones but a
+large file cannot be starved by a steady stream of small ones. Disk space
+promised to queued transfers is tracked so admission checks account for
+everything still in flight.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .profiling import record_stage
+from .utils import ensure_free_space, get_size_config
+
+# Transfers of unknown size are ranked as if they were this large
+UNKNOWN_SIZE = 64 * 1024 * 1024
+# Bytes of priority a queued transfer gains per second of waiting
+DEFAULT_AGING_RATE = 1024 * 1024
+
+
+class TransferScheduler:
+    """Worker pool running queued transfers shortest job first, with aging"""
+
+    def __init__(self, workers: int, aging_rate: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.aging_rate = (
+            aging_rate
+            if aging_rate is not None
+            else get_size_config("schedule_aging_rate", DEFAULT_AGING_RATE)
+        )
+        self._queue: List[Tuple[float, int, float, Future, Callable[[], Any]]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._active = 0
+        self._closed = False
+        self._threads = [
+            threading.Thread(
+                target=self._run, name=f"fino-transfer-{i}", daemon=True
+            )
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(
+        self, size: Optional[int], fn: Callable[..., Any], *args: Any
+    ) -> "Future[Any]":
+        """Queue ``fn(*args)`` for a transfer of ``size`` download bytes"""
+        future: "Future[Any]" = Future()
+        # Waiting lowers the effective size by aging_rate per second; since
+        # every entry ages at the same rate, ranking by size plus enqueue time
+        # is equivalent and never needs re-sorting
+        size = UNKNOWN_SIZE if size is None else size
+        queued_at = time.monotonic()
+        rank = size + self.aging_rate * queued_at
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is shut down")
+            heapq.heappush(
+                self._queue,
+                (rank, next(self._seq), queued_at, future, lambda: fn(*args)),
+            )
+            self._cond.notify()
+        return future
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                _, _, queued_at, future, job = heapq.heappop(self._queue)
+                self._active += 1
+            record_stage("queue wait", time.monotonic() - queued_at)
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(job())
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def join(self) -> None:
+        """Wait until every queued transfer has finished"""
+        with self._cond:
+            while self._queue or self._active:
+                self._cond.wait()
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        with self._cond:
+            self._closed = True
+            if cancel_pending:
+                for _, _, _, future, _ in self._queue:
+                    future.cancel()
+                self._queue.clear()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+class DiskReservations:
+    """Disk space promised to admitted transfers, per filesystem"""
+
+    def __init__(self) -> None:
+        self._reserved: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def admit(self, directory: str, size: Optional[int]) -> Callable[[], None]:
+        """
+        Reserve ``size`` bytes on ``directory``'s filesystem, raising
+        ``OSError(ENOSPC)`` if they are not available. Returns the function
+        that releases the reservation; call it once the transfer is done, or
+        as soon as its file has been preallocated, since the filesystem then
+        already counts the space as used. Extra calls are ignored.
+        """
+        if not size:
+            return lambda: None
+        device = os.stat(directory).st_dev
+        with self._lock:
+            ensure_free_space(directory, size, self._reserved.get(device, 0))
+            self._reserved[device] = self._reserved.get(device, 0) + size
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            with self._lock:
+                if not released:
+                    released = True
+                    self._reserved[device] -= size
+
+        return release
@@ -0,0 +1,104 @@
+"""
+Delivery of received plaintext to stdout or a handler command.
+
+``fino receive --stdout`` and ``--exec`` hand each file to a consumer
+instead of writing it under the output directory. Chunks come from the
+decrypt step already authenticated (a whole file once its tag verified, or
+a large file one manifest part at a time), so nothing is staged on disk and
+a consumer never sees bytes that failed verification.
+"""
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def handler_env(
+    filename: str,
+    size: Optional[int] = None,
+    cid: Optional[str] = None,
+    sender: Optional[str] = None,
+    identity: Optional[str] = None,
+    event_id: Optional[str] = None,
+) -> Dict[str, str]:
+    """Environment describing a transfer to its ``--exec`` handler"""
+    env = dict(os.environ)
+    env["FINO_FILENAME"] = filename
+    for name, value in (
+        ("FINO_SIZE", size),
+        ("FINO_CID", cid),
+        ("FINO_FROM", sender),
+        ("FINO_IDENTITY", identity),
+        ("FINO_EVENT_ID", event_id),
+    ):
+        if value is not None:
+            env[name] = str(value)
+    return env
+
+
+def stream_to_stdout(chunks: Iterable[bytes]) -> int:
+    """Write chunks to stdout as they arrive; returns the bytes written"""
+    out = sys.stdout.buffer
+    written = 0
+    for chunk in chunks:
+        out.write(chunk)
+        out.flush()
+        written += len(chunk)
+    return written
+
+
+def _terminate(proc: subprocess.Popen) -> None:
+    if os.name != "posix":
+        proc.terminate()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def stream_to_command(
+    command: str, chunks: Iterable[bytes], env: Optional[Dict[str, str]] = None
+) -> int:
+    """
+    Run ``command`` through the shell and stream chunks to its stdin.
+
+    Returns the bytes written. If the transfer fails midway the handler is
+    terminated rather than shown a clean end of input, so it cannot mistake
+    a truncated file for a complete one; a non-zero exit status is an error.
+    """
+    # A session of its own lets a failure stop the whole pipeline the
+    # shell runs, not just the shell
+    proc = subprocess.Popen(
+        command,
+        shell=True,
+        stdin=subprocess.PIPE,
+        env=env,
+        start_new_session=os.name == "posix",
+    )
+    assert proc.stdin is not None
+    written = 0
+    try:
+        for chunk in chunks:
+            proc.stdin.write(chunk)
+            written += len(chunk)
+        proc.stdin.close()
+    except BrokenPipeError:
+        status = proc.wait()
+        raise RuntimeError(
+            f"Handler exited with status {status} before reading the whole file"
+        )
+    except BaseException:
+        _terminate(proc)
+        proc.wait()
+        raise
+    status = proc.wait()
+    if status != 0:
+        raise RuntimeError(f"Handler exited with status {status}")
+    logger.debug("Handler %r consumed %d bytes", command, written)
+    return written
@@ -0,0 +1,204 @@
+"""
+Bandwidth shaping and concurrency limits for IPFS transfers.
+
+Uploads and downloads draw from token buckets: one global bucket per
+direction shared by every transfer in the process, plus a fresh bucket per
+transfer. A global semaphore caps how many transfers run at once. Limits
+come from the config file and can be overridden by the global CLI flags;
+a limit of 0 means unlimited.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from .utils import get_int_config, get_size_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TRANSFERS = 4
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket metering bytes per second.
+
+    Consumers may overdraw the bucket by one chunk and then wait out the
+    debt, so chunks larger than the burst size still flow at the set rate.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        # One second of traffic by default
+        self.burst = float(burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> float:
+        """Take ``amount`` tokens, sleeping as needed; returns seconds slept"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class TransferMeter:
+    """Throughput of one transfer, from its first to its last byte"""
+
+    def __init__(self, direction: str, name: str, per_transfer_limit: int):
+        self.direction = direction
+        self.name = name
+        self.bytes = 0
+        self.throttled = 0.0
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._global = _buckets.get(direction)
+        self._own = TokenBucket(per_transfer_limit) if per_transfer_limit else None
+
+    def begin(self) -> None:
+        """Start the clock before bytes that bypass ``add`` are moved"""
+        self._started = time.monotonic()
+
+    def account(self, amount: int) -> None:
+        """Count bytes moved outside the limiter, e.g. by the ipfs CLI"""
+        if self._started is None:
+            self._started = time.monotonic()
+        self.bytes += amount
+        self._finished = time.monotonic()
+
+    def add(self, amount: int) -> None:
+        """Account for ``amount`` bytes, waiting for both rate limits"""
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now
+        if self._global is not None:
+            self.throttled += self._global.consume(amount)
+        if self._own is not None:
+            self.throttled += self._own.consume(amount)
+        self.bytes += amount
+        self._finished = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        if self._started is None or self._finished is None:
+            return 0.0
+        return self._finished - self._started
+
+    @property
+    def rate(self) -> float:
+        """Average bytes per second"""
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def finish(self) -> None:
+        with _totals_lock:
+            totals = _totals.setdefault(
+                self.direction, {"bytes": 0, "seconds": 0.0, "transfers": 0}
+            )
+            totals["bytes"] += self.bytes
+            totals["seconds"] += self.elapsed
+            totals["transfers"] += 1
+        if self.bytes:
+            logger.info(
+                "⏱️  %s %s: %d bytes in %.2fs (%.2f MB/s%s)",
+                self.direction.capitalize(),
+                self.name,
+                self.bytes,
+                self.elapsed,
+                self.rate / 1e6,
+                f", {self.throttled:.1f}s throttled" if self.throttled >= 0.05 else "",
+            )
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_per_transfer: Dict[str, int] = {}
+_slots: Optional[threading.BoundedSemaphore] = None
+_configured = False
+_config_lock = threading.Lock()
+_totals: Dict[str, Dict[str, float]] = {}
+_totals_lock = threading.Lock()
+
+
+def configure(
+    upload_limit: Optional[int] = None,
+    download_limit: Optional[int] = None,
+    transfer_limit: Optional[int] = None,
+    max_transfers: Optional[int] = None,
+) -> None:
+    """
+    Set the limits in bytes per second; ``None`` falls back on the config
+    keys ``upload_limit``, ``download_limit``, ``transfer_limit`` and
+    ``max_transfers`` (sizes such as ``"10M"`` are accepted there).
+    """
+    global _slots, _configured
+
+    def pick(value: Optional[int], key: str) -> int:
+        return value if value is not None else get_size_config(key, 0)
+
+    with _config_lock:
+        _buckets.clear()
+        for direction, limit in (
+            ("upload", pick(upload_limit, "upload_limit")),
+            ("download", pick(download_limit, "download_limit")),
+        ):
+            if limit > 0:
+                _buckets[direction] = TokenBucket(limit)
+        per_transfer = pick(transfer_limit, "transfer_limit")
+        _per_transfer["upload"] = _per_transfer["download"] = max(0, per_transfer)
+        slots = (
+            max_transfers
+            if max_transfers is not None
+            else get_int_config("max_transfers", DEFAULT_MAX_TRANSFERS)
+        )
+        _slots = threading.BoundedSemaphore(slots) if slots > 0 else None
+        _configured = True
+
+
+def _ensure_configured() -> None:
+    if not _configured:
+        configure()
+
+
+def is_limited(direction: str) -> bool:
+    _ensure_configured()
+    return direction in _buckets or bool(_per_transfer.get(direction))
+
+
+@contextmanager
+def transfer(direction: str, name: str) -> Iterator[TransferMeter]:
+    """
+    Hold one of the global transfer slots and meter the bytes moved.
+
+    Call ``meter.add(len(chunk))`` for every chunk; it blocks as needed to
+    keep the transfer within its rate limits. Slots are only taken by
+    individual uploads and downloads, never by operations that wait on
+    other transfers, so nested use cannot deadlock.
+    """
+    _ensure_configured()
+    slots = _slots
+    if slots is not None:
+        slots.acquire()
+    meter = TransferMeter(direction, name, _per_transfer.get(direction, 0))
+    try:
+        yield meter
+    finally:
+        if slots is not None:
+            slots.release()
+        meter.finish()
+
+
+def totals() -> Dict[str, Dict[str, float]]:
+    """Bytes, active seconds and transfer count per direction so far"""
+    with _totals_lock:
+        return {direction: dict(values) for direction, values in _totals.items()}
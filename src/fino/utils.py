@@ -1,15 +1,73 @@
+import base64
+import errno
+import hashlib
 import logging
 import json
+import os
+import shutil
+import sys
+import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple, Union
+
+# Ciphertexts up to this many bytes are embedded in the DM instead of IPFS.
+# Payloads grow by roughly 16/9 after base64 and DM encryption, which keeps
+# the resulting event well under common relay message size limits.
+DEFAULT_INLINE_THRESHOLD = 16 * 1024
+
+
+class JSONLogFormatter(logging.Formatter):
+    """One JSON object per log record, for ``--json`` mode"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
 
 
 def configure_logging(verbose: bool, quiet: bool, no_color: bool, json_out: bool):
-    """Minimal logging setup to satisfy CLI hook and tests."""
+    """
+    Route fino's log output according to the global CLI flags.
+
+    Library modules log through ``logging.getLogger(__name__)``; records below
+    the configured level are dropped before any formatting happens. Log lines
+    go to stderr so stdout stays clean for ``--json`` results.
+    """
+    from .console import configure_output, console, custom_theme
+
+    configure_output(quiet=quiet, json_out=json_out)
+
     level = logging.DEBUG if verbose else logging.INFO
     if quiet:
         level = logging.ERROR
-    logging.basicConfig(level=level, format="%(message)s")
+
+    handler: logging.Handler
+    if json_out:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JSONLogFormatter())
+    elif console.is_terminal and not no_color:
+        from rich.console import Console
+        from rich.logging import RichHandler
+
+        handler = RichHandler(
+            console=Console(stderr=True, theme=custom_theme),
+            show_time=False,
+            show_path=False,
+            markup=False,
+        )
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+
+    logger = logging.getLogger("fino")
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
 
 
 def get_config_dir() -> Path:
@@ -56,19 +114,255 @@ def set_config_value(key: str, value: str) -> None:
     save_config(config)
 
 
+def get_int_config(key: str, default: int) -> int:
+    """Get an integer configuration value, falling back on bad values"""
+    try:
+        return int(load_config().get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+_TRUE_WORDS = {"true", "yes", "on", "1"}
+_FALSE_WORDS = {"false", "no", "off", "0"}
+
+
+def get_bool_config(key: str, default: bool) -> bool:
+    """Get a boolean configuration value, falling back on bad values"""
+    value = load_config().get(key, default)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        word = value.strip().lower()
+        if word in _TRUE_WORDS:
+            return True
+        if word in _FALSE_WORDS:
+            return False
+    return default
+
+
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def parse_size(value: str) -> int:
+    """
+    Parse a byte count such as ``512k``, ``10M``, ``1.5G`` or ``1048576``
+    (binary units; a trailing ``B``, ``iB`` or ``/s`` is accepted).
+    """
+    text = value.strip().lower()
+    if text.endswith("/s"):
+        text = text[:-2]
+    for suffix in ("ib", "b"):
+        if text.endswith(suffix):
+            text = text[: -len(suffix)]
+            break
+    unit = text[-1:] if text[-1:] in _SIZE_UNITS else ""
+    number = text[: len(text) - len(unit)].strip()
+    try:
+        return int(float(number) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size {value!r}: use e.g. 512k, 10M or 1G")
+
+
+def get_size_config(key: str, default: int) -> int:
+    """Get a byte count from config, given as a number or a size string"""
+    value = load_config().get(key, default)
+    try:
+        return value if isinstance(value, int) else parse_size(str(value))
+    except ValueError:
+        return default
+
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_since(value: str, now: Optional[int] = None) -> int:
+    """
+    Parse a Unix timestamp or a relative age such as ``30m``, ``12h`` or
+    ``7d`` into a Unix timestamp.
+    """
+    value = value.strip().lower()
+    if value.isdigit():
+        return int(value)
+    unit = _DURATION_UNITS.get(value[-1:])
+    if unit is None or not value[:-1].isdigit():
+        raise ValueError(
+            f"Invalid time {value!r}: use e.g. 30m, 12h, 7d or a Unix timestamp"
+        )
+    now = int(time.time()) if now is None else now
+    return now - int(value[:-1]) * unit
+
+
+def get_inline_threshold() -> int:
+    """Get the inline ciphertext size threshold from config"""
+    return get_int_config("inline_threshold", DEFAULT_INLINE_THRESHOLD)
+
+
 def build_payload(
-    cid: str, key: bytes, nonce: bytes, original_filename: Optional[str] = None
+    cid: Optional[str],
+    key: bytes,
+    nonce: bytes,
+    original_filename: Optional[str] = None,
+    data: Optional[bytes] = None,
+    peer: Optional[Dict[str, Any]] = None,
+    size: Optional[int] = None,
+    plain_size: Optional[int] = None,
+    sha256: Optional[str] = None,
+    suite: Optional[str] = None,
+    dictionary: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
-    payload: Dict[str, Any] = {"cid": cid, "key": key.hex(), "nonce": nonce.hex()}
+    """
+    Build the DM payload for a transfer.
+
+    ``size`` is the number of ciphertext bytes the receiver will download,
+    ``plain_size`` the number of bytes it will write to disk and ``sha256``
+    the digest of the ciphertext stored under ``cid``. Receivers use them to
+    schedule, preallocate and verify transfers before fetching anything.
+    ``suite`` names the AEAD the ciphertexts were sealed with, and
+    ``dictionary`` references the zstd dictionary the file was compressed
+    with (gzip when absent).
+    """
+    payload: Dict[str, Any] = {"key": key.hex(), "nonce": nonce.hex()}
+    if cid:
+        payload["cid"] = cid
+    if data is not None:
+        # Small ciphertexts travel inside the DM itself
+        payload["data"] = base64.b64encode(data).decode("ascii")
     if original_filename:
         payload["filename"] = original_filename
+    if peer and cid:
+        # Lets the receiver dial the sender's node instead of searching the DHT
+        payload["peer"] = peer
+    if size is not None:
+        payload["size"] = size
+    if plain_size is not None:
+        payload["plain_size"] = plain_size
+    if sha256:
+        payload["sha256"] = sha256
+    if suite:
+        payload["suite"] = suite
+    if dictionary:
+        payload["dict"] = dictionary
     return payload
 
 
+def transfer_sizes(payload: dict) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Return (download bytes, plaintext bytes) for a payload.
+
+    Payloads from senders that predate the size fields fall back on the
+    bundle or manifest description; unknown sizes are None.
+    """
+    size = payload.get("size")
+    plain_size = payload.get("plain_size")
+    if plain_size is None:
+        plain_size = (payload.get("manifest") or payload.get("bundle") or {}).get(
+            "size"
+        )
+    if "data" in payload:
+        # Inline ciphertexts are already here
+        size = 0
+    return size, plain_size
+
+
+def verify_ciphertext(payload: dict, data: Union[bytes, str, Path]) -> None:
+    """
+    Check downloaded ciphertext against the payload's size and SHA-256.
+
+    ``data`` is the ciphertext itself or the path of a file holding it, which
+    is hashed in chunks.
+    """
+    length = len(data) if isinstance(data, bytes) else os.path.getsize(data)
+    size = payload.get("size")
+    if size is not None and length != size:
+        raise ValueError(f"Expected {size:,} bytes, got {length:,}")
+    digest = payload.get("sha256")
+    if not digest:
+        return
+    if isinstance(data, bytes):
+        hasher = hashlib.sha256(data)
+    else:
+        hasher = hashlib.sha256()
+        with open(data, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+    if hasher.hexdigest() != digest:
+        raise ValueError("Ciphertext failed SHA-256 verification")
+
+
+def ensure_free_space(directory: str, needed: int, reserved: int = 0) -> None:
+    """
+    Raise ``OSError(ENOSPC)`` unless ``directory`` has room for ``needed``
+    more bytes on top of ``reserved`` bytes already promised to other
+    transfers and the configured ``min_free_bytes`` headroom.
+    """
+    free = shutil.disk_usage(directory).free
+    headroom = get_size_config("min_free_bytes", 0)
+    if free - reserved - headroom < needed:
+        raise OSError(
+            errno.ENOSPC,
+            f"Not enough space in {directory}: need {needed:,} bytes, "
+            f"{max(0, free - reserved - headroom):,} available",
+        )
+
+
+def process_alive(pid: Optional[int]) -> bool:
+    """Whether a process with this PID is running"""
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def read_full(stream: Any, size: int) -> bytes:
+    """Read ``size`` bytes from a stream, or fewer only at its end"""
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def preallocate(f: Any, size: int) -> bool:
+    """
+    Reserve ``size`` bytes for an open file so a full disk fails up front
+    and the file is laid out contiguously. Filesystems without fallocate
+    support are left alone; running out of space raises. Returns whether
+    the space was allocated.
+    """
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return False
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise
+        return False
+    return True
+
+
+def inline_data_from_payload(payload: dict) -> Optional[bytes]:
+    """Return the inline ciphertext carried by the payload, if any"""
+    if "data" not in payload:
+        return None
+    return base64.b64decode(payload["data"])
+
+
 def build_filename_from_payload(payload: dict) -> str:
     """Build filename from payload, using original filename if available"""
     if "filename" in payload:
         return payload["filename"]
     else:
-        # Fallback to CID-based filename
-        return f"{payload['cid'][:8]}.bin"
+        # Fallback to CID-based filename (nonce-based for inline payloads)
+        return f"{payload.get('cid', payload['nonce'])[:8]}.bin"
@@ -0,0 +1,464 @@
+"""
+Watch-folder sending for ``fino watch``.
+
+Files dropped into a directory are sent to one recipient as they appear.
+Changes are picked up through inotify on Linux and by periodic scans
+elsewhere (and as a safety net for missed inotify events). A file is only
+sent once its size and mtime have stayed the same for a settle period, so
+files still being written are not shipped half done. The size, mtime and
+SHA-256 of every sent file are kept in a persistent index, so restarts and
+touched-but-unchanged files do not resend anything. Sends run concurrently
+over one shared relay pool and executor.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .manifest import get_transfer_workers
+from .nostr import RelayPool
+from .pipeline import send_file_async
+from .relays import get_relay_manager
+from .utils import get_config_dir, get_int_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTLE = 2
+DEFAULT_POLL_INTERVAL = 2
+# Editor swap files, partial downloads and hidden files are never sent
+DEFAULT_IGNORE = [".*", "*~", "*.tmp", "*.part", "*.crdownload", "*.swp"]
+# Full rescan period when inotify reports changes
+_RESCAN_INTERVAL = 60.0
+_RETRY_BASE = 30.0
+_RETRY_MAX = 900.0
+_HASH_CHUNK = 1024 * 1024
+
+# (size, mtime in ns) of a file as last seen
+FileStat = Tuple[int, int]
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WatchIndex:
+    """Files already sent from one directory to one recipient"""
+
+    def __init__(self, root: Path, to_npub: str, path: Optional[Path] = None):
+        key = hashlib.sha256(f"{root.resolve()}\0{to_npub}".encode()).hexdigest()
+        self.path = path or get_config_dir() / "watch" / f"{key[:16]}.json"
+        self.root = root
+        self.to_npub = to_npub
+        self.files: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    return json.load(f).get("files", {})
+            except (json.JSONDecodeError, IOError, AttributeError):
+                pass
+        return {}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(
+                {"root": str(self.root), "to": self.to_npub, "files": self.files}, f
+            )
+        os.replace(tmp, self.path)
+
+    def get(self, rel: str) -> Optional[Dict[str, Any]]:
+        return self.files.get(rel)
+
+    def unchanged(self, rel: str, stat: FileStat) -> bool:
+        entry = self.files.get(rel)
+        return entry is not None and (entry["size"], entry["mtime_ns"]) == stat
+
+    def record(
+        self, rel: str, stat: FileStat, sha256: str, cid: Optional[str]
+    ) -> None:
+        self.files[rel] = {
+            "size": stat[0],
+            "mtime_ns": stat[1],
+            "sha256": sha256,
+            "cid": cid,
+            "sent_at": time.time(),
+        }
+
+
+class _Inotify:
+    """Minimal non-blocking inotify binding (Linux only)"""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    MASK = (
+        IN_MODIFY
+        | IN_ATTRIB
+        | IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+    )
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self) -> None:
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._dirs: Dict[int, str] = {}
+
+    def add(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), self.MASK
+        )
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self._dirs[wd] = directory
+
+    def read(self) -> Optional[List[Tuple[str, bool]]]:
+        """
+        Changed paths as (path, is directory); None if events were lost
+        """
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changes = []
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if mask & self.IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            changes.append(
+                (os.path.join(directory, os.fsdecode(name)), bool(mask & self.IN_ISDIR))
+            )
+        return changes
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Sends new and changed files under ``root`` to ``to_npub``.
+
+    ``on_sent(rel_path, size, cid)`` and ``on_failed(rel_path, error)`` are
+    called from the event loop after every send attempt. Failed files are
+    retried with exponential backoff while they stay unchanged.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        to_npub: str,
+        from_nsec: str,
+        relays: Optional[List[str]] = None,
+        concurrency: Optional[int] = None,
+        settle: Optional[float] = None,
+        interval: Optional[float] = None,
+        ignore: Optional[List[str]] = None,
+        use_inotify: bool = True,
+        dictionary: Optional[str] = None,
+        on_sent: Optional[Callable[[str, int, Optional[str]], None]] = None,
+        on_failed: Optional[Callable[[str, Exception], None]] = None,
+    ):
+        self.root = root
+        self.to_npub = to_npub
+        self.from_nsec = from_nsec
+        self.relays = relays
+        self.concurrency = max(1, concurrency or get_transfer_workers())
+        self.settle = (
+            settle
+            if settle is not None
+            else float(get_int_config("watch_settle", DEFAULT_SETTLE))
+        )
+        self.interval = max(
+            0.1,
+            interval
+            if interval is not None
+            else float(get_int_config("watch_interval", DEFAULT_POLL_INTERVAL)),
+        )
+        self.ignore = DEFAULT_IGNORE + list(ignore or [])
+        self.use_inotify = use_inotify
+        self.dictionary = dictionary
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.index = WatchIndex(root, to_npub)
+        self.inotify_active = False
+
+        # Files seen changed, with the stat they settle on and since when
+        self._candidates: Dict[str, Tuple[FileStat, float]] = {}
+        self._sending: Set[str] = set()
+        self._retries: Dict[str, Tuple[int, float]] = {}
+        self._dirty: Set[str] = set()
+        self._rescan = True
+        self._inotify: Optional[_Inotify] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._once = False
+
+    def _ignored(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore)
+
+    def _walk(self, directory: str) -> Iterable[os.DirEntry]:
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if self._ignored(entry.name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if self._inotify is not None:
+                        self._watch_dir(entry.path)
+                    yield from self._walk(entry.path)
+                elif entry.is_file():
+                    yield entry
+            except OSError:
+                continue
+
+    def _scan(self) -> Dict[str, FileStat]:
+        found = {}
+        for entry in self._walk(str(self.root)):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            found[os.path.relpath(entry.path, self.root)] = (st.st_size, st.st_mtime_ns)
+        return found
+
+    def _stat_paths(self, rel_paths: Iterable[str]) -> Dict[str, FileStat]:
+        found = {}
+        for rel in rel_paths:
+            try:
+                st = os.stat(self.root / rel)
+            except OSError:
+                continue
+            if os.path.isfile(self.root / rel):
+                found[rel] = (st.st_size, st.st_mtime_ns)
+        return found
+
+    def _watch_dir(self, directory: str) -> None:
+        assert self._inotify is not None
+        try:
+            self._inotify.add(directory)
+        except OSError as e:
+            # Typically fs.inotify.max_user_watches; scans still cover it
+            logger.warning("⚠️  Cannot watch %s: %s", directory, e)
+
+    def _on_inotify(self) -> None:
+        assert self._inotify is not None and self._wake is not None
+        changes = self._inotify.read()
+        if changes is None:
+            logger.warning("⚠️  inotify queue overflowed, rescanning")
+            self._rescan = True
+        else:
+            for path, is_dir in changes:
+                rel = os.path.relpath(path, self.root)
+                if any(self._ignored(part) for part in Path(rel).parts):
+                    continue
+                if is_dir:
+                    # New or moved-in directories are watched by the rescan
+                    self._rescan = True
+                else:
+                    self._dirty.add(rel)
+        self._wake.set()
+
+    def _observe(self, observed: Dict[str, FileStat], checked: Iterable[str]) -> None:
+        now = time.time()
+        for rel in checked:
+            if rel not in observed:
+                self._candidates.pop(rel, None)
+                self._retries.pop(rel, None)
+        for rel, stat in observed.items():
+            if rel in self._sending:
+                continue
+            if self.index.unchanged(rel, stat):
+                self._candidates.pop(rel, None)
+                continue
+            current = self._candidates.get(rel)
+            if current is None or current[0] != stat:
+                # Still being written (or changed again): restart the clock
+                self._candidates[rel] = (stat, now)
+                self._retries.pop(rel, None)
+
+    def _settled(self) -> List[Tuple[str, FileStat]]:
+        now = time.time()
+        ready = []
+        for rel, (stat, since) in list(self._candidates.items()):
+            retry = self._retries.get(rel)
+            if now - since < self.settle or (retry and retry[1] > now):
+                continue
+            del self._candidates[rel]
+            ready.append((rel, stat))
+        return ready
+
+    async def _send(
+        self,
+        rel: str,
+        stat: FileStat,
+        semaphore: asyncio.Semaphore,
+        pool: RelayPool,
+        executor: ThreadPoolExecutor,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        path = self.root / rel
+        try:
+            async with semaphore:
+                digest = await loop.run_in_executor(executor, _file_sha256, str(path))
+                entry = self.index.get(rel)
+                if entry is not None and entry.get("sha256") == digest:
+                    # Touched but identical to what was sent
+                    self.index.record(rel, stat, digest, entry.get("cid"))
+                    self.index.save()
+                    return
+                cid = await send_file_async(
+                    path,
+                    self.to_npub,
+                    self.from_nsec,
+                    pool=pool,
+                    executor=executor,
+                    dictionary=self.dictionary,
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            attempts = self._retries.get(rel, (0, 0.0))[0] + 1
+            delay = min(_RETRY_BASE * 2 ** (attempts - 1), _RETRY_MAX)
+            if not self._once:
+                self._retries[rel] = (attempts, time.time() + delay)
+                self._candidates.setdefault(rel, (stat, 0.0))
+                logger.warning(
+                    "⚠️  Sending %s failed (retry in %.0fs): %s", rel, delay, e
+                )
+            if self.on_failed is not None:
+                self.on_failed(rel, e)
+            return
+        finally:
+            self._sending.discard(rel)
+            if self._wake is not None:
+                self._wake.set()
+
+        self._retries.pop(rel, None)
+        self.index.record(rel, stat, digest, cid)
+        self.index.save()
+        if self.on_sent is not None:
+            self.on_sent(rel, stat[0], cid)
+
+    async def run(self, once: bool = False) -> None:
+        """
+        Watch until cancelled; with ``once``, send what is there and return
+        """
+        loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._once = once
+        if self.use_inotify and not once:
+            try:
+                self._inotify = _Inotify()
+                self._watch_dir(str(self.root))
+                loop.add_reader(self._inotify.fd, self._on_inotify)
+                self.inotify_active = True
+            except (OSError, AttributeError) as e:
+                logger.info(
+                    "inotify unavailable (%s), polling every %.1fs", e, self.interval
+                )
+                self._inotify = None
+
+        relays = self.relays or await get_relay_manager().select()
+        pool = RelayPool(relays)
+        await pool.connect()
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="fino-watch"
+        )
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks: Set["asyncio.Task[None]"] = set()
+        full_interval = _RESCAN_INTERVAL if self._inotify else self.interval
+        last_scan = 0.0
+        try:
+            while True:
+                if self._rescan or time.time() - last_scan >= full_interval:
+                    self._rescan = False
+                    self._dirty.clear()
+                    observed = await loop.run_in_executor(None, self._scan)
+                    last_scan = time.time()
+                    checked: Iterable[str] = list(self._candidates)
+                else:
+                    checked = self._dirty | set(self._candidates)
+                    self._dirty = set()
+                    observed = await loop.run_in_executor(
+                        None, self._stat_paths, checked
+                    )
+                self._observe(observed, checked)
+
+                for rel, stat in self._settled():
+                    self._sending.add(rel)
+                    task = asyncio.ensure_future(
+                        self._send(rel, stat, semaphore, pool, executor)
+                    )
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+                if once and not self._candidates and not tasks:
+                    return
+
+                timeout = full_interval
+                if self._candidates:
+                    timeout = min(timeout, max(self.settle / 2, 0.1))
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self._inotify is not None:
+                loop.remove_reader(self._inotify.fd)
+                self._inotify.close()
+                self._inotify = None
+            executor.shutdown(wait=False)
+            await pool.close()